@@ -0,0 +1,100 @@
+"""
+Time dashboard startup: library imports, loading makeup_panel.py and the first render.
+
+Each run is a fresh Python process serving a seeded synthetic CSV (see
+synthetic.py). The first run starts without the column cache, so it includes
+parsing the CSV and building the cache; later runs map the cache. Reported per run:
+
+    python     - interpreter start until the timing script runs
+    panel      - `import panel`
+    app        - executing makeup_panel.py (data load, widgets, summary and first tab computed)
+    render     - building the Bokeh models of the summary and tabs (what the first page is made of)
+    first page - process start until the first page's models are ready
+
+Usage:
+    python benchmarks/bench_startup.py --rows 100000 --repeat 3 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from makeupstore import cache_dir_for  # noqa: E402
+from synthetic import synthetic_csv  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import panel as pn
+panel_done = time.perf_counter()
+import makeup_panel as app
+app_done = time.perf_counter()
+from bokeh.document import Document
+doc = Document()
+for obj in app.layout.main:
+    obj.get_root(doc)
+render_done = time.perf_counter()
+print(json.dumps({
+    "started": started, "panel": panel_done - started, "app": app_done - panel_done,
+    "render": render_done - app_done, "render_done": render_done,
+}))
+"""
+
+
+def run_once(path, backend):
+    """Start a fresh interpreter on `path` and return its timings."""
+    env = dict(os.environ, MAKEUP_DATA=path)
+    if backend:
+        env["MAKEUP_BACKEND"] = backend
+    launched = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=REPO, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    child = json.loads(result.stdout.strip().splitlines()[-1])
+    # perf_counter is system-wide on Linux and macOS, so the child's clock lines up with ours
+    return {"python": child["started"] - launched, "panel": child["panel"], "app": child["app"],
+            "render": child["render"], "first_page": child["render_done"] - launched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="warm runs after the cold one")
+    parser.add_argument("--backend", choices=["chunked"], help="MAKEUP_BACKEND for the runs")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    path = synthetic_csv(args.rows, args.seed)
+    shutil.rmtree(cache_dir_for(path), ignore_errors=True)
+    shutil.rmtree(f"{path}.parts", ignore_errors=True)
+
+    runs = []
+    print(f"{'run':<8}{'python':>9}{'panel':>9}{'app':>9}{'render':>9}{'first page':>12}")
+    for i in range(args.repeat + 1):
+        r = run_once(path, args.backend)
+        r["run"] = "cold" if i == 0 else "warm"
+        runs.append(r)
+        print(f"{r['run']:<8}{r['python']:>8.2f}s{r['panel']:>8.2f}s{r['app']:>8.2f}s{r['render']:>8.2f}s"
+              f"{r['first_page']:>11.2f}s", flush=True)
+
+    warm = [r["first_page"] for r in runs if r["run"] == "warm"]
+    if warm:
+        print(f"\nwarm first page: median {statistics.median(warm):.2f}s, best {min(warm):.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": args.rows, "backend": args.backend, "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Time the API, Sankey and report paths on seeded synthetic data of growing size.
+
+For every row count a synthetic CSV is generated once (cached under
+benchmarks/data/) and each case is timed `--repeat` times, then run once
+more under tracemalloc for its peak Python/NumPy allocation. Filter cases
+replay the same seeded mix of dashboard filter states at every size, with
+the filter cache cleared so every query is computed.
+
+Usage:
+    python benchmarks/bench_suite.py --rows 10000 100000 1000000 --json results.json
+    python benchmarks/bench_suite.py --rows 10000 100000 --compare results.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from makeupapi import BeautyProductAPI  # noqa: E402
+from makeuptemplate import generate_markdown  # noqa: E402
+from sankey import make_sankey  # noqa: E402
+from synthetic import synthetic_csv  # noqa: E402
+
+SANKEY_TIERS = ("brand", "category", "main_ingredient", "country_of_origin")
+# Search box texts, replayed one keystroke at a time
+SEARCHES = ("serum", "vitamin c", "matte lip", "hyaluronic acid cream")
+
+
+def filter_mix(api, n_specs=50, seed=0):
+    """Seeded dashboard filter states, weighted towards the common ones (few filters, slider drags)."""
+    rnd = random.Random(seed)
+    brands = api.get_options("brand")[1:]
+    categories = api.get_options("category")[1:]
+    specs = []
+    for _ in range(n_specs):
+        low = rnd.choice([0, 0, 0, 10, 20, 50])
+        specs.append({
+            "brand": rnd.sample(brands, rnd.choice([0, 0, 0, 1, 1, 3])),
+            "category": rnd.choice(["All"] * 4 + categories),
+            "online_only": rnd.choice(["All"] * 4 + ["Yes", "No"]),
+            "exclusive": rnd.choice(["All"] * 4 + ["Yes", "No"]),
+            "min_rating": rnd.choice([0, 0, 3.0, 4.0, 4.5]),
+            "price_range": (low, rnd.choice([500, 500, 100, low + 40])),
+            "min_reviews": rnd.choice([0, 0, 0, 50, 500]),
+        })
+    return specs
+
+
+def cases(path, api, specs, report_rows):
+    """(name, calls, function) for every case; the function makes all `calls` calls once."""
+    def uncached(method):
+        def run():
+            for spec in specs:
+                api.cache.clear()
+                method(**spec)
+        return run
+
+    def typeahead():
+        for text in SEARCHES:
+            api.cache.clear()
+            for end in range(1, len(text) + 1):
+                api.filter_rows(search=text[:end], session="typeahead")
+
+    full = api.df
+    report = full.head(report_rows) if report_rows else full
+    n = len(specs)
+    keystrokes = sum(len(text) for text in SEARCHES)
+    return [
+        ("load_data", 1, lambda: BeautyProductAPI().load_data(path)),
+        ("load_data_typed", 1, lambda: BeautyProductAPI().load_data(path, typed=True)),
+        ("filter_data", n, uncached(api.filter_data)),
+        ("search_typeahead", keystrokes, typeahead),
+        ("get_summary", 1, lambda: api.get_summary(full)),
+        ("get_filtered_summary", n, uncached(api.get_filtered_summary)),
+        ("get_summaries", n, lambda: api.get_summaries(specs)),
+        ("get_top_brands_by_rating", n, uncached(api.get_top_brands_by_rating)),
+        ("get_avg_price_by_category", n, uncached(api.get_avg_price_by_category)),
+        ("make_sankey", 1, lambda: make_sankey(full, *[c for c in SANKEY_TIERS if c in full.columns])),
+        ("generate_markdown", 1, lambda: generate_markdown(report)),
+    ]
+
+
+def measure(func, repeat):
+    """Wall-clock times of `repeat` runs, then the peak traced allocation of one more run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return times, peak
+
+
+def run(rows, seed, repeat, only, report_rows):
+    results = []
+    for n_rows in rows:
+        path = synthetic_csv(n_rows, seed)
+        api = BeautyProductAPI()
+        api.load_data(path, typed=True)
+        specs = filter_mix(api, seed=seed)
+
+        for name, calls, func in cases(path, api, specs, report_rows):
+            if only and name not in only:
+                continue
+            times, peak = measure(func, repeat)
+            results.append({
+                "case": name,
+                "rows": n_rows,
+                "calls": calls,
+                "min_s": min(times),
+                "median_s": statistics.median(times),
+                "peak_mb": peak / 1024 / 1024,
+            })
+            r = results[-1]
+            print(f"{name:<28}{n_rows:>10}{r['median_s']:>11.4f}s{r['min_s']:>11.4f}s{r['peak_mb']:>10.1f}M",
+                  flush=True)
+    return results
+
+
+def compare(results, baseline, threshold, noise=0.002):
+    """Print new vs baseline best times; return the cases more than `threshold` (and `noise` seconds) slower.
+
+    Best-of-N times are compared because they vary far less between runs than medians.
+    """
+    old = {(r["case"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<28}{'rows':>10}{'baseline':>12}{'now':>12}{'change':>9}")
+    for r in results:
+        before = old.get((r["case"], r["rows"]))
+        if before is None:
+            continue
+        change = r["min_s"] / before["min_s"] - 1 if before["min_s"] else 0.0
+        flag = ""
+        if change > threshold and r["min_s"] - before["min_s"] > noise:
+            flag = "  REGRESSION"
+            regressions.append(r)
+        print(f"{r['case']:<28}{r['rows']:>10}{before['min_s']:>11.4f}s{r['min_s']:>11.4f}s"
+              f"{change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="only run these cases")
+    parser.add_argument("--report-rows", type=int, default=1000000,
+                        help="cap on rows in the generate_markdown case (0 for no cap)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="flag cases whose best time grew by more than this fraction")
+    args = parser.parse_args()
+
+    print(f"{'case':<28}{'rows':>10}{'median':>12}{'min':>12}{'peak':>11}")
+    results = run(args.rows, args.seed, args.repeat, args.only, args.report_rows)
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measure memory per `panel serve --num-procs N` style worker, with and without
+the shared memory-mapped store.
+
+Each worker loads the dataset the same way the dashboard does, touches every
+column, index and aggregate cube array so the pages are resident, then waits
+until all N workers have done the same before reading its own memory
+counters. RSS counts shared file pages in every process, so the report also
+shows private memory and PSS (shared pages split between the processes mapping
+them).
+
+Usage:
+    python benchmarks/bench_workers.py data/most_used_beauty_cosmetics_products_extended.csv --workers 1 2 4 8
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from makeupapi import BeautyProductAPI  # noqa: E402
+
+
+def memory_kb():
+    """RSS, private and proportional set size of this process in kB (Linux only)."""
+    stats = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                stats[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": stats["Rss"], "private": stats["Private_Clean"] + stats["Private_Dirty"], "pss": stats["Pss"]}
+
+
+def worker(path, mmap, barrier, results):
+    api = BeautyProductAPI()
+    api.load_data(path, cache=True, mmap=mmap)
+
+    # Touch every column and index array so they are resident, like a warmed-up worker
+    for col in api.df.columns:
+        series = api.df[col]
+        codes = series.cat.codes if hasattr(series, "cat") else series
+        codes.to_numpy().sum() if codes.dtype.kind in "biuf" else len(codes)
+    for arrays in (api.index.codes, api.index.order, api.index.sorted):
+        for array in arrays.values():
+            array.sum()
+    # ... and the aggregate cube, its per-cell sketches and the rating grid
+    cube = api.cube
+    for array in (cube.cell, cube.rows, cube.offsets, cube.count, cube.rating_sum, cube.price_sum, *cube.keys):
+        array.sum()
+    for sketches in cube.sketches.values():
+        sketches.keys.sum()
+        sketches.counts.sum()
+    if api.rating_steps is not None:
+        api.rating_steps.sum()
+    api.get_filtered_summary(min_rating=4, price_range=(20, 90))
+    api.filter_data(min_rating=4, price_range=(20, 90))
+
+    barrier.wait()
+    results.put(memory_kb())
+    barrier.wait()
+
+
+def run(path, mmap, n_workers):
+    barrier = mp.Barrier(n_workers)
+    results = mp.Queue()
+    procs = [mp.Process(target=worker, args=(path, mmap, barrier, results)) for _ in range(n_workers)]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    return {
+        "mode": "mmap" if mmap else "copy",
+        "workers": n_workers,
+        "rss_per_worker_mb": sum(s["rss"] for s in stats) / n_workers / 1024,
+        "private_per_worker_mb": sum(s["private"] for s in stats) / n_workers / 1024,
+        "pss_per_worker_mb": sum(s["pss"] for s in stats) / n_workers / 1024,
+        "pss_total_mb": sum(s["pss"] for s in stats) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="?", default="data/most_used_beauty_cosmetics_products_extended.csv")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Build the column cache and indexes once up front so workers only read them
+    BeautyProductAPI().load_data(args.csv, cache=True)
+
+    rows = [run(args.csv, mmap, n) for mmap in (False, True) for n in args.workers]
+
+    print(f"{'mode':<6}{'workers':>8}{'rss/worker':>12}{'private/worker':>16}{'pss/worker':>12}{'pss total':>11}")
+    for r in rows:
+        print(f"{r['mode']:<6}{r['workers']:>8}{r['rss_per_worker_mb']:>11.1f}M{r['private_per_worker_mb']:>15.1f}M"
+              f"{r['pss_per_worker_mb']:>11.1f}M{r['pss_total_mb']:>10.1f}M")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Seeded synthetic product data shaped like data/most_used_beauty_cosmetics_products_extended.csv.
+
+Text and flag columns are drawn with the value frequencies of the real file,
+numeric columns from its empirical distribution (inverse CDF) at the file's
+precision. The love, online_only and exclusive columns the dashboard uses
+(but the file lacks) are added. Columns get the lowercase names
+BeautyProductAPI reads; pass raw=True to keep the file's own names.
+
+Usage:
+    python benchmarks/synthetic.py out.csv --rows 1000000 --seed 0
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "data", "most_used_beauty_cosmetics_products_extended.csv")
+
+# Column names in the source file -> names the API reads
+COLUMNS = {
+    "Product_Name": "name",
+    "Brand": "brand",
+    "Category": "category",
+    "Usage_Frequency": "usage_frequency",
+    "Price_USD": "price",
+    "Rating": "rating",
+    "Number_of_Reviews": "number_of_reviews",
+    "Product_Size": "product_size",
+    "Skin_Type": "skin_type",
+    "Gender_Target": "gender_target",
+    "Packaging_Type": "packaging_type",
+    "Main_Ingredient": "main_ingredient",
+    "Cruelty_Free": "cruelty_free",
+    "Country_of_Origin": "country_of_origin",
+}
+
+# Decimal places numeric columns are rounded to, as in the source file
+DECIMALS = {"Price_USD": 2, "Rating": 1, "Number_of_Reviews": 0}
+
+
+class ProductGenerator:
+    """Draws any number of rows with the per-column distributions of a source CSV."""
+
+    def __init__(self, source=SOURCE):
+        df = pd.read_csv(source)
+        self.columns = list(df.columns)
+        self.choices = {}     # column -> (values, probabilities)
+        self.quantiles = {}   # column -> sorted values, sampled by inverse CDF
+        for col in self.columns:
+            if col in DECIMALS:
+                self.quantiles[col] = np.sort(df[col].dropna().to_numpy(dtype=np.float64))
+            else:
+                freq = df[col].value_counts(normalize=True)
+                self.choices[col] = (freq.index.to_numpy(), freq.to_numpy())
+
+    def sample(self, n_rows, seed=0, raw=False):
+        """A DataFrame of `n_rows` synthetic products; the same seed always gives the same rows."""
+        rng = np.random.default_rng(seed)
+        data = {}
+        for col in self.columns:
+            if col in self.quantiles:
+                values = self.quantiles[col]
+                positions = rng.random(n_rows) * (len(values) - 1)
+                low = np.floor(positions).astype(np.int64)
+                high = np.minimum(low + 1, len(values) - 1)
+                drawn = values[low] + (values[high] - values[low]) * (positions - low)
+                drawn = np.round(drawn, DECIMALS[col])
+                data[col] = drawn.astype(np.int64) if DECIMALS[col] == 0 else drawn
+            else:
+                values, probabilities = self.choices[col]
+                codes = rng.choice(len(values), size=n_rows, p=probabilities)
+                data[col] = pd.Categorical.from_codes(codes, categories=values) if values.dtype == object \
+                    else values[codes]
+
+        # Dashboard-only columns: loves grow with reviews, a minority of products are online only or exclusive
+        reviews = data["Number_of_Reviews"]
+        data["love"] = (reviews * rng.uniform(0.5, 8.0, n_rows)).astype(np.int64)
+        data["online_only"] = (rng.random(n_rows) < 0.2).astype(np.int64)
+        data["exclusive"] = (rng.random(n_rows) < 0.15).astype(np.int64)
+
+        df = pd.DataFrame(data)
+        return df if raw else df.rename(columns=COLUMNS)
+
+    def write_csv(self, path, n_rows, seed=0, raw=False, chunk_rows=1000000):
+        """Write `n_rows` synthetic products to `path`, generating at most `chunk_rows` at a time."""
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w", newline="") as f:
+            for i, start in enumerate(range(0, n_rows, chunk_rows)):
+                # Every chunk has its own seed, so files of different sizes share their first rows
+                chunk = self.sample(min(chunk_rows, n_rows - start), seed=(seed, i), raw=raw)
+                chunk.to_csv(f, index=False, header=(i == 0))
+        os.replace(tmp, path)
+        return path
+
+
+def synthetic_csv(n_rows, seed=0, data_dir=None):
+    """Path of a synthetic CSV with `n_rows` rows, generated once and reused after that."""
+    data_dir = data_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic-{n_rows}-{seed}.csv")
+    if not os.path.exists(path):
+        ProductGenerator().write_csv(path, n_rows, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw", action="store_true", help="keep the source file's column names")
+    args = parser.parse_args()
+    ProductGenerator().write_csv(args.csv, args.rows, args.seed, raw=args.raw)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,116 @@
+import io
+import os
+import tempfile
+import threading
+from functools import partial
+
 import panel as pn
-import hvplot.pandas
-from makeupapi import BeautyProductAPI
+import numpy as np
+import pandas as pd
+from makeupapi import BeautyProductAPI, filter_key
+from makeupchunked import ChunkedBeautyProductAPI
+from makeupexport import EXTENSIONS, export_formats
+from makeupregistry import DatasetRegistry, dataset_sources
+from makeupsched import ScheduledView
+from sankey import make_sankey
+from makeuptemplate import write_markdown_batches
+from makeupperf import ENABLED, count_sent_bytes, is_admin, profiler, registry, timed
+
+pn.extension('tabulator', 'plotly')
+
+# NEW: Datasets served by the dashboard: every CSV in data/, or MAKEUP_DATA (comma-separated paths or name=path
+# entries, e.g. for benchmarks). Each session picks one (?dataset=<name> in the URL)
+DATA_SOURCES = dataset_sources(os.environ.get('MAKEUP_DATA', ''), 'data')
+# NEW: Memory cap (MB) for the loaded datasets; idle ones are evicted least recently used first
+DATA_MEMORY_MB = int(os.environ.get('MAKEUP_DATA_MEMORY_MB', 2048))
+
+# NEW: How often the data source is checked for new products, and sessions for a new data version
+REFRESH_SECONDS = 10
+
+
+def load_api(path):
+    """Load a dataset once per server process (worker processes share the mapped columns).
+
+    Set MAKEUP_BACKEND=chunked for catalogs too large to hold in memory.
+    """
+    if os.environ.get('MAKEUP_BACKEND') == 'chunked':
+        api = ChunkedBeautyProductAPI()
+        api.load_data(path)
+    else:
+        api = BeautyProductAPI()
+        api.load_data(path, mmap=True)
+    # Pick up appended rows and delta files without restarting the server
+    api.watch(interval=REFRESH_SECONDS)
+    return api
+
+
+def load_datasets():
+    return DatasetRegistry(DATA_SOURCES, DATA_MEMORY_MB * 1024 ** 2, load_api)
+
+
+# Shared by every browser session, so sessions on the same dataset share its filter cache
+datasets = pn.state.as_cached('makeup_datasets', load_datasets)
+
+
+def cache_metrics():
+    """Filter and scatter-bin cache lookups as (metric, labels, value) for the performance registry."""
+    for dataset, loaded in datasets.loaded():
+        for name, cache in (("filter", loaded.cache), ("scatter_bins", loaded.bin_cache)):
+            yield "makeup_cache_hits_total", {"cache": name, "dataset": dataset}, cache.hits
+            yield "makeup_cache_misses_total", {"cache": name, "dataset": dataset}, cache.misses
+    yield "makeup_dataset_bytes", {}, datasets.nbytes()
+
 
-pn.extension()
+# NEW: Opt-in instrumentation (MAKEUP_PERF=1); see makeupperf.py
+if ENABLED:
+    count_sent_bytes()
+    registry.add_collector("api_caches", cache_metrics)
 
-api = BeautyProductAPI()
-api.load_data('data/sephora_website_dataset.csv')
+
+def session_id():
+    """Identify the current browser session so the API can refine its last result."""
+    return id(pn.state.curdoc) if pn.state.curdoc is not None else None
+
+
+# NEW: The session's dataset, loaded on first use and held until the session ends
+def selected_dataset():
+    """Dataset named by the URL's ?dataset=, or the first one."""
+    requested = pn.state.session_args.get('dataset', [b''])[0].decode() if pn.state.session_args else ''
+    return requested if requested in DATA_SOURCES else next(iter(DATA_SOURCES))
+
+
+dataset_name = selected_dataset()
+api = datasets.acquire(dataset_name, session_id())
+if pn.state.curdoc is not None:
+    pn.state.on_session_destroyed(lambda session_context, session=session_id(): datasets.release(session))
+
+dataset = pn.widgets.Select(
+    name='Dataset',
+    options=list(DATA_SOURCES),
+    value=dataset_name,
+    visible=len(DATA_SOURCES) > 1
+)
+
+
+def switch_dataset(event):
+    # Every view is bound to the session's dataset, so a switch starts a new session on it
+    if pn.state.location is not None:
+        pn.state.location.reload = True
+        pn.state.location.update_query(dataset=event.new)
+
+
+dataset.param.watch(switch_dataset, 'value')
 
 # WIDGET DECLARATIONS - Filtering
+# NEW: Search box over product names, brands and ingredients (every word is matched as a prefix)
+search = pn.widgets.TextInput(
+    name='Search Products',
+    placeholder='e.g. vitamin c serum',
+    value=''
+)
+# Search as the user types: views already debounce their updates
+search.link(search, value_input='value')
+
 brand = pn.widgets.MultiChoice(
     name='Brands (select multiple)',
     options=api.get_options("brand")[1:],  # Remove 'All' option
@@ -66,6 +169,34 @@ sort_by = pn.widgets.Select(
     value='Rating (High to Low)'
 )
 
+# NEW: Catalog page (the API only returns the rows on this page)
+CATALOG_PAGE_SIZE = 25
+catalog_page = pn.widgets.IntInput(name='Page', value=1, start=1, width=120)
+
+# NEW: Format of the filtered data export (Parquet and Arrow are offered when pyarrow is installed)
+EXPORT_LABELS = {'csv': 'CSV', 'parquet': 'Parquet', 'arrow': 'Arrow IPC'}
+export_format = pn.widgets.Select(
+    name='Export Format',
+    options={EXPORT_LABELS[fmt]: fmt for fmt in export_formats()},
+    value='csv',
+    width=150
+)
+
+# NEW: Above this many visible points the scatter plot switches to binned counts
+SCATTER_MAX_POINTS = 50000
+
+# NEW: Sankey tiers and pruning (keeps the diagram small enough to draw whatever the data)
+SANKEY_COLUMNS = [c for c in ['brand', 'category', 'main_ingredient', 'country_of_origin', 'skin_type',
+                              'packaging_type', 'usage_frequency', 'gender_target'] if c in api.df.columns]
+sankey_tiers = pn.widgets.MultiChoice(
+    name='Sankey Tiers (in order)',
+    options=SANKEY_COLUMNS,
+    value=[c for c in ['brand', 'category', 'main_ingredient'] if c in SANKEY_COLUMNS]
+)
+sankey_max_nodes = pn.widgets.IntSlider(name='Max Nodes per Tier', start=5, end=50, step=5, value=15)
+sankey_top_k = pn.widgets.IntSlider(name='Top Links per Node', start=1, end=20, step=1, value=5)
+sankey_min_value = pn.widgets.IntSlider(name='Minimum Products per Link', start=1, end=100, step=1, value=1)
+
 # Plotting widgets
 width = pn.widgets.IntSlider(name="Width", start=250, end=2000, step=250, value=1500)
 height = pn.widgets.IntSlider(name="Height", start=200, end=2500, step=100, value=800)
@@ -73,58 +204,72 @@ height = pn.widgets.IntSlider(name="Height", start=200, end=2500, step=100, valu
 
 # CALLBACK FUNCTIONS
 
-def get_catalog(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
-    """Display filtered and sorted product data table"""
-    df = api.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
-
-    # Apply sorting
-    if not df.empty:
-        if sort_by == 'Rating (High to Low)':
-            df = df.sort_values('rating', ascending=False)
-        elif sort_by == 'Rating (Low to High)':
-            df = df.sort_values('rating', ascending=True)
-        elif sort_by == 'Price (Low to High)':
-            df = df.sort_values('price', ascending=True)
-        elif sort_by == 'Price (High to Low)':
-            df = df.sort_values('price', ascending=False)
-        elif sort_by == 'Most Loved':
-            if 'love' in df.columns:
-                df = df.sort_values('love', ascending=False)
-        elif sort_by == 'Most Reviewed':
-            if 'number_of_reviews' in df.columns:
-                df = df.sort_values('number_of_reviews', ascending=False)
-
-    # Select relevant columns for display
+def plotting():
+    """HoloViews with the DataFrame .hvplot accessor, imported on first use so they don't slow down startup"""
+    import holoviews as hv
+    import hvplot.pandas  # noqa: F401 (registers .hvplot)
+    return hv
+
+
+def get_catalog(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search, sort_by,
+                page):
+    """Display one page of the filtered and sorted product data table"""
+    # Only the requested page is sorted out and sent to the browser
     display_cols = ['name', 'brand', 'category', 'price', 'rating', 'number_of_reviews', 'love']
-    available_cols = [col for col in display_cols if col in df.columns]
+    df, total = api.get_catalog_page(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                     search, sort_by=sort_by, page=page, page_size=CATALOG_PAGE_SIZE,
+                                     columns=display_cols, session=session_id())
+
+    # The page input only goes up to the last page (set on the event loop, this runs on the view pool)
+    n_pages = max(-(-total // CATALOG_PAGE_SIZE), 1)
+    pn.state.execute(partial(catalog_page.param.update, end=n_pages, value=min(page, n_pages)))
+    if total == 0:
+        return pn.pane.Markdown("### No products match your filters. Try adjusting your criteria.")
 
+    # Past the last page (e.g. after the data was refreshed), show the last page instead
     if df.empty:
-        return pn.pane.Markdown("### No products match your filters. Try adjusting your criteria.")
+        return get_catalog(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search,
+                           sort_by, n_pages)
 
-    return pn.widgets.Tabulator(
-        df[available_cols],
-        selectable=False,
-        page_size=25,
-        sizing_mode='stretch_width',
-        titles={'name': 'Product Name', 'brand': 'Brand', 'category': 'Category',
-                'price': 'Price ($)', 'rating': 'Rating', 'number_of_reviews': '# Reviews', 'love': 'Loves'}
+    first = (min(page, n_pages) - 1) * CATALOG_PAGE_SIZE + 1
+    return pn.Column(
+        pn.pane.Markdown(f"Showing {first}-{first + len(df) - 1} of {total} products (page {page} of {n_pages})"),
+        pn.widgets.Tabulator(
+            df,
+            selectable=False,
+            sizing_mode='stretch_width',
+            titles={'name': 'Product Name', 'brand': 'Brand', 'category': 'Category',
+                    'price': 'Price ($)', 'rating': 'Rating', 'number_of_reviews': '# Reviews', 'love': 'Loves'}
+        )
     )
 
 
-def get_summary_stats(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
+def get_summary_stats(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search, sort_by):
     """Display summary statistics with product quality insights"""
-    df = api.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
-    summary = api.get_summary(df)
+    summary = api.get_filtered_summary(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                       search, session=session_id())
 
     avg_price = summary["Average Price"]
     avg_price_str = f"${avg_price:.2f}" if avg_price is not None else "N/A"
 
+    low, high = summary.get("Lowest Price"), summary.get("Highest Price")
+    price_range_str = f"${low:.2f} - ${high:.2f}" if low is not None and high is not None else "N/A"
+
     avg_rating = summary["Average Rating"]
     avg_rating_str = f"{avg_rating:.2f} ⭐" if avg_rating is not None else "N/A"
 
     # NEW: Highlight highly rated products
     highly_rated = summary.get("Highly Rated Products (4.5+)", 0)
 
+    # NEW: Percentiles (p10 / median / p90), approximate to within 1%
+    def percentiles(key, fmt):
+        values = summary.get(key)
+        return " / ".join(fmt.format(v) for v in values) if values is not None else "N/A"
+
+    price_pct_str = percentiles("Price Percentiles", "${:.2f}")
+    rating_pct_str = percentiles("Rating Percentiles", "{:.2f}")
+    review_pct_str = percentiles("Review Percentiles", "{:,.0f}")
+
     return pn.pane.Markdown(
         f"""
         ## 📊 Summary Statistics
@@ -133,6 +278,10 @@ def get_summary_stats(brand, category, online_only, exclusive, min_rating, price
         - **Average Rating:** {avg_rating_str}
         - **Highly Rated Products (4.5+):** {highly_rated} 🌟
         - **Average Price:** {avg_price_str}  
+        - **Price Range:** {price_range_str}  
+        - **Price p10 / Median / p90:** {price_pct_str}  
+        - **Rating p10 / Median / p90:** {rating_pct_str}  
+        - **Reviews p10 / Median / p90:** {review_pct_str}  
         - **Exclusive Products:** {summary['Exclusive Products']}  
         - **Online Only Products:** {summary['Online Only Products']}
 
@@ -143,18 +292,12 @@ def get_summary_stats(brand, category, online_only, exclusive, min_rating, price
     )
 
 
-def get_recommended_products(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
+def get_recommended_products(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search,
+                             sort_by):
     """Show top recommended products based on rating and reviews"""
-    df = api.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
-
-    if df.empty:
-        return pn.pane.Markdown("*No products available to recommend.*")
-
-    # Filter for highly rated products with decent number of reviews
-    recommended = df[
-        (df['rating'] >= 4.0) &
-        (df['number_of_reviews'] >= 50)
-        ].sort_values(['rating', 'number_of_reviews'], ascending=[False, False]).head(10)
+    # Highly rated products with decent number of reviews
+    recommended = api.get_top_rated(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                    search, n=10, rating_floor=4.0, reviews_floor=50, session=session_id())
 
     if recommended.empty:
         return pn.pane.Markdown("*No highly-rated products with sufficient reviews found. Try adjusting your filters.*")
@@ -175,32 +318,54 @@ def get_recommended_products(brand, category, online_only, exclusive, min_rating
     )
 
 
-def get_scatter(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
+def get_scatter(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search, sort_by):
     """Generate scatter plot of Price vs Rating with size by number of reviews"""
-    df = api.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
-
-    if df.empty or 'price' not in df or 'rating' not in df:
+    if 'price' not in api.df or 'rating' not in api.df:
         return pn.pane.Markdown("*No data available for scatter plot.*")
+    hv = plotting()
+
+    def view(x_range, y_range):
+        # Re-evaluated on zoom: exact points once few enough are in view, binned counts otherwise
+        result = api.get_scatter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                      search, x_range=x_range, y_range=y_range, max_points=SCATTER_MAX_POINTS,
+                                      session=session_id())
+        if result[0] == "points":
+            df = result[1]
+            # No bins, and no extent, so the axes fit the points; the overlay keeps the same layers on every zoom
+            density = hv.Image((np.empty(0), np.empty(0), np.empty((0, 0))), kdims=['price', 'rating'],
+                               vdims=['Products'])
+            title = f'Price vs Rating ({len(df)} products) - Bubble size = # of reviews'
+        else:
+            counts, x_edges, y_edges = result[1:]
+            x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+            y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+            # Empty bins are left transparent
+            density = hv.Image((x_centers, y_centers, np.where(counts.T > 0, counts.T, np.nan)),
+                               kdims=['price', 'rating'], vdims=['Products']).opts(cmap='RdPu', tools=['hover'])
+            df = api.df.iloc[:0]
+            title = f'Price vs Rating ({int(counts.sum())} products, binned) - zoom in to see individual products'
+
+        # Size bubbles by number of reviews (more reviews = bigger bubble = more reliable)
+        points = df.hvplot.scatter(
+            x='price', y='rating',
+            size='number_of_reviews',
+            hover_cols=['name', 'brand', 'category', 'number_of_reviews'],
+            color='#ffd1dc',
+            alpha=0.6
+        )
+        return (density * points).opts(title=title, width=900, height=600)
 
-    # Size bubbles by number of reviews (more reviews = bigger bubble = more reliable)
-    return df.hvplot.scatter(
-        x='price', y='rating',
-        size='number_of_reviews',
-        hover_cols=['name', 'brand', 'category', 'number_of_reviews'],
-        title=f'Price vs Rating ({len(df)} products) - Bubble size = # of reviews',
-        width=900, height=600,
-        color='#ffd1dc',
-        alpha=0.6
-    )
+    return hv.DynamicMap(view, streams=[hv.streams.RangeXY()])
 
 
-def get_top_brands(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
+def get_top_brands(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search, sort_by):
     """Bar plot of top 10 brands by average rating"""
     df = api.get_top_brands_by_rating(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
-                                      top_n=10)
+                                      search, top_n=10)
 
     if df.empty:
         return pn.pane.Markdown("*No data available for top brands.*")
+    plotting()
 
     return df.hvplot.barh(
         x='brand', y='rating',
@@ -212,12 +377,15 @@ def get_top_brands(brand, category, online_only, exclusive, min_rating, price_ra
     )
 
 
-def get_price_by_category(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
+def get_price_by_category(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search,
+                          sort_by):
     """Bar chart of average price by category"""
-    df = api.get_avg_price_by_category(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
+    df = api.get_avg_price_by_category(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                       search)
 
     if df.empty:
         return pn.pane.Markdown("*No data available for price by category.*")
+    plotting()
 
     return df.hvplot.bar(
         x='category', y='price',
@@ -230,37 +398,144 @@ def get_price_by_category(brand, category, online_only, exclusive, min_rating, p
     )
 
 
-def get_rating_distribution(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by):
+def get_rating_distribution(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search,
+                            sort_by):
     """Histogram of rating distribution"""
-    df = api.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
+    if 'rating' not in api.df:
+        return pn.pane.Markdown("*No data available for rating distribution.*")
 
-    if df.empty or 'rating' not in df:
+    # Bins are counted server-side; only the 20 counts and their edges reach the browser
+    counts, edges = api.get_histogram('rating', brand, category, online_only, exclusive, min_rating, price_range,
+                                      min_reviews, search, bins=20, session=session_id())
+    if not counts.any():
         return pn.pane.Markdown("*No data available for rating distribution.*")
 
-    return df.hvplot.hist(
-        'rating',
-        bins=20,
+    hv = plotting()
+    return hv.Histogram((edges, counts), kdims=['Rating'], vdims=['Number of Products']).opts(
         title='Rating Distribution - Find concentration of highly-rated products',
-        xlabel='Rating',
-        ylabel='Number of Products',
         width=900, height=600,
-        color='#ffd1dc'
+        color='#ffd1dc',
+        tools=['hover']
+    )
+
+
+def get_price_distribution(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search,
+                           sort_by):
+    """Histogram of price distribution over the selected price range"""
+    if 'price' not in api.df:
+        return pn.pane.Markdown("*No data available for price distribution.*")
+
+    counts, edges = api.get_histogram('price', brand, category, online_only, exclusive, min_rating, price_range,
+                                      min_reviews, search, bins=20, session=session_id())
+    if not counts.any():
+        return pn.pane.Markdown("*No data available for price distribution.*")
+
+    hv = plotting()
+    return hv.Histogram((edges, counts), kdims=['Price ($)'], vdims=['Number of Products']).opts(
+        title='Price Distribution',
+        width=900, height=600,
+        color='#ffd1dc',
+        tools=['hover']
     )
 
 
+@pn.cache(max_items=32)
+def build_sankey(name, load_id, version, key, tiers, max_nodes, top_k, min_value):
+    """Sankey figure for a filter spec; cached per dataset (and load of it), data version, filter spec, tiers and
+    pruning, since the cache is shared by the sessions of every dataset"""
+    brands, category, online_only, exclusive, min_rating, price_range, min_reviews, search = key
+    # Products per tier combination, so the diagram never needs the matching rows themselves
+    counts = api.get_flow_counts(tiers, list(brands), category, online_only, exclusive, min_rating, price_range,
+                                 min_reviews, ' '.join(search))
+    if counts.empty:
+        return None
+    return make_sankey(counts, *tiers, vals='count', max_nodes=max_nodes, top_k=top_k, min_value=min_value,
+                       width=1100, height=700)
+
+
+def get_sankey(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search, sort_by,
+               tiers, max_nodes, top_k, min_value):
+    """Sankey diagram of how the filtered products flow between the chosen tiers"""
+    if len(tiers) < 2:
+        return pn.pane.Markdown("*Pick at least two tiers for the Sankey diagram.*")
+
+    key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+    fig = build_sankey(dataset_name, datasets.load_id(dataset_name), api.version, key, tuple(tiers), max_nodes, top_k,
+                       min_value)
+    if fig is None:
+        return pn.pane.Markdown("*No data available for the Sankey diagram.*")
+    return pn.pane.Plotly(fig)
+
+
+@timed("makeup_callback_seconds", label="callback")
+def get_filtered_report():
+    """Markdown report of every product matching the current filters, for the download button"""
+    # Written to disk batch by batch rather than built up in memory
+    batches = api.filter_batches(brand.value, category.value, online_only.value, exclusive.value, min_rating.value,
+                                 price_range.value, min_reviews.value, search.value, session=session_id())
+    report = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    write_markdown_batches(batches, report)
+    report.seek(0)
+    return report
+
+
+report_download = pn.widgets.FileDownload(
+    callback=get_filtered_report,
+    filename='filtered_products.md',
+    label='Download filtered report',
+    button_type='primary',
+    width=250
+)
+
+
+@timed("makeup_callback_seconds", label="callback")
+def get_filtered_export():
+    """Every product matching the current filters in the chosen format, for the download button"""
+    # Written to disk batch by batch rather than built up in memory
+    out = tempfile.TemporaryFile()
+    api.export(out, export_format.value, brand.value, category.value, online_only.value, exclusive.value,
+               min_rating.value, price_range.value, min_reviews.value, search.value, session=session_id())
+    out.seek(0)
+    return out
+
+
+export_download = pn.widgets.FileDownload(
+    callback=get_filtered_export,
+    filename='filtered_products.csv',
+    label='Export filtered data',
+    button_type='primary',
+    width=250
+)
+
+
+def update_export_filename(event):
+    export_download.filename = f'filtered_products.{EXTENSIONS[event.new]}'
+
+
+export_format.param.watch(update_export_filename, 'value')
+
+
+def reset_catalog_page(event):
+    # New filters (or sort order) give a new list of products, which starts at its first page
+    catalog_page.value = 1
+
+
 # CALLBACK BINDINGS
-catalog = pn.bind(get_catalog, brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by)
-summary = pn.bind(get_summary_stats, brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
-                  sort_by)
-recommended = pn.bind(get_recommended_products, brand, category, online_only, exclusive, min_rating, price_range,
-                      min_reviews, sort_by)
-scatter = pn.bind(get_scatter, brand, category, online_only, exclusive, min_rating, price_range, min_reviews, sort_by)
-top_brands = pn.bind(get_top_brands, brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
-                     sort_by)
-price_category = pn.bind(get_price_by_category, brand, category, online_only, exclusive, min_rating, price_range,
-                         min_reviews, sort_by)
-rating_dist = pn.bind(get_rating_distribution, brand, category, online_only, exclusive, min_rating, price_range,
-                      min_reviews, sort_by)
+# Each view is debounced and computed off the event loop; stale results are dropped.
+# Tab views start inactive and only compute while their tab is the one being shown.
+filters = (brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search, sort_by)
+summary = ScheduledView(get_summary_stats, *filters)
+recommended = ScheduledView(get_recommended_products, *filters)
+catalog = ScheduledView(get_catalog, *filters, catalog_page, active=False)
+scatter = ScheduledView(get_scatter, *filters, active=False)
+top_brands = ScheduledView(get_top_brands, *filters, active=False)
+price_category = ScheduledView(get_price_by_category, *filters, active=False)
+rating_dist = ScheduledView(get_rating_distribution, *filters, active=False)
+price_dist = ScheduledView(get_price_distribution, *filters, active=False)
+sankey = ScheduledView(get_sankey, *filters, sankey_tiers, sankey_max_nodes, sankey_top_k, sankey_min_value,
+                       active=False)
+for widget in filters:
+    widget.param.watch(reset_catalog_page, 'value')
 
 # DASHBOARD WIDGET CONTAINERS
 card_width = 350
@@ -268,6 +543,8 @@ card_width = 350
 filter_card = pn.Card(
     pn.Column(
         pn.pane.Markdown("### 🔍 Product Filters"),
+        dataset,
+        search,
         brand,
         category,
         online_only,
@@ -307,22 +584,147 @@ plot_settings_card = pn.Card(
     collapsed=True
 )
 
+# TABS - only the visible tab's view is kept up to date
+tab_views = [recommended, catalog, scatter, top_brands, price_category, rating_dist, price_dist, sankey]
+tabs = pn.Tabs(
+    ("Recommended", recommended.panel),
+    ("All Products", pn.Column(pn.Row(catalog_page, report_download, export_format, export_download), catalog.panel)),
+    ("Price vs Rating", scatter.panel),
+    ("Top Brands", top_brands.panel),
+    ("Price by Category", price_category.panel),
+    ("Rating Distribution", rating_dist.panel),
+    ("Price Distribution", price_dist.panel),
+    ("Product Flow", pn.Row(pn.Column(sankey_tiers, sankey_max_nodes, sankey_top_k, sankey_min_value, width=300),
+                            sankey.panel)),
+    active=0,
+    dynamic=True
+)
+
+
+def activate_tab(event):
+    for i, view in enumerate(tab_views):
+        view.set_active(i == event.new)
+
+
+tabs.param.watch(activate_tab, 'active')
+
+# LIVE DATA - when a refresh swaps in new data, update the filter options and recompute the views
+data_version = api.version
+
+
+@timed("makeup_callback_seconds", label="callback")
+def check_for_new_data():
+    global data_version
+    if api.version == data_version:
+        return
+    data_version = api.version
+    brand.options = api.get_options("brand")[1:]
+    category.options = api.get_options("category")
+    for view in [summary] + tab_views:
+        view.refresh()
+
+
+pn.state.add_periodic_callback(check_for_new_data, period=REFRESH_SECONDS * 1000)
+
+# PERFORMANCE - admin-only view of the instrumentation (MAKEUP_PERF=1, admins listed in MAKEUP_ADMINS)
+profile_threshold = pn.widgets.FloatInput(name='Slow Interaction Threshold (s)', value=0.5, step=0.1, start=0,
+                                          width=200)
+profile_toggle = pn.widgets.Toggle(name='Profile Next Slow Interaction', button_type='warning', width=250)
+perf_refresh = pn.widgets.Button(name='Refresh', width=120)
+performance = pn.Column(sizing_mode='stretch_width')
+
+
+def toggle_profiler(event):
+    # Syncing the toggle to the profiler's own state must not re-arm it (which drops the last profile)
+    if event.new and not profiler.armed:
+        profiler.arm(profile_threshold.value)
+    elif not event.new and profiler.armed:
+        profiler.disarm()
+
+
+def get_profile():
+    """Collapsed stacks of the last captured slow interaction, for flamegraph.pl or speedscope"""
+    return io.StringIO(profiler.profile.collapsed() if profiler.profile is not None else "")
+
+
+profile_download = pn.widgets.FileDownload(callback=get_profile, filename='slow_interaction.folded',
+                                           label='Download profile', width=250)
+
+
+def update_performance(*events):
+    """Redraw the Performance tab from the current metrics"""
+    # The profiler disarms itself once it has caught a slow interaction
+    profile_toggle.value = profiler.armed
+
+    latencies = pd.DataFrame(registry.latencies(), columns=['metric', 'labels', 'count', 'mean', 'p50', 'p95',
+                                                            'p99', 'max'])
+    # Seconds are shown in ms; message sizes stay in bytes
+    timing = latencies['metric'].str.endswith('_seconds')
+    for col in ['mean', 'p50', 'p95', 'p99', 'max']:
+        latencies[col] = latencies[col].astype(float).where(~timing, latencies[col].astype(float) * 1000).round(2)
+
+    counters = pd.DataFrame([(name, ','.join(f'{k}={v}' for k, v in labels), value)
+                             for name, labels, value in registry.values()], columns=['metric', 'labels', 'value'])
+
+    # Rows scanned vs returned per query path: how much work each returned row cost
+    rows = counters[counters['metric'].isin(['makeup_rows_scanned_total', 'makeup_rows_returned_total'])]
+    rows = rows.pivot_table(index='labels', columns='metric', values='value', aggfunc='sum')
+    lines = [f"- **{path}:** {row.get('makeup_rows_scanned_total', 0):,.0f} scanned, "
+             f"{row.get('makeup_rows_returned_total', 0):,.0f} returned" for path, row in rows.iterrows()]
+
+    profile = profiler.profile
+    if profile is not None:
+        profile_text = (f"**Last slow interaction:** `{profile.label}` took {profile.seconds:.2f}s "
+                        f"({profile.n_samples} samples every {profile.interval * 1000:.0f}ms)")
+        profile_table = pd.DataFrame(profile.top(20), columns=['frame', 'self samples', 'total samples'])
+    else:
+        profile_text = "*Arm the profiler to capture the next interaction slower than the threshold.*"
+        profile_table = None
+
+    performance.objects = [
+        pn.Row(perf_refresh, profile_threshold, profile_toggle, profile_download),
+        pn.pane.Markdown("### Latency (ms; message sizes in bytes)"),
+        pn.widgets.Tabulator(latencies, disabled=True, show_index=False, sizing_mode='stretch_width'),
+        pn.pane.Markdown("### Rows Scanned vs Returned\n" + ("\n".join(lines) or "*No filter queries yet.*")),
+        pn.pane.Markdown("### Counters"),
+        pn.widgets.Tabulator(counters, disabled=True, show_index=False, sizing_mode='stretch_width'),
+        pn.pane.Markdown("### Profile\n" + profile_text),
+    ] + ([pn.widgets.Tabulator(profile_table, disabled=True, show_index=False, sizing_mode='stretch_width')]
+         if profile_table is not None else [])
+
+
+if ENABLED and is_admin(pn.state.user):
+    profile_toggle.param.watch(toggle_profiler, 'value')
+    perf_refresh.on_click(update_performance)
+    update_performance()
+    tabs.append(("Performance", performance))
+    pn.state.add_periodic_callback(update_performance, period=REFRESH_SECONDS * 1000)
+
+# WARM-UP - once the first session has rendered, import the plotting libraries and draw a throwaway
+# Sankey in the background, so the first chart tab opened doesn't pay for them
+def warm_up():
+    plotting()
+    sample = api.df.head(100)
+    if not sample.empty:
+        make_sankey(sample, *SANKEY_COLUMNS[:2])
+
+
+def start_warm_up():
+    if not pn.state.cache.get('makeup_warm_up'):
+        pn.state.cache['makeup_warm_up'] = True
+        threading.Thread(target=warm_up, name='makeup-warm-up', daemon=True).start()
+
+
+pn.state.onload(start_warm_up)
+
 # LAYOUT
 layout = pn.template.FastListTemplate(
     title="Sephora Product Finder - Discover the Best Beauty Products",
     sidebar=[filter_card, quality_filter_card, sort_card, plot_settings_card],
     theme_toggle=False,
     main=[
-        summary,
-        pn.Tabs(
-            ("Recommended", recommended),
-            ("All Products", catalog),
-            ("Price vs Rating", scatter),
-            ("Top Brands", top_brands),
-            ("Price by Category", price_category),
-            ("Rating Distribution", rating_dist),
-            active=0
-        )
+        summary.panel,
+        tabs
     ],
     header_background='#ffd1dc'
 ).servable()
@@ -1,70 +1,701 @@
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 
+from makeupcube import AggregateCube
+from makeupexport import BATCH_ROWS, row_batches, write_export
+from makeupindex import ProductIndex, column_scalar
+from makeupperf import count_rows, timed
+from makeupsearch import matches, search_terms
+from makeupsketch import SKETCHED, bucket_counts, percentile_summary
+from makeupstore import (SCHEMA, cache_dir_for, canonical_columns, load_columns, read_typed_csv, schema_dtypes,
+                         settle_nullable)
+
+logger = logging.getLogger(__name__)
+
+
+# Catalog sort options offered by the dashboard: column and direction
+SORT_OPTIONS = {
+    'Rating (High to Low)': ('rating', False),
+    'Rating (Low to High)': ('rating', True),
+    'Price (Low to High)': ('price', True),
+    'Price (High to Low)': ('price', False),
+    'Most Loved': ('love', False),
+    'Most Reviewed': ('number_of_reviews', False),
+}
+
+
+def filter_key(brand=None, category='All', online_only='All', exclusive='All',
+               min_rating=0, price_range=(0, 500), min_reviews=0, search=''):
+    """Normalize dashboard widget values into a hashable filter spec.
+
+    search - search box text; products must have a word starting with each of its words
+    """
+    # Values that disable a filter all collapse to the same key
+    brands = tuple(sorted(set(brand))) if brand else ()
+    category = category if category and category != 'All' else 'All'
+    online_only = online_only if online_only and online_only != 'All' else 'All'
+    exclusive = exclusive if exclusive and exclusive != 'All' else 'All'
+    min_rating = float(min_rating) if min_rating > 0 else 0.0
+    price_range = (float(price_range[0]), float(price_range[1])) if price_range else None
+    min_reviews = float(min_reviews) if min_reviews > 0 else 0.0
+    return brands, category, online_only, exclusive, min_rating, price_range, min_reviews, search_terms(search)
+
+
+def is_narrowing(old, new):
+    """True if every row matching filter spec `new` also matches `old`."""
+    old_brands, old_category, old_online, old_exclusive, old_rating, old_price, old_reviews, old_search = old
+    brands, category, online_only, exclusive, min_rating, price_range, min_reviews, search = new
+
+    if old_brands and not (brands and set(brands) <= set(old_brands)):
+        return False
+    for old_value, value in ((old_category, category), (old_online, online_only), (old_exclusive, exclusive)):
+        if old_value != "All" and old_value != value:
+            return False
+    if old_price and not (price_range and old_price[0] <= price_range[0] and price_range[1] <= old_price[1]):
+        return False
+    # Typing on extends a search term, which only matches fewer words
+    if not all(any(term.startswith(old_term) for term in search) for old_term in old_search):
+        return False
+    return min_rating >= old_rating and min_reviews >= old_reviews
+
+
+def quantize(values, steps_per_unit=10):
+    """Integer grid positions of `values` (-1 for missing), or None if they aren't all on the grid."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    steps = np.rint(values[valid] * steps_per_unit)
+    if not np.allclose(steps, values[valid] * steps_per_unit, rtol=0, atol=1e-3):
+        return None
+    quantized = np.full(len(values), -1, dtype=np.int32)
+    quantized[valid] = steps
+    return quantized
+
+
+def save_array(path, array):
+    """np.save `array` to `path`, replacing any previous file in one rename."""
+    tmp = f"{path}.tmp-{os.getpid()}.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def load_array(path, length, mmap=False):
+    """The array saved at `path`, or None if there isn't one of `length` items."""
+    try:
+        array = np.load(path, mmap_mode="r" if mmap else None)
+    except (OSError, ValueError):
+        return None
+    return array if len(array) == length else None
+
+
+def scan(df, key):
+    """Row positions of `df` matching a normalized filter spec, from one boolean mask (no index)."""
+    brands, category, online_only, exclusive, min_rating, price_range, min_reviews, search = key
+    mask = np.ones(len(df), dtype=bool)
+
+    # Handle multiple brand selection
+    if brands:
+        mask &= df["brand"].isin(brands).to_numpy()
+
+    if category != "All":
+        mask &= (df["category"] == category).to_numpy()
+
+    if online_only != "All" and "online_only" in df.columns:
+        filter_val = 1 if online_only == "Yes" else 0
+        mask &= (df["online_only"] == filter_val).to_numpy()
+
+    if exclusive != "All" and "exclusive" in df.columns:
+        filter_val = 1 if exclusive == "Yes" else 0
+        mask &= (df["exclusive"] == filter_val).to_numpy()
+
+    # NEW: Filter by minimum rating
+    if "rating" in df.columns and min_rating > 0:
+        rating = df["rating"].to_numpy()
+        mask &= rating >= column_scalar(rating, min_rating)
+
+    # NEW: Filter by price range
+    if "price" in df.columns and price_range:
+        price = df["price"].to_numpy()
+        mask &= (price >= column_scalar(price, price_range[0])) & (price <= column_scalar(price, price_range[1]))
+
+    # NEW: Filter by minimum reviews
+    if "number_of_reviews" in df.columns and min_reviews > 0:
+        reviews = df["number_of_reviews"].to_numpy()
+        mask &= reviews >= column_scalar(reviews, min_reviews)
+
+    # NEW: Text search, checked last on the rows still left
+    if search:
+        rows = np.flatnonzero(mask)
+        return rows[matches(df.take(rows), search)]
+
+    return np.flatnonzero(mask)
+
+
+class FilterCache:
+    """Thread-safe LRU of filter results, bounded by a memory budget.
+
+    Results are stored as read-only arrays of row positions into the loaded
+    DataFrame, so one entry costs 8 bytes per matching row.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, key, rows):
+        rows.setflags(write=False)
+        if rows.nbytes > self.max_bytes:
+            return rows
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = rows
+            self.nbytes += rows.nbytes
+
+            # Evict least recently used results until we are back under budget
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def flow_counts(df, tiers):
+    """Rows of `df` per combination of `tiers` values (missing values included): the tier columns plus "count"."""
+    tiers = list(tiers)
+    return df[tiers].groupby(tiers, dropna=False, observed=True, sort=False).size().rename("count").reset_index()
+
+
+def append_rows(df, added):
+    """`df` with the rows of `added` appended; categoricals keep their codes and gain any new categories."""
+    if added.empty:
+        return df.reset_index(drop=True)
+    data = {}
+    for col in df.columns:
+        old = df[col].reset_index(drop=True)
+        new = added[col] if col in added.columns else pd.Series(np.nan, index=added.index)
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            # Existing codes are reused as they are; unseen values become new categories at the end
+            categories = old.cat.categories
+            unseen = [v for v in pd.unique(new.dropna().astype(object)) if v not in categories]
+            categories = categories.append(pd.Index(unseen, dtype=categories.dtype)) if unseen else categories
+            codes = np.concatenate([old.cat.codes.to_numpy(), categories.get_indexer(new.astype(object))])
+            data[col] = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories), validate=False)
+        else:
+            # Keep the column's dtype (e.g. float32) unless the new values don't fit it
+            if old.dtype.kind == "f" or not new.isna().any():
+                try:
+                    new = new.astype(old.dtype)
+                except (TypeError, ValueError):
+                    pass
+            # Missing ints or flags arrive as float (see makeupstore.NULLABLE); both sides take the wider dtype
+            if old.dtype != new.dtype and old.dtype.kind in "biuf" and getattr(new.dtype, "kind", "") in "biuf":
+                dtype = np.result_type(old.dtype, new.dtype)
+                old, new = old.astype(dtype), new.astype(dtype)
+            data[col] = pd.concat([old, new.reset_index(drop=True)], ignore_index=True)
+    return pd.DataFrame(data)
+
+
+class Snapshot:
+    """One version of the data and everything derived from it.
+
+    Snapshots are never modified; a refresh builds a new one and swaps it in,
+    so a query that started on the old one finishes on consistent data.
+    """
+
+    def __init__(self, df=None, index=None, cube=None, rating_steps=None, version=0):
+        self.df = df
+        self.index = index
+        self.cube = cube
+        self.rating_steps = rating_steps
+        self.version = version
+
 
 class BeautyProductAPI:
-    def __init__(self):
-        self.df = None
+    def __init__(self, cache_bytes=64 * 1024 * 1024, max_sessions=1024):
+        self.snapshot = Snapshot()
+        # Filter results shared by every callback (and session) using this instance
+        self.cache = FilterCache(cache_bytes)
+        # Deterministic 2D bin counts for the scatter plot, keyed on filter spec and view
+        self.bin_cache = FilterCache(16 * 1024 * 1024)
+        # Last (version, filter spec, rows) per dashboard session, refined when a filter is tightened
+        self.max_sessions = max_sessions
+        self._last = OrderedDict()
+        self._last_lock = threading.Lock()
+        # Where the data came from, to pick up appended rows and delta files
+        self.source = None
+        self._offset = 0
+        self._applied = set()
+        self._refresh_lock = threading.RLock()
+        self._stop = None
+
+    # The current snapshot's parts; methods that use several take one snapshot up front instead
+    @property
+    def df(self):
+        return self.snapshot.df
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    @property
+    def cube(self):
+        return self.snapshot.cube
 
-    def load_data(self, path):
-        """Load the Sephora dataset."""
-        self.df = pd.read_csv(path)
+    @property
+    def rating_steps(self):
+        return self.snapshot.rating_steps
 
-        # Normalize column names for consistency
-        self.df.columns = [c.strip() for c in self.df.columns]
+    @property
+    def version(self):
+        return self.snapshot.version
 
-        # Ensure required columns exist
-        required_cols = ["brand", "category"]
-        for col in required_cols:
-            if col not in self.df.columns:
-                raise ValueError(f"Missing required column: {col}")
+    @timed("makeup_api_seconds")
+    def load_data(self, path, columns=None, typed=False, cache=False, mmap=False):
+        """Load the Sephora dataset.
 
+        typed - read with the explicit dtype schema (categoricals, float32, int32, bool)
+        cache - also keep a binary columnar copy next to the CSV and reuse it on later loads
+        mmap - memory-map the columnar copy and its indexes read-only (implies cache), so
+               processes serving the same CSV share one physical copy
+        columns - only load these columns
+
+        Delta files already waiting in `<path>.deltas/` are applied (see refresh).
+        """
+        with self._refresh_lock:
+            offset = os.path.getsize(path)
+            cache = cache or mmap
+            if cache:
+                df = load_columns(path, SCHEMA, columns, mmap=mmap)
+            elif typed or columns is not None:
+                df = read_typed_csv(path, SCHEMA if typed else {}, columns)
+            else:
+                df = pd.read_csv(path)
+
+            # Source column names become the canonical ones (Product_Name -> name, Brand -> brand, ...)
+            df.columns = canonical_columns(df.columns)
+
+            # Ensure required columns exist
+            required_cols = ["brand", "category"]
+            for col in required_cols:
+                if col not in df.columns:
+                    raise ValueError(f"Missing required column: {col}")
+
+            # Build the row-id indexes once so filtering never rescans the frame
+            index_dir = os.path.join(cache_dir_for(path), "index")
+            index = ProductIndex.load(index_dir, df, mmap) if cache else None
+            built = index is None
+            if built:
+                index = ProductIndex(df)
+                if cache:
+                    index.save(index_dir)
+
+            # Pre-aggregated sums and counts answer the chart tabs without touching rows; cached
+            # next to the index (and rebuilt with it) so workers map one copy of the cube too
+            has_cube_cols = {"brand", "category", "rating", "price"} <= set(df.columns)
+            cube_dir = os.path.join(cache_dir_for(path), "cube")
+            cube = AggregateCube.load(cube_dir, index, mmap) if has_cube_cols and cache and not built else None
+            if cube is None and has_cube_cols:
+                cube = AggregateCube(index)
+                if cache:
+                    cube.save(cube_dir)
+                    # Map what we just wrote, like the columns, unless another process replaced it meanwhile
+                    cube = AggregateCube.load(cube_dir, index, mmap) if mmap else cube
+
+            # Ratings are on a 0.1 grid, so their histogram can be counted exactly with bincount
+            rating_steps = None
+            if "rating" in df.columns:
+                steps_file = os.path.join(cache_dir_for(path), "rating_steps.npy")
+                rating_steps = load_array(steps_file, len(df), mmap) if cache and not built else None
+                if rating_steps is None:
+                    rating_steps = quantize(df["rating"].to_numpy())
+                    if cache and rating_steps is not None:
+                        save_array(steps_file, rating_steps)
+                        rating_steps = load_array(steps_file, len(df), mmap) if mmap else rating_steps
+
+            self.source = {"path": path, "columns": columns, "typed": typed, "cache": cache, "mmap": mmap}
+            self._offset = offset
+            self._applied = set()
+            self._swap(Snapshot(df, index, cube, rating_steps, self.version + 1))
+            self.refresh()
         return self.df
 
+    def _swap(self, snapshot):
+        """Make `snapshot` current; results cached for older versions can no longer be hit."""
+        self.snapshot = snapshot
+        self.cache.clear()
+        self.bin_cache.clear()
+        with self._last_lock:
+            self._last.clear()
+
+    @timed("makeup_api_seconds")
+    def refresh(self, key=("brand", "name")):
+        """Pick up changes to the source since the last load or refresh, without reloading it.
+
+        Two kinds of change are applied, in this order:
+        - delta files, `<path>.deltas/*.csv` in name order, each applied once. They
+          have the dataset's columns plus an `op` column: "delete" removes the
+          products with the same `key` columns, anything else upserts the row
+        - rows appended to the CSV itself
+
+        `key` need not be unique (brand and name repeat in real catalogs): a delta
+        row applies to every product with its key. A delete removes all of them; an
+        upsert removes all of them and appends the delta's rows for that key. All
+        removals of one delta file happen before its rows are appended.
+
+        Changes are applied to the columns, indexes and aggregate cube of a new
+        snapshot that is swapped in once complete. A CSV that shrank was rewritten
+        and is loaded again from scratch. Rows that can't be parsed are skipped and
+        logged (see _read_rows). Returns True if the data changed.
+        """
+        with self._refresh_lock:
+            if self.source is None:
+                return False
+            path = self.source["path"]
+            if os.path.getsize(path) < self._offset:
+                self.load_data(**self.source)
+                return True
+
+            snapshot = self.snapshot
+            typed = self.source["typed"] or self.source["cache"]
+            delta_dir = f"{path}.deltas"
+            names = sorted(os.listdir(delta_dir)) if os.path.isdir(delta_dir) else []
+            for name in names:
+                if name.endswith(".csv") and name not in self._applied:
+                    with open(os.path.join(delta_dir, name), "rb") as f:
+                        header = f.readline()
+                        delta = self._read_rows(header, f.read(), name, typed)
+                    ops = delta.pop("op").astype(str).str.lower() if "op" in delta else pd.Series("", index=delta.index)
+                    changed = self._matches(snapshot.df, delta, key)
+                    snapshot = self._apply(snapshot, ~changed, delta[(ops != "delete").to_numpy()])
+                    self._applied.add(name)
+
+            with open(path, "rb") as f:
+                header = f.readline()
+                f.seek(self._offset)
+                tail = f.read()
+            # Only whole lines; a row still being written is picked up next time
+            tail = tail[:tail.rfind(b"\n") + 1]
+            if tail.strip():
+                snapshot = self._apply(snapshot, None, self._read_rows(header, tail, os.path.basename(path), typed))
+            self._offset += len(tail)
+
+            if snapshot is self.snapshot:
+                return False
+            self._swap(snapshot)
+            return True
+
+    def _read_rows(self, header, lines, source, typed):
+        """Parse CSV `lines` (bytes) under the `header` line, with the dtype schema if `typed`.
+
+        Lines that can't be parsed (e.g. text in a number column, too many fields)
+        are left out and logged, so a bad row never holds up later refreshes.
+        """
+        names = pd.read_csv(io.BytesIO(header), nrows=0).columns
+        dtype = schema_dtypes(names, SCHEMA, nullable=True) if typed else None
+        try:
+            df = pd.read_csv(io.BytesIO(header + lines), dtype=dtype)
+        except ValueError:
+            # Parse line by line to find the bad ones; only on this slow path
+            frames, rejected = [], []
+            for line in lines.splitlines(keepends=True):
+                if not line.strip():
+                    continue
+                try:
+                    frames.append(pd.read_csv(io.BytesIO(header + line), dtype=dtype))
+                except ValueError:
+                    rejected.append(line)
+            logger.warning("Skipped %d unreadable row(s) in %s: %s", len(rejected), source,
+                           b"".join(rejected[:5]).decode(errors="replace"))
+            df = pd.concat(frames, ignore_index=True) if frames else pd.read_csv(io.BytesIO(header), dtype=dtype)
+        df.columns = canonical_columns(df.columns)
+        return settle_nullable(df)
+
+    def _matches(self, df, rows, key):
+        """Mask of the products in `df` whose `key` columns equal those of one of `rows`."""
+        if not set(key) <= set(df.columns) & set(rows.columns):
+            raise ValueError(f"Delta files and the loaded columns must include the key columns {key}")
+        key = list(key)
+        if rows.empty:
+            return np.zeros(len(df), dtype=bool)
+        wanted = pd.MultiIndex.from_frame(rows[key].astype(object))
+        return pd.MultiIndex.from_frame(df[key].astype(object)).isin(wanted)
+
+    def _apply(self, snapshot, keep, added):
+        """A new snapshot: `snapshot` without the rows not in `keep`, with `added` appended."""
+        if (keep is None or keep.all()) and added.empty:
+            return snapshot
+        df = snapshot.df
+        kept = df if keep is None else df[keep]
+        df = append_rows(kept, added)
+
+        index = snapshot.index.updated(df, keep) if snapshot.index is not None else None
+        cube = snapshot.cube.updated(index, keep) if snapshot.cube is not None else None
+        rating_steps = None
+        if snapshot.rating_steps is not None:
+            new_steps = quantize(df["rating"].to_numpy()[len(kept):])
+            if new_steps is not None:
+                old_steps = snapshot.rating_steps if keep is None else snapshot.rating_steps[keep]
+                rating_steps = np.concatenate([old_steps, new_steps])
+        return Snapshot(df, index, cube, rating_steps, snapshot.version + 1)
+
+    def watch(self, interval=10):
+        """Call refresh every `interval` seconds on a background thread (until stop_watching)."""
+        if self._stop is not None:
+            return
+        self._stop = threading.Event()
+
+        def run(stop):
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    # E.g. a file caught mid-write; try again next time
+                    logger.warning("Refreshing %s failed", self.source and self.source["path"], exc_info=True)
+
+        threading.Thread(target=run, args=(self._stop,), name="makeup-refresh", daemon=True).start()
+
+    def stop_watching(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    @timed("makeup_api_seconds")
     def get_options(self, column):
         """Get unique options for filters."""
-        if column not in self.df.columns:
+        snapshot = self.snapshot
+        df = snapshot.df
+        if column not in df.columns:
             return []
-        options = sorted([x for x in self.df[column].dropna().unique() if pd.notna(x)])
+        # Indexed columns are already factorized, so only their labels need sorting
+        if snapshot.index is not None and column in snapshot.index.lookup:
+            return ['All'] + snapshot.index.options(column)
+        options = sorted([x for x in df[column].dropna().unique() if pd.notna(x)])
         return ['All'] + options
 
+    @timed("makeup_api_seconds")
+    def filter_rows(self, brand=None, category='All', online_only='All', exclusive='All',
+                    min_rating=0, price_range=(0, 500), min_reviews=0, search='', session=None):
+        """Return the (read-only) row positions matching the dashboard widget values.
+
+        session - any hashable id for the caller; its previous result is refined
+                  instead of re-queried when only a filter was tightened (slider drags)
+        """
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        return self._rows(self.snapshot, key, session)
+
+    def _rows(self, snapshot, key, session=None):
+        """Row positions in `snapshot` matching a normalized filter spec."""
+        rows = self.cache.get((snapshot.version, key))
+        if rows is None:
+            last = self._last.get(session) if session is not None else None
+            if snapshot.index is None:
+                rows = scan(snapshot.df, key)
+                count_rows("scan", len(snapshot.df), len(rows))
+            elif last is not None and last[0] == snapshot.version and is_narrowing(last[1], key):
+                rows = snapshot.index.refine(last[2], key)
+                count_rows("refine", len(last[2]), len(rows))
+            else:
+                stats = {}
+                rows = snapshot.index.query(key, stats)
+                count_rows("index", stats["scanned"], len(rows))
+            rows = self.cache.put((snapshot.version, key), rows)
+
+        if session is not None:
+            with self._last_lock:
+                self._last[session] = (snapshot.version, key, rows)
+                self._last.move_to_end(session)
+                if len(self._last) > self.max_sessions:
+                    self._last.popitem(last=False)
+        return rows
+
+    @timed("makeup_api_seconds")
     def filter_data(self, brand=None, category='All', online_only='All', exclusive='All',
-                    min_rating=0, price_range=(0, 500), min_reviews=0):
+                    min_rating=0, price_range=(0, 500), min_reviews=0, search='', session=None):
         """Filter the dataset according to dashboard widget values."""
-        df = self.df.copy()
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        rows = self._rows(snapshot, key, session)
+        # Only the matching rows are gathered; the full frame is never copied
+        return snapshot.df.take(rows)
+
+    @timed("makeup_api_seconds")
+    def export(self, out, fmt='csv', brand=None, category='All', online_only='All', exclusive='All',
+               min_rating=0, price_range=(0, 500), min_reviews=0, search='', columns=None, batch_rows=BATCH_ROWS,
+               session=None):
+        """Write the products matching the dashboard widget values to `out` (a path or binary file).
+
+        fmt - "csv", "parquet" or "arrow" (IPC stream); the last two need pyarrow
+        columns - columns to write (default all)
+        Rows are gathered from the dataset `batch_rows` at a time, so memory stays
+        flat however many match. Returns the number of rows written.
+        """
+        batches = self.filter_batches(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                      search, columns, batch_rows, session)
+        return write_export(batches, out, fmt)
+
+    def filter_batches(self, brand=None, category='All', online_only='All', exclusive='All',
+                       min_rating=0, price_range=(0, 500), min_reviews=0, search='', columns=None,
+                       batch_rows=BATCH_ROWS, session=None):
+        """Yield the matching products as DataFrames of at most `batch_rows` rows (one empty one if none match).
+
+        Unlike filter_data, only one batch is held at a time, however large the result.
+        """
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        rows = self._rows(snapshot, key, session)
+        yield from row_batches(snapshot.df, rows, columns, batch_rows)
+
+    @timed("makeup_api_seconds")
+    def get_flow_counts(self, tiers, brand=None, category='All', online_only='All', exclusive='All',
+                        min_rating=0, price_range=(0, 500), min_reviews=0, search=''):
+        """Matching products per combination of `tiers` values, for the Sankey diagram (see flow_counts)."""
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        rows = self._rows(snapshot, key)
+        return flow_counts(next(row_batches(snapshot.df, rows, tiers, max(len(rows), 1))), tiers)
+
+    @timed("makeup_api_seconds")
+    def get_catalog_page(self, brand=None, category='All', online_only='All', exclusive='All',
+                         min_rating=0, price_range=(0, 500), min_reviews=0, search='', sort_by=None,
+                         page=1, page_size=25, columns=None, session=None):
+        """Return one page of the filtered, sorted catalog and the total number of matches."""
+        snapshot = self.snapshot
+        df, index = snapshot.df, snapshot.index
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        rows = self._rows(snapshot, key, session)
+        start = (max(page, 1) - 1) * page_size
+        stop = start + page_size
+
+        col, ascending = SORT_OPTIONS.get(sort_by, (None, True))
+        if col not in df.columns:
+            page_rows = rows[start:stop]
+        elif index is not None and col in index.values:
+            page_rows = index.sort_rows(rows, col, ascending, start, stop)
+        else:
+            page_rows = df[col].take(rows).sort_values(ascending=ascending, kind='stable').index[start:stop]
+            page_rows = df.index.get_indexer(page_rows)
+
+        df = df.take(page_rows)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df, len(rows)
 
-        # Handle multiple brand selection
-        if brand and len(brand) > 0:
-            df = df[df["brand"].isin(brand)]
+    @timed("makeup_api_seconds")
+    def get_top_rated(self, brand=None, category='All', online_only='All', exclusive='All',
+                      min_rating=0, price_range=(0, 500), min_reviews=0, search='', n=10, rating_floor=4.0,
+                      reviews_floor=50, session=None):
+        """Best rated, most reviewed products with at least `rating_floor` stars and `reviews_floor` reviews."""
+        df = self.filter_data(brand, category, online_only, exclusive, max(min_rating, rating_floor), price_range,
+                              max(min_reviews, reviews_floor), search, session)
+        if df.empty:
+            return df
+        return df.sort_values(['rating', 'number_of_reviews'], ascending=[False, False], kind='stable').head(n)
 
-        if category and category != "All":
-            df = df[df["category"] == category]
+    @timed("makeup_api_seconds")
+    def get_scatter_data(self, brand=None, category='All', online_only='All', exclusive='All',
+                         min_rating=0, price_range=(0, 500), min_reviews=0, search='', x_range=None, y_range=None,
+                         max_points=50000, bins=(200, 100), session=None):
+        """Price vs rating data for the scatter plot, at a level of detail the browser can handle.
 
-        if online_only and online_only != "All":
-            filter_val = 1 if online_only == "Yes" else 0
-            if "online_only" in df.columns:
-                df = df[df["online_only"] == filter_val]
+        Returns ("points", DataFrame) when at most `max_points` products fall inside the
+        visible x (price) / y (rating) ranges, otherwise ("bins", counts, x_edges, y_edges)
+        with int64 counts[i, j] of products in x bin i and y bin j. Bins are fixed by the
+        ranges, so the same inputs always give byte-identical counts.
+        """
+        snapshot = self.snapshot
+        df = snapshot.df
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        rows = self._rows(snapshot, key, session)
+        price = df["price"].to_numpy()[rows]
+        rating = df["rating"].to_numpy()[rows]
 
-        if exclusive and exclusive != "All":
-            filter_val = 1 if exclusive == "Yes" else 0
-            if "exclusive" in df.columns:
-                df = df[df["exclusive"] == filter_val]
+        x_range = tuple(x_range) if x_range else tuple(price_range or (0, 500))
+        y_range = tuple(y_range) if y_range else (0, 5)
+        visible = (price >= x_range[0]) & (price <= x_range[1]) & (rating >= y_range[0]) & (rating <= y_range[1])
 
-        # NEW: Filter by minimum rating
-        if "rating" in df.columns and min_rating > 0:
-            df = df[df["rating"] >= min_rating]
+        x_edges = np.linspace(x_range[0], x_range[1], bins[0] + 1)
+        y_edges = np.linspace(y_range[0], y_range[1], bins[1] + 1)
+        if np.count_nonzero(visible) <= max_points:
+            columns = [c for c in ("price", "rating", "number_of_reviews", "name", "brand", "category")
+                       if c in df.columns]
+            return "points", df.take(rows[visible])[columns]
 
-        # NEW: Filter by price range
-        if "price" in df.columns and price_range:
-            df = df[(df["price"] >= price_range[0]) & (df["price"] <= price_range[1])]
+        bin_key = (snapshot.version, key, x_range, y_range, tuple(bins))
+        counts = self.bin_cache.get(bin_key)
+        if counts is None:
+            counts, _, _ = np.histogram2d(price[visible], rating[visible], bins=[x_edges, y_edges])
+            counts = self.bin_cache.put(bin_key, counts.astype(np.int64))
+        return "bins", counts, x_edges, y_edges
 
-        # NEW: Filter by minimum reviews
-        if "number_of_reviews" in df.columns and min_reviews > 0:
-            df = df[df["number_of_reviews"] >= min_reviews]
+    @timed("makeup_api_seconds")
+    def get_histogram(self, column, brand=None, category='All', online_only='All', exclusive='All',
+                      min_rating=0, price_range=(0, 500), min_reviews=0, search='', bins=20, value_range=None,
+                      session=None):
+        """Histogram of `column` over the filtered products as (counts, bin_edges), computed server-side.
 
-        return df
+        value_range defaults to 0-5 for rating, the price filter for price and the
+        data's min/max otherwise. Only bins + (bins + 1) numbers need to reach the browser.
+        """
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        rows = self._rows(snapshot, key, session)
+        if value_range is None:
+            if column == "rating":
+                value_range = (0, 5)
+            elif column == "price" and price_range:
+                value_range = price_range
+            else:
+                values = snapshot.df[column].to_numpy()
+                value_range = (np.nanmin(values), np.nanmax(values)) if len(values) else (0, 1)
+        low, high = float(value_range[0]), float(value_range[1])
+        edges = np.linspace(low, high, bins + 1)
 
-    def get_summary(self, df):
-        """Return summary metrics used in visualizations."""
+        if column == "rating" and snapshot.rating_steps is not None and (low, high) == (0, 5):
+            # Count each 0.1 step once, then fold the 51 steps into the bins with integer arithmetic
+            steps = snapshot.rating_steps[rows]
+            per_step = np.bincount(steps[steps >= 0], minlength=51)[:51]
+            bin_of_step = np.minimum(np.arange(51) * bins // 50, bins - 1)
+            return np.bincount(bin_of_step, weights=per_step, minlength=bins).astype(np.int64), edges
+
+        values = snapshot.df[column].to_numpy()[rows]
+        counts, _ = np.histogram(values[~np.isnan(values)] if values.dtype.kind == "f" else values, bins=edges)
+        return counts.astype(np.int64), edges
+
+    @timed("makeup_api_seconds")
+    def get_summary(self, df, percentiles=True):
+        """Return summary metrics used in visualizations.
+
+        percentiles - add (p10, median, p90) of price, rating and reviews, from quantile
+                      sketches (within makeupsketch.ALPHA relative error)
+        """
         highly_rated = 0
         if "rating" in df.columns and not df.empty:
             highly_rated = len(df[df["rating"] >= 4.5])
@@ -72,36 +703,104 @@ class BeautyProductAPI:
         summary = {
             "Total Products": len(df),
             "Average Price": df["price"].mean() if "price" in df and not df.empty else None,
+            "Lowest Price": df["price"].min() if "price" in df and not df.empty else None,
+            "Highest Price": df["price"].max() if "price" in df and not df.empty else None,
             "Average Rating": df["rating"].mean() if "rating" in df and not df.empty else None,
             "Highly Rated Products (4.5+)": highly_rated,
             "Exclusive Products": int(df["exclusive"].sum()) if "exclusive" in df and not df.empty else 0,
             "Online Only Products": int(df["online_only"].sum()) if "online_only" in df and not df.empty else 0
         }
+        if percentiles:
+            summary.update(percentile_summary({col: bucket_counts(df[col]) for col in SKETCHED if col in df}))
         return summary
 
+    @timed("makeup_api_seconds")
+    def get_filtered_summary(self, brand=None, category='All', online_only='All', exclusive='All',
+                             min_rating=0, price_range=(0, 500), min_reviews=0, search='', session=None):
+        """Summary metrics for the products matching the dashboard widget values."""
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        df = snapshot.df.take(self._rows(snapshot, key, session))
+        if snapshot.cube is None or key[-1]:
+            return self.get_summary(df)
+        # Percentiles merge the cube cells' sketches instead of sorting the matching rows
+        summary = self.get_summary(df, percentiles=False)
+        summary.update(percentile_summary(snapshot.cube.sketch(key)))
+        return summary
+
+    @timed("makeup_api_seconds")
+    def get_summaries(self, specs, processes=None, chunk_rows=250000):
+        """get_filtered_summary for every spec in `specs` (dicts of its keyword arguments), in one pass.
+
+        The rows are split into chunks of `chunk_rows`, summed per group and
+        threshold set in `processes` worker processes (default: one per core),
+        and every spec's summary is combined from those sums (see makeupbatch).
+        """
+        # makeupbatch builds on this module's filter_key and scan
+        from makeupbatch import batch_summaries, columns_for
+
+        df = self.snapshot.df
+        columns = columns_for(specs, df.columns)
+        chunks = (df[columns].iloc[start:start + chunk_rows] for start in range(0, len(df), chunk_rows))
+        categories = {col: self.get_options(col)[1:] for col in ("brand", "category")}
+        return batch_summaries(chunks, categories, columns, specs, processes)
+
+    @timed("makeup_api_seconds")
     def get_top_brands_by_rating(self, brand=None, category='All', online_only='All', exclusive='All',
-                                 min_rating=0, price_range=(0, 500), min_reviews=0, top_n=10):
+                                 min_rating=0, price_range=(0, 500), min_reviews=0, search='', top_n=10):
         """Get top N brands by average rating."""
-        df = self.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        # Cube cells don't know the product text, so searches are answered from the matching rows below
+        if snapshot.cube is not None and not key[-1]:
+            agg = snapshot.cube.aggregate(key, "brand")
+            if not agg["count"].sum():
+                return pd.DataFrame()
+
+            # Same rule as below: only brands with at least 3 matching products
+            valid = agg["count"] >= 3
+            with np.errstate(invalid="ignore", divide="ignore"):
+                ratings = agg["rating_sum"][valid] / agg["rating_n"][valid]
+            by_brand = pd.Series(ratings, index=pd.Index(snapshot.index.labels("brand")[valid], name="brand"),
+                                 name="rating")
+            return by_brand.sort_index().sort_values(ascending=False).head(top_n).reset_index()
+
+        df = self.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
 
         if df.empty or 'rating' not in df:
             return pd.DataFrame()
 
         # Filter out brands with very few products (less than 3) for more reliable averages
-        brand_counts = df.groupby('brand').size()
+        brand_counts = df.groupby('brand', observed=True).size()
         valid_brands = brand_counts[brand_counts >= 3].index
         df = df[df['brand'].isin(valid_brands)]
 
-        top_brands = df.groupby('brand')['rating'].mean().sort_values(ascending=False).head(top_n)
+        top_brands = df.groupby('brand', observed=True)['rating'].mean().sort_values(ascending=False).head(top_n)
         return top_brands.reset_index()
 
+    @timed("makeup_api_seconds")
     def get_avg_price_by_category(self, brand=None, category='All', online_only='All', exclusive='All',
-                                  min_rating=0, price_range=(0, 500), min_reviews=0):
+                                  min_rating=0, price_range=(0, 500), min_reviews=0, search=''):
         """Get average price by category."""
-        df = self.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews)
+        snapshot = self.snapshot
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        # Cube cells don't know the product text, so searches are answered from the matching rows below
+        if snapshot.cube is not None and not key[-1]:
+            agg = snapshot.cube.aggregate(key, "category")
+            present = agg["count"] > 0
+            if not present.any():
+                return pd.DataFrame()
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                prices = agg["price_sum"][present] / agg["price_n"][present]
+            by_category = pd.Series(prices, index=pd.Index(snapshot.index.labels("category")[present], name="category"),
+                                    name="price")
+            return by_category.sort_index().sort_values(ascending=False).reset_index()
+
+        df = self.filter_data(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
 
         if df.empty or 'price' not in df:
             return pd.DataFrame()
 
-        avg_price = df.groupby('category')['price'].mean().sort_values(ascending=False)
-        return avg_price.reset_index()
\ No newline at end of file
+        avg_price = df.groupby('category', observed=True)['price'].mean().sort_values(ascending=False)
+        return avg_price.reset_index()
@@ -0,0 +1,231 @@
+"""
+Summaries for many filter specs from one pass over the rows (see BeautyProductAPI.get_summaries).
+
+Rows are grouped once by their categorical keys (brand, category and the two
+Yes/No flags). Every distinct set of numeric thresholds and search terms among
+the specs is applied once per chunk of rows, giving additive sums (plus
+min/max price) per group; chunks run in a process pool and their partials are
+merged. A spec then only selects groups, so its summary is one row of a
+(specs x groups) 0/1 matrix times the (groups x sums) table. Percentiles come
+from per-group quantile sketches (see makeupsketch), merged over the spec's
+groups.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from makeupapi import filter_key, scan
+from makeupsearch import TEXT_COLUMNS
+from makeupsketch import N_BUCKETS, SKETCHED, Sketches, buckets, percentile_summary
+
+# Columns the batch summaries read
+COLUMNS = ("brand", "category", "online_only", "exclusive", "price", "rating", "number_of_reviews")
+FLAGS = ("online_only", "exclusive")
+# Additive statistics kept per (thresholds, group)
+SUMS = ("count", "price_sum", "price_n", "rating_sum", "rating_n", "highly_rated", "exclusive", "online_only")
+# Upper bound on the cells of one block of the spec x group selection matrix
+MAX_BLOCK_CELLS = 4000000
+
+
+def columns_for(specs, available):
+    """The `available` columns the batch summaries of `specs` read; text columns only if a spec searches."""
+    wanted = COLUMNS + (TEXT_COLUMNS if any(spec.get("search") for spec in specs) else ())
+    return [c for c in dict.fromkeys(wanted) if c in available]
+
+
+def flag_codes(series):
+    """Code per row of a Yes/No flag column: 2 where it equals 1, 1 where it equals 0, 0 otherwise."""
+    return np.where((series == 1).to_numpy(), 2, np.where((series == 0).to_numpy(), 1, 0))
+
+
+def group_sizes(categories):
+    """Number of codes of each grouping key; code 0 is a missing (or unknown) value."""
+    return [len(categories["brand"]) + 1, len(categories["category"]) + 1, 3, 3]
+
+
+def group_ids(chunk, categories):
+    """One integer per row encoding its (brand, category, online_only, exclusive) codes."""
+    ids = np.zeros(len(chunk), dtype=np.int64)
+    for col, size in zip(("brand", "category") + FLAGS, group_sizes(categories)):
+        if col not in chunk.columns:
+            codes = 0
+        elif col in FLAGS:
+            codes = flag_codes(chunk[col])
+        else:
+            codes = pd.Categorical(chunk[col], categories=categories[col]).codes.astype(np.int64) + 1
+        ids = ids * size + codes
+    return ids
+
+
+def chunk_partials(chunk, categories, thresholds):
+    """Partial sums of one chunk of rows for every (thresholds, group).
+
+    Returns the group ids present in the chunk, sums of shape
+    (len(thresholds), groups, len(SUMS)), the min/max price per
+    (thresholds, group), +inf/-inf where no price was seen, and per
+    thresholds {column: (group id * N_BUCKETS + sketch bucket, count)}.
+    """
+    ids, inverse = np.unique(group_ids(chunk, categories), return_inverse=True)
+    n_groups = len(ids)
+
+    # Per-row contribution to every statistic; missing values add nothing
+    weights = np.zeros((len(chunk), len(SUMS)))
+    weights[:, 0] = 1
+    price = chunk["price"].to_numpy(dtype=np.float64) if "price" in chunk.columns else None
+    if price is not None:
+        weights[:, 1] = np.nan_to_num(price)
+        weights[:, 2] = ~np.isnan(price)
+    if "rating" in chunk.columns:
+        rating = chunk["rating"].to_numpy()
+        weights[:, 3] = np.nan_to_num(rating.astype(np.float64))
+        weights[:, 4] = ~np.isnan(rating)
+        weights[:, 5] = rating >= 4.5
+    for i, col in ((6, "exclusive"), (7, "online_only")):
+        if col in chunk.columns:
+            weights[:, i] = np.nan_to_num(chunk[col].to_numpy(dtype=np.float64))
+
+    sketched = {col: buckets(chunk[col]) for col in SKETCHED if col in chunk.columns}
+
+    sums = np.zeros((len(thresholds), n_groups, len(SUMS)))
+    low = np.full((len(thresholds), n_groups), np.inf)
+    high = np.full((len(thresholds), n_groups), -np.inf)
+    sketches = []
+    for t, (min_rating, price_range, min_reviews, search) in enumerate(thresholds):
+        rows = scan(chunk, ((), "All", "All", "All", min_rating, price_range, min_reviews, search))
+        groups = inverse[rows]
+        for i in range(len(SUMS)):
+            sums[t, :, i] = np.bincount(groups, weights=weights[rows, i], minlength=n_groups)
+        if price is not None:
+            priced = ~np.isnan(price[rows])
+            np.minimum.at(low[t], groups[priced], price[rows][priced])
+            np.maximum.at(high[t], groups[priced], price[rows][priced])
+        sketches.append({})
+        for col, b in sketched.items():
+            b = b[rows]
+            valid = b >= 0
+            sketches[t][col] = np.unique(ids[groups[valid]] * N_BUCKETS + b[valid], return_counts=True)
+    return ids, sums, low, high, sketches
+
+
+def merge_partials(partials, n_thresholds):
+    """Combine chunk partials into (group ids, sums, low, high, sketches) over all rows.
+
+    sketches[t][column] are Sketches numbered by position in the group ids.
+    """
+    partials = list(partials)
+    ids = np.unique(np.concatenate([p[0] for p in partials])) if partials else np.empty(0, dtype=np.int64)
+    sums = np.zeros((n_thresholds, len(ids), len(SUMS)))
+    low = np.full((n_thresholds, len(ids)), np.inf)
+    high = np.full((n_thresholds, len(ids)), -np.inf)
+    for chunk_ids, chunk_sums, chunk_low, chunk_high, _ in partials:
+        # Group ids are unique within a chunk, so fancy-indexed updates don't collide
+        at = np.searchsorted(ids, chunk_ids)
+        sums[:, at] += chunk_sums
+        low[:, at] = np.minimum(low[:, at], chunk_low)
+        high[:, at] = np.maximum(high[:, at], chunk_high)
+
+    sketches = []
+    for t in range(n_thresholds):
+        sketches.append({})
+        for col in (partials[0][4][t] if partials else ()):
+            keys, inverse = np.unique(np.concatenate([p[4][t][col][0] for p in partials]), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate([p[4][t][col][1] for p in partials]))
+            # Group ids become positions in `ids`, which keeps the keys sorted
+            keys = np.searchsorted(ids, keys // N_BUCKETS) * N_BUCKETS + keys % N_BUCKETS
+            sketches[t][col] = Sketches(keys, counts.astype(np.int64), len(ids))
+    return ids, sums, low, high, sketches
+
+
+def allowed_codes(keys, categories, columns):
+    """Per grouping key, a (specs x codes) boolean matrix of the codes each spec accepts."""
+    sizes = group_sizes(categories)
+    lookups = {col: {value: code + 1 for code, value in enumerate(categories[col])} for col in ("brand", "category")}
+    allowed = [np.zeros((len(keys), size), dtype=bool) for size in sizes]
+    for s, (brands, category, online_only, exclusive, _, _, _, _) in enumerate(keys):
+        if brands:
+            allowed[0][s, [lookups["brand"][b] for b in brands if b in lookups["brand"]]] = True
+        else:
+            allowed[0][s] = True
+        if category != "All":
+            if category in lookups["category"]:
+                allowed[1][s, lookups["category"][category]] = True
+        else:
+            allowed[1][s] = True
+        for i, (col, value) in enumerate(zip(FLAGS, (online_only, exclusive)), start=2):
+            # Like scan, a filter on a column the data lacks is ignored
+            if value == "All" or col not in columns:
+                allowed[i][s] = True
+            else:
+                allowed[i][s, 2 if value == "Yes" else 1] = True
+    return allowed
+
+
+def summary_of(sums, low, high, columns):
+    """get_summary's dict from one spec's sums and min/max price."""
+    count = int(sums[0])
+    has_price = "price" in columns and count > 0
+    has_rating = "rating" in columns and count > 0
+    return {
+        "Total Products": count,
+        "Average Price": (sums[1] / sums[2] if sums[2] else np.nan) if has_price else None,
+        "Lowest Price": (low if sums[2] else np.nan) if has_price else None,
+        "Highest Price": (high if sums[2] else np.nan) if has_price else None,
+        "Average Rating": (sums[3] / sums[4] if sums[4] else np.nan) if has_rating else None,
+        "Highly Rated Products (4.5+)": int(sums[5]) if has_rating else 0,
+        "Exclusive Products": int(sums[6]) if "exclusive" in columns and count else 0,
+        "Online Only Products": int(sums[7]) if "online_only" in columns and count else 0,
+    }
+
+
+def batch_summaries(chunks, categories, columns, specs, processes=None):
+    """Summaries for every spec (dicts of filter_data keyword arguments) over `chunks` of rows.
+
+    categories - the brand and category labels; rows with other values only match unfiltered keys
+    columns - the dataset's columns (filters on absent columns are ignored, as by filter_data)
+    processes - worker processes for the chunks (default: one per core; 1 runs inline)
+    """
+    keys = [filter_key(**spec) for spec in specs]
+    # Specs sharing their numeric thresholds and search terms share one pass
+    members = {}
+    for s, key in enumerate(keys):
+        members.setdefault(key[4:], []).append(s)
+    thresholds = list(members)
+
+    processes = processes or os.cpu_count() or 1
+    work = partial(chunk_partials, categories=categories, thresholds=thresholds)
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            partials = list(pool.map(work, chunks))
+    else:
+        partials = [work(chunk) for chunk in chunks]
+    ids, sums, low, high, sketches = merge_partials(partials, len(thresholds))
+
+    # Codes of every group, decoded from its id
+    group_codes = []
+    remaining = ids
+    for size in reversed(group_sizes(categories)):
+        remaining, digit = np.divmod(remaining, size)
+        group_codes.insert(0, digit)
+
+    allowed = allowed_codes(keys, categories, columns)
+    summaries = [None] * len(keys)
+    block = max(1, MAX_BLOCK_CELLS // max(len(ids), 1))
+    for t, threshold in enumerate(thresholds):
+        for start in range(0, len(members[threshold]), block):
+            specs_block = members[threshold][start:start + block]
+            selected = np.ones((len(specs_block), len(ids)), dtype=bool)
+            for dim_allowed, codes in zip(allowed, group_codes):
+                selected &= dim_allowed[specs_block][:, codes]
+            totals = selected.astype(np.float64) @ sums[t]
+            lows = np.where(selected, low[t], np.inf).min(axis=1, initial=np.inf)
+            highs = np.where(selected, high[t], -np.inf).max(axis=1, initial=-np.inf)
+            for i, s in enumerate(specs_block):
+                summaries[s] = summary_of(totals[i], lows[i], highs[i], columns)
+                groups = np.flatnonzero(selected[i])
+                summaries[s].update(percentile_summary({col: sketch.merged(groups)
+                                                        for col, sketch in sketches[t].items()}))
+    return summaries
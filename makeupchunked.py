@@ -0,0 +1,613 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from makeupapi import SORT_OPTIONS, BeautyProductAPI, Snapshot, filter_key, flow_counts, scan
+from makeupexport import BATCH_ROWS
+from makeupperf import count_rows, timed
+from makeupsketch import N_BUCKETS, SKETCHED, bucket_counts, percentile_summary
+from makeupstore import CACHE_VERSION, SCHEMA, read_column_cache, read_typed_csv, write_column_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locks, so old store versions are never deleted
+    fcntl = None
+
+# Files of the store: one process builds at a time, and readers of a version keep it from deletion
+BUILD_LOCK = "build.lock"
+READERS_LOCK = "readers.lock"
+VERSION_DIR = re.compile(r"v-[0-9a-f]+")
+
+
+def partition_of(brands, n_partitions):
+    """Partition number per brand; a stable hash, so every process agrees."""
+    hashes = pd.util.hash_pandas_object(pd.Series(brands, dtype=object).astype(str), index=False)
+    return (hashes.to_numpy() % np.uint64(n_partitions)).astype(np.int64)
+
+
+def lock_file(path, shared=False, block=True, create=False):
+    """Open `path` and lock it (exclusively unless `shared`) until the returned file is closed.
+
+    Returns None if the file doesn't exist (unless `create`), or if `block` is
+    False and the lock is taken.
+    """
+    try:
+        f = open(path, "a+b" if create else "r+b")
+    except FileNotFoundError:
+        return None
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if block else fcntl.LOCK_NB))
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+class PartitionStore:
+    """One complete version of a partitioned dataset: a `v-<id>` directory in the store.
+
+    An open store holds a shared lock on its directory for as long as the
+    object lives, so a query streaming its pieces keeps it on disk even after
+    a refresh moved on to a newer version.
+    """
+
+    def __init__(self, path, meta, readers):
+        self.path = path
+        self.meta = meta
+        self.df = read_column_cache(os.path.join(path, "schema"))
+        counts = [rows for _, _, rows in meta["pieces"]]
+        offsets = np.cumsum([0] + counts[:-1]).tolist()
+        # (partition, directory, first row position, rows) in stored order
+        self.pieces = [(part, name, offset, rows) for (part, name, rows), offset in zip(meta["pieces"], offsets)]
+        self._readers = readers
+
+    @classmethod
+    def open(cls, path):
+        """The version at `path`, or None if it hasn't been built (or was just deleted)."""
+        readers = lock_file(os.path.join(path, READERS_LOCK), shared=True)
+        if readers is None:
+            return None
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                return cls(path, json.load(f), readers)
+        except (OSError, ValueError):
+            readers.close()
+            return None
+
+
+def widened(schema, chunk):
+    """`schema` (an empty frame) with the dtypes that hold both its columns and `chunk`'s."""
+    casts = {col: np.result_type(dtype, chunk[col].dtype) for col, dtype in schema.dtypes.items()
+             if dtype != chunk[col].dtype and is_number(dtype) and is_number(chunk[col].dtype)}
+    return schema.astype(casts) if casts else schema
+
+
+def delta_files(path):
+    """Names of the delta files of the CSV at `path`, in the order they apply (see BeautyProductAPI.refresh)."""
+    delta_dir = f"{path}.deltas"
+    names = sorted(os.listdir(delta_dir)) if os.path.isdir(delta_dir) else []
+    return [name for name in names if name.endswith(".csv")]
+
+
+def is_number(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in "biuf"
+
+
+class Partial:
+    """Mergeable count/sum/min/max of one numeric column."""
+
+    def __init__(self, count=0, total=0.0, low=np.inf, high=-np.inf):
+        self.count = count
+        self.total = total
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def of(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return cls()
+        return cls(len(values), float(values.sum()), float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        return Partial(self.count + other.count, self.total + other.total,
+                       min(self.low, other.low), max(self.high, other.high))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+
+class ChunkedBeautyProductAPI(BeautyProductAPI):
+    """BeautyProductAPI for catalogs larger than memory.
+
+    load_data streams the CSV in chunks and writes each chunk, split by a hash
+    of the brand, into on-disk column caches. Queries then stream those pieces
+    back one at a time and merge per-piece partial aggregates, so memory is
+    bounded by the chunk size (plus the size of what is returned), and a brand
+    filter only reads the partitions holding those brands.
+
+    Row positions (filter_rows) count the stored rows partition by partition,
+    in the order filter_data and filter_batches return them.
+    """
+
+    def __init__(self, n_partitions=16, chunksize=200000, **kwargs):
+        super().__init__(**kwargs)
+        self.n_partitions = n_partitions
+        self.chunksize = chunksize
+        self.store_dir = None
+        self.options = {}
+        self.n_rows = 0
+        self.store = None
+        self._last_frame = None
+        self._last_frame_lock = threading.Lock()
+
+    @timed("makeup_api_seconds")
+    def load_data(self, path, columns=None, store_dir=None, **kwargs):
+        """Partition the dataset on disk (unless already done) instead of loading it.
+
+        self.df is left as an empty frame with the dataset's columns and dtypes.
+        Every version of the source gets its own directory in the store (see
+        PartitionStore); one process builds it while the others wait, and it
+        is only swapped in once complete.
+        """
+        root = store_dir or f"{path}.parts"
+        source = self._source_of(path, columns)
+        store = self._open_store(root, path, columns, source)
+
+        # Ensure required columns exist
+        required_cols = ["brand", "category"]
+        for col in required_cols:
+            if col not in store.df.columns:
+                raise ValueError(f"Missing required column: {col}")
+
+        self.store_dir = root
+        self.options = store.meta["options"]
+        self.n_rows = store.meta["n_rows"]
+        self.source = {"path": path, "columns": columns, "store_dir": store_dir}
+        # Queries already streaming the previous version keep it (and its files) until they finish
+        self.store = store
+        self.snapshot = Snapshot(store.df, version=self.version + 1)
+        self.cache.clear()
+        self._last_frame = None
+        self._remove_unused()
+        return self.df
+
+    def _source_of(self, path, columns):
+        """What a store version is built from (the CSV and its delta files); a different source means a new version."""
+        stat = os.stat(path)
+        deltas = []
+        for name in delta_files(path):
+            delta = os.stat(os.path.join(f"{path}.deltas", name))
+            deltas.append([name, delta.st_size, delta.st_mtime])
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "deltas": deltas, "columns": columns,
+                "n_partitions": self.n_partitions, "version": CACHE_VERSION}
+
+    def _open_store(self, root, path, columns, source):
+        """The store version for `source`, partitioning the CSV into it if no process has yet."""
+        digest = hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()[:16]
+        version_dir = os.path.join(root, f"v-{digest}")
+        store = PartitionStore.open(version_dir)
+        if store is None:
+            os.makedirs(root, exist_ok=True)
+            build_lock = lock_file(os.path.join(root, BUILD_LOCK), create=True)
+            try:
+                # Another process may have built it while we waited
+                store = PartitionStore.open(version_dir)
+                if store is None:
+                    self._partition(path, columns, source, version_dir)
+                    store = PartitionStore.open(version_dir)
+            finally:
+                build_lock.close()
+        return store
+
+    @timed("makeup_api_seconds")
+    def refresh(self, key=None):
+        """Re-partition the dataset if the CSV or its delta files changed since it was partitioned; True if it did.
+
+        Partitions are only rebuilt whole, so delta files and appends are not applied one by one.
+        Delta files are read as BeautyProductAPI.refresh reads them, keyed on brand and name.
+        """
+        with self._refresh_lock:
+            if self.source is None:
+                return False
+            self._remove_unused()
+            if self._source_of(self.source["path"], self.source["columns"]) == self.store.meta["source"]:
+                return False
+            self.load_data(**self.source)
+            return True
+
+    def _partition(self, path, columns, source, version_dir):
+        """Write a store version into a private directory, then move it to `version_dir` in one rename."""
+        tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        options = {}
+        pieces = []
+        n_rows = 0
+        schema = None
+        for i, chunk in enumerate(self._rows_with_deltas(path, columns)):
+            schema = chunk.head(0) if schema is None else widened(schema, chunk)
+            n_rows += len(chunk)
+
+            # Remember the distinct values of categorical columns for get_options
+            for col in chunk.columns:
+                if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                    options.setdefault(col, set()).update(chunk[col].dropna().unique().tolist())
+
+            parts = partition_of(chunk["brand"], self.n_partitions) if "brand" in chunk else np.zeros(len(chunk))
+            for part in np.unique(parts):
+                piece = chunk[parts == part].reset_index(drop=True)
+                name = os.path.join(f"part-{int(part):03d}", f"chunk-{i:06d}")
+                write_column_cache(piece, os.path.join(tmp_dir, name), {})
+                pieces.append((int(part), name, len(piece)))
+
+        # Chunks with missing ints or flags read them as float, so the dataset takes the widest dtype
+        write_column_cache(schema, os.path.join(tmp_dir, "schema"), {})
+        meta = {"source": source, "n_rows": n_rows, "options": {col: sorted(v) for col, v in options.items()},
+                "pieces": sorted(pieces)}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        open(os.path.join(tmp_dir, READERS_LOCK), "w").close()
+        try:
+            os.replace(tmp_dir, version_dir)
+        except OSError:
+            # Built by a process that couldn't take the build lock; theirs is as good as ours
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _rows_with_deltas(self, path, columns, key=("brand", "name")):
+        """Stream the CSV in chunks with its delta files applied.
+
+        Rows whose key a delta file replaces or deletes are dropped, and the rows
+        the delta files upsert (net of later ones) come last, as one more chunk.
+        """
+        chunks = read_typed_csv(path, SCHEMA, columns, chunksize=self.chunksize)
+        names = delta_files(path)
+        if not names:
+            yield from chunks
+            return
+
+        # Later delta files override earlier ones, so only the last upsert of a key survives
+        deltas = []
+        added = None
+        for name in names:
+            with open(os.path.join(f"{path}.deltas", name), "rb") as f:
+                header = f.readline()
+                delta = self._read_rows(header, f.read(), name, typed=True)
+            ops = delta.pop("op").astype(str).str.lower() if "op" in delta else pd.Series("", index=delta.index)
+            if columns is not None:
+                delta = delta[[col for col in delta.columns if col in columns]]
+            deltas.append(delta)
+            upserts = delta[(ops != "delete").to_numpy()]
+            added = upserts if added is None else pd.concat([added[~self._matches(added, delta, key)], upserts],
+                                                            ignore_index=True)
+        keys = pd.concat(deltas, ignore_index=True)
+
+        schema = None
+        for chunk in chunks:
+            schema = chunk.head(0) if schema is None else schema
+            yield chunk[~self._matches(chunk, keys, key)].reset_index(drop=True)
+        if schema is not None and not added.empty:
+            # Categories differ between delta files, so the rows are re-encoded after being put together
+            added = added.reindex(columns=schema.columns)
+            yield added.astype({col: "category" for col, dtype in schema.dtypes.items()
+                                if isinstance(dtype, pd.CategoricalDtype)})
+
+    def _remove_unused(self):
+        """Delete the store versions no process is reading, and builds left behind by crashed processes.
+
+        Skipped while a build is running, and without fcntl (old versions are then kept).
+        """
+        if fcntl is None or self.store_dir is None:
+            return
+        build_lock = lock_file(os.path.join(self.store_dir, BUILD_LOCK), create=True, block=False)
+        if build_lock is None:
+            return
+        try:
+            for name in os.listdir(self.store_dir):
+                path = os.path.join(self.store_dir, name)
+                if VERSION_DIR.fullmatch(name):
+                    if path == self.store.path:
+                        continue
+                    readers = lock_file(os.path.join(path, READERS_LOCK), block=False)
+                    if readers is not None:
+                        shutil.rmtree(path, ignore_errors=True)
+                        readers.close()
+                elif ".tmp-" in name or name in ("meta.json", "schema") or name.startswith("part-"):
+                    # No build runs while we hold the build lock; the rest is the old single-version layout
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+        finally:
+            build_lock.close()
+
+    def _pieces(self, brands=(), offsets=False):
+        """Stream the stored pieces, skipping partitions that can't hold `brands`.
+
+        With `offsets`, yields (position of the piece's first row, piece) instead.
+        """
+        # Holding the store keeps its version on disk, even if a refresh swaps in another meanwhile
+        store = self.store
+        parts = None if not brands else set(partition_of(brands, self.n_partitions).tolist())
+        for part, name, offset, _ in store.pieces:
+            if parts is None or part in parts:
+                piece = read_column_cache(os.path.join(store.path, name))
+                # Ints and flags of chunks without missing values take the dataset's float dtype
+                casts = {col: dtype for col, dtype in store.df.dtypes.items()
+                         if piece[col].dtype != dtype and is_number(dtype) and is_number(piece[col].dtype)}
+                piece = piece.astype(casts) if casts else piece
+                yield (offset, piece) if offsets else piece
+
+    def _matching(self, key):
+        """Stream the rows matching a normalized filter spec, one piece at a time."""
+        for piece in self._pieces(key[0]):
+            rows = scan(piece, key)
+            count_rows("chunked", len(piece), len(rows))
+            if len(rows):
+                yield piece.take(rows)
+
+    @timed("makeup_api_seconds")
+    def get_options(self, column):
+        """Get unique options for filters."""
+        if column not in self.df.columns:
+            return []
+        if column in self.options:
+            return ['All'] + self.options[column]
+        values = set()
+        for piece in self._pieces():
+            values.update(piece[column].dropna().unique().tolist())
+        return ['All'] + sorted(values)
+
+    @timed("makeup_api_seconds")
+    def filter_rows(self, brand=None, category='All', online_only='All', exclusive='All',
+                    min_rating=0, price_range=(0, 500), min_reviews=0, search='', session=None):
+        """Return the (read-only) positions of the matching rows in the stored order."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        # A refresh swaps the store in before the version, so rows are never older than the version they go under
+        version = self.version
+        rows = self.cache.get((version, key))
+        if rows is None:
+            found = [np.empty(0, dtype=np.int64)]
+            for offset, piece in self._pieces(key[0], offsets=True):
+                matched = scan(piece, key)
+                count_rows("chunked", len(piece), len(matched))
+                found.append(offset + matched.astype(np.int64))
+            rows = self.cache.put((version, key), np.concatenate(found))
+        return rows
+
+    @timed("makeup_api_seconds")
+    def filter_data(self, brand=None, category='All', online_only='All', exclusive='All',
+                    min_rating=0, price_range=(0, 500), min_reviews=0, search='', session=None):
+        """Filter the dataset according to dashboard widget values (the result must fit in memory).
+
+        To go through a result too large for memory, use filter_batches.
+        """
+        key = (self.version, filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews,
+                                        search))
+        last = self._last_frame
+        if last is not None and last[0] == key:
+            return last[1]
+
+        pieces = list(self._matching(key[1]))
+        df = pd.concat(pieces, ignore_index=True) if pieces else self.df
+        # Only a result within the filter cache's budget is kept for the next call
+        if df.memory_usage(index=False).sum() <= self.cache.max_bytes:
+            with self._last_frame_lock:
+                self._last_frame = (key, df)
+        return df
+
+    def filter_batches(self, brand=None, category='All', online_only='All', exclusive='All',
+                       min_rating=0, price_range=(0, 500), min_reviews=0, search='', columns=None,
+                       batch_rows=BATCH_ROWS, session=None):
+        """Yield the matching products one stored piece (at most `batch_rows` rows) at a time."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        columns = list(self.df.columns) if columns is None else [c for c in columns if c in self.df.columns]
+        empty = True
+        for piece in self._matching(key):
+            for start in range(0, len(piece), batch_rows):
+                empty = False
+                yield piece[columns].iloc[start:start + batch_rows]
+        # Like BeautyProductAPI.filter_batches, an empty result is one empty batch
+        if empty:
+            yield self.df[columns]
+
+    @timed("makeup_api_seconds")
+    def get_flow_counts(self, tiers, brand=None, category='All', online_only='All', exclusive='All',
+                        min_rating=0, price_range=(0, 500), min_reviews=0, search=''):
+        """Matching products per combination of `tiers` values, merged from per-piece counts."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        tiers = list(tiers)
+        partials = [flow_counts(df, tiers) for df in self._matching(key)]
+        if not partials:
+            return flow_counts(self.df, tiers)
+        # Pieces have their own categories, so labels are merged as plain values
+        merged = pd.concat([p.astype({c: object for c in tiers}) for p in partials], ignore_index=True)
+        return merged.groupby(tiers, dropna=False, sort=False)["count"].sum().reset_index()
+
+    @timed("makeup_api_seconds")
+    def get_filtered_summary(self, brand=None, category='All', online_only='All', exclusive='All',
+                             min_rating=0, price_range=(0, 500), min_reviews=0, search='', session=None):
+        """Summary metrics merged from per-piece partial aggregates."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        total = highly_rated = exclusive_count = online_count = 0
+        price, rating = Partial(), Partial()
+        sketches = {col: np.zeros(N_BUCKETS, dtype=np.int64) for col in SKETCHED if col in self.df}
+
+        for df in self._matching(key):
+            total += len(df)
+            for col in sketches:
+                sketches[col] += bucket_counts(df[col])
+            if "price" in df:
+                price = price.merge(Partial.of(df["price"]))
+            if "rating" in df:
+                rating = rating.merge(Partial.of(df["rating"]))
+                highly_rated += int((df["rating"] >= 4.5).sum())
+            if "exclusive" in df:
+                exclusive_count += int(df["exclusive"].sum())
+            if "online_only" in df:
+                online_count += int(df["online_only"].sum())
+
+        summary = {
+            "Total Products": total,
+            "Average Price": price.mean if total and "price" in self.df else None,
+            "Lowest Price": (price.low if price.count else np.nan) if total and "price" in self.df else None,
+            "Highest Price": (price.high if price.count else np.nan) if total and "price" in self.df else None,
+            "Average Rating": rating.mean if total and "rating" in self.df else None,
+            "Highly Rated Products (4.5+)": highly_rated,
+            "Exclusive Products": exclusive_count,
+            "Online Only Products": online_count
+        }
+        summary.update(percentile_summary(sketches))
+        return summary
+
+    @timed("makeup_api_seconds")
+    def get_summaries(self, specs, processes=None):
+        """get_filtered_summary for every spec, from one pass over the stored pieces (see BeautyProductAPI)."""
+        from makeupbatch import batch_summaries, columns_for
+
+        columns = columns_for(specs, self.df.columns)
+        chunks = (piece[columns] for piece in self._pieces())
+        categories = {col: self.get_options(col)[1:] for col in ("brand", "category")}
+        return batch_summaries(chunks, categories, columns, specs, processes)
+
+    def _group_partials(self, key, by, column):
+        """Per-`by` row count and `column` sum/count, merged across pieces."""
+        partials = []
+        for df in self._matching(key):
+            # float64 sums, so the merged means match the in-memory backend's
+            grouped = df[column].astype(np.float64).groupby(df[by], observed=True)
+            partials.append(pd.DataFrame({"n": grouped.size(), "sum": grouped.sum(), "count": grouped.count()}))
+        if not partials:
+            return None
+        merged = pd.concat(partials)
+        merged.index = merged.index.astype(object)
+        return merged.groupby(level=0).sum()
+
+    @timed("makeup_api_seconds")
+    def get_top_brands_by_rating(self, brand=None, category='All', online_only='All', exclusive='All',
+                                 min_rating=0, price_range=(0, 500), min_reviews=0, search='', top_n=10):
+        """Get top N brands by average rating."""
+        if 'rating' not in self.df:
+            return pd.DataFrame()
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        merged = self._group_partials(key, "brand", "rating")
+        if merged is None:
+            return pd.DataFrame()
+
+        # Only brands with at least 3 matching products
+        merged = merged[merged["n"] >= 3]
+        ratings = (merged["sum"] / merged["count"]).rename("rating").rename_axis("brand")
+        return ratings.sort_index().sort_values(ascending=False).head(top_n).reset_index()
+
+    @timed("makeup_api_seconds")
+    def get_avg_price_by_category(self, brand=None, category='All', online_only='All', exclusive='All',
+                                  min_rating=0, price_range=(0, 500), min_reviews=0, search=''):
+        """Get average price by category."""
+        if 'price' not in self.df:
+            return pd.DataFrame()
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        merged = self._group_partials(key, "category", "price")
+        if merged is None:
+            return pd.DataFrame()
+
+        prices = (merged["sum"] / merged["count"]).rename("price").rename_axis("category")
+        return prices.sort_index().sort_values(ascending=False).reset_index()
+
+    def _top(self, key, by, ascending, n):
+        """The first `n` matching rows in `by` order, keeping at most n rows between pieces."""
+        best = None
+        for df in self._matching(key):
+            if best is not None:
+                df = pd.concat([best, df], ignore_index=True)
+            best = df.sort_values(by, ascending=ascending, kind="stable").head(n) if by else df.head(n)
+        return self.df if best is None else best.reset_index(drop=True)
+
+    @timed("makeup_api_seconds")
+    def get_catalog_page(self, brand=None, category='All', online_only='All', exclusive='All',
+                         min_rating=0, price_range=(0, 500), min_reviews=0, search='', sort_by=None,
+                         page=1, page_size=25, columns=None, session=None):
+        """Return one page of the filtered, sorted catalog and the total number of matches."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        start = (max(page, 1) - 1) * page_size
+        col, ascending = SORT_OPTIONS.get(sort_by, (None, True))
+        if col not in self.df.columns:
+            col = None
+
+        df = self._top(key, col, ascending, start + page_size).iloc[start:]
+        total = sum(len(piece) for piece in self._matching(key))
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df, total
+
+    @timed("makeup_api_seconds")
+    def get_top_rated(self, brand=None, category='All', online_only='All', exclusive='All',
+                      min_rating=0, price_range=(0, 500), min_reviews=0, search='', n=10, rating_floor=4.0,
+                      reviews_floor=50, session=None):
+        """Best rated, most reviewed products with at least `rating_floor` stars and `reviews_floor` reviews."""
+        key = filter_key(brand, category, online_only, exclusive, max(min_rating, rating_floor), price_range,
+                         max(min_reviews, reviews_floor), search)
+        return self._top(key, ['rating', 'number_of_reviews'], [False, False], n)
+
+    @timed("makeup_api_seconds")
+    def get_scatter_data(self, brand=None, category='All', online_only='All', exclusive='All',
+                         min_rating=0, price_range=(0, 500), min_reviews=0, search='', x_range=None, y_range=None,
+                         max_points=50000, bins=(200, 100), session=None):
+        """Price vs rating points, or 2D bin counts when there are too many (see BeautyProductAPI)."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        x_range = tuple(x_range) if x_range else tuple(price_range or (0, 500))
+        y_range = tuple(y_range) if y_range else (0, 5)
+        x_edges = np.linspace(x_range[0], x_range[1], bins[0] + 1)
+        y_edges = np.linspace(y_range[0], y_range[1], bins[1] + 1)
+        columns = [c for c in ("price", "rating", "number_of_reviews", "name", "brand", "category")
+                   if c in self.df.columns]
+
+        # Bin counts add up across pieces; points are only kept while there are few enough
+        counts = np.zeros(bins, dtype=np.int64)
+        points, n_points = [], 0
+        for df in self._matching(key):
+            price, rating = df["price"].to_numpy(), df["rating"].to_numpy()
+            visible = (price >= x_range[0]) & (price <= x_range[1]) & (rating >= y_range[0]) & (rating <= y_range[1])
+            counts += np.histogram2d(price[visible], rating[visible], bins=[x_edges, y_edges])[0].astype(np.int64)
+            n_points += int(visible.sum())
+            if n_points <= max_points:
+                points.append(df[visible][columns])
+            else:
+                points = []
+
+        if n_points <= max_points:
+            return "points", pd.concat(points, ignore_index=True) if points else self.df[columns]
+        return "bins", counts, x_edges, y_edges
+
+    @timed("makeup_api_seconds")
+    def get_histogram(self, column, brand=None, category='All', online_only='All', exclusive='All',
+                      min_rating=0, price_range=(0, 500), min_reviews=0, search='', bins=20, value_range=None,
+                      session=None):
+        """Histogram of `column` over the filtered products as (counts, bin_edges), merged across pieces."""
+        key = filter_key(brand, category, online_only, exclusive, min_rating, price_range, min_reviews, search)
+        if value_range is None:
+            if column == "rating":
+                value_range = (0, 5)
+            elif column == "price" and price_range:
+                value_range = price_range
+            else:
+                spread = Partial()
+                for df in self._matching(key):
+                    spread = spread.merge(Partial.of(df[column]))
+                value_range = (spread.low, spread.high) if spread.count else (0, 1)
+
+        edges = np.linspace(float(value_range[0]), float(value_range[1]), bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        for df in self._matching(key):
+            values = df[column].to_numpy(dtype=np.float64)
+            counts += np.histogram(values[~np.isnan(values)], bins=edges)[0]
+        return counts, edges
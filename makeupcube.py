@@ -0,0 +1,324 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from makeupindex import column_scalar, drop_rows, merge_sorted
+from makeupsketch import SKETCHED, Sketches, bucket_counts
+
+# Bucket edges follow the dashboard slider steps, so slider values never split a bucket
+RATING_EDGES = np.arange(0, 5.01, 0.5)
+PRICE_EDGES = np.arange(0, 501, 10, dtype=float)
+REVIEW_EDGES = np.arange(0, 1001, 50, dtype=float)
+
+FULL, PARTIAL, OUT = 0, 1, 2
+
+
+def bucketize(values, edges):
+    """Bucket id per value: 0 below the first edge, len(edges) past the last, len(edges) + 1 for NaN."""
+    buckets = np.searchsorted(edges, values, side="right")
+    if values.dtype.kind == "f":
+        buckets[np.isnan(values)] = len(edges) + 1
+    return buckets
+
+
+def bucket_status(edges, low, high=None):
+    """FULL/PARTIAL/OUT per bucket for the predicate low <= value (<= high)."""
+    lows = np.concatenate([[-np.inf], edges, [np.nan]])
+    highs = np.concatenate([edges, [np.inf], [np.nan]])
+    status = np.full(len(lows), PARTIAL)
+
+    inside = lows >= low
+    outside = highs <= low
+    if high is not None:
+        inside &= highs <= high
+        outside |= lows > high
+    status[inside] = FULL
+    status[outside] = OUT
+    # Missing values never pass an active threshold
+    status[-1] = OUT
+    return status
+
+
+def sum_by(keys, weights, size):
+    """Float sums of `weights` per key in range(size)."""
+    return np.bincount(keys, weights=weights, minlength=size).astype(np.float64)
+
+
+class AggregateCube:
+    """Sums and counts per (brand, category, online_only, exclusive, rating/price/review bucket) cell.
+
+    Charts sum whole cells that fall entirely inside the filter. Cells cut by a
+    threshold that isn't on a bucket edge are corrected from their own rows,
+    which are stored grouped by cell so they can be gathered without a scan.
+    Percentiles work the same way with a mergeable quantile sketch per cell.
+    """
+
+    DIMENSIONS = ("brand", "category", "online_only", "exclusive")
+    RANGES = (("rating", RATING_EDGES), ("price", PRICE_EDGES), ("number_of_reviews", REVIEW_EDGES))
+    # Per-row and per-cell arrays written by save, besides the key parts and sketches
+    ARRAYS = ("cell", "rows", "offsets", "count", "rating_sum", "rating_n", "price_sum", "price_n")
+
+    def __init__(self, index):
+        self.index = index
+        parts, self.sizes = self._parts(index)
+        cell_ids, first_row, cell = np.unique(self._encode(parts), return_index=True, return_inverse=True)
+        self.n_cells = len(cell_ids)
+        self.cell = cell
+        # Key parts of every cell, taken from one of its rows (categorical codes are shifted so missing is 0)
+        self.keys = [codes[first_row] for codes in parts]
+        self._totals(cell)
+
+        # Rows grouped by cell, for exact correction of partially matching cells
+        self.rows = np.argsort(cell, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(self.count)])
+
+        self.sketches = {col: Sketches.build(cell, index.values[col], self.n_cells)
+                         for col in SKETCHED if col in index.values}
+
+    def save(self, cube_dir):
+        """Write the cube's arrays as .npy files so other processes can map them (see load)."""
+        tmp_dir = f"{cube_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name))
+        for i, keys in enumerate(self.keys):
+            np.save(os.path.join(tmp_dir, f"keys-{i}.npy"), keys)
+        for col, sketches in self.sketches.items():
+            for name in ("keys", "counts", "offsets"):
+                np.save(os.path.join(tmp_dir, f"sketch-{col}-{name}.npy"), getattr(sketches, name))
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"n_rows": self.index.n_rows, "n_cells": self.n_cells, "sizes": self.sizes,
+                       "sketched": list(self.sketches)}, f)
+
+        shutil.rmtree(cube_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, cube_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, cube_dir, index, mmap=False):
+        """Load a cube saved for `index`, or return None if there isn't a matching one.
+
+        With mmap=True the arrays are read-only views of the files, shared by
+        every process serving the same dataset.
+        """
+        try:
+            with open(os.path.join(cube_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        cube = cls.__new__(cls)
+        cube.index = index
+        cube.sizes = cls._sizes(index)
+        sketched = [col for col in SKETCHED if col in index.values]
+        if meta["n_rows"] != index.n_rows or meta["sizes"] != cube.sizes or meta["sketched"] != sketched:
+            return None
+
+        mmap_mode = "r" if mmap else None
+
+        def load(name):
+            return np.load(os.path.join(cube_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        cube.n_cells = meta["n_cells"]
+        for name in cls.ARRAYS:
+            setattr(cube, name, load(name))
+        cube.keys = [load(f"keys-{i}") for i in range(len(cube.sizes))]
+        cube.sketches = {col: Sketches(load(f"sketch-{col}-keys"), load(f"sketch-{col}-counts"), cube.n_cells,
+                                       load(f"sketch-{col}-offsets"))
+                         for col in sketched}
+        return cube
+
+    @classmethod
+    def _sizes(cls, index):
+        """Number of distinct values of every key part (see _parts)."""
+        return ([len(index.lookup.get(col, ())) + 1 for col in cls.DIMENSIONS]
+                + [len(edges) + 2 for _, edges in cls.RANGES])
+
+    def _parts(self, index, rows=None):
+        """Key parts of every row (or of `rows`) and the number of distinct values of each part.
+
+        Missing columns collapse to a single value.
+        """
+        rows = np.arange(index.n_rows) if rows is None else rows
+        n = len(rows)
+        parts = []
+        for col in self.DIMENSIONS:
+            codes = index.codes.get(col)
+            parts.append(np.zeros(n, dtype=np.int64) if codes is None else codes[rows].astype(np.int64) + 1)
+        for col, edges in self.RANGES:
+            values = index.values.get(col)
+            parts.append(np.zeros(n, dtype=np.int64) if values is None else bucketize(values[rows], edges))
+        return parts, self._sizes(index)
+
+    def _encode(self, parts):
+        """One integer id per key, ordered like the keys themselves."""
+        cell_ids = np.zeros(len(parts[0]), dtype=np.int64)
+        for codes, size in zip(parts, self.sizes):
+            cell_ids = cell_ids * size + codes
+        return cell_ids
+
+    def _totals(self, cell):
+        self.count = np.bincount(cell, minlength=self.n_cells)
+        self.rating_sum, self.rating_n = self._sums(cell, self.index.values.get("rating"))
+        self.price_sum, self.price_n = self._sums(cell, self.index.values.get("price"))
+
+    def updated(self, index, keep=None):
+        """A new cube for `index`, an index made by ProductIndex.updated(df, keep) from this cube's index.
+
+        Kept rows keep their cells (renumbered, not re-sorted) and only appended
+        rows are bucketed, so nothing is sorted but the new rows. This cube is
+        left untouched.
+        """
+        new_id = None if keep is None else np.cumsum(keep) - 1
+        n_kept = self.index.n_rows if keep is None else int(keep.sum())
+        added = np.arange(n_kept, index.n_rows)
+
+        cube = AggregateCube.__new__(AggregateCube)
+        cube.index = index
+        parts, cube.sizes = cube._parts(index, added)
+
+        # New brands or categories widen the key space; re-encoding keeps the old cells in order
+        old_ids = cube._encode(self.keys)
+        added_ids = cube._encode(parts)
+        cell_ids = np.union1d(old_ids, added_ids)
+        cube.n_cells = len(cell_ids)
+        remap = np.searchsorted(cell_ids, old_ids)
+        kept_cell = self.cell if keep is None else self.cell[keep]
+        cell = np.concatenate([remap[kept_cell], np.searchsorted(cell_ids, added_ids)])
+        cube.cell = cell
+        cube.keys = []
+        remaining = cell_ids
+        for size in reversed(cube.sizes):
+            remaining, digit = np.divmod(remaining, size)
+            cube.keys.insert(0, digit)
+        cube._totals(cell)
+
+        rows = drop_rows(self.rows, keep, new_id)
+        cube.rows = merge_sorted(rows, cell[rows], added, cell[added])
+        cube.offsets = np.concatenate([[0], np.cumsum(cube.count)])
+
+        # Sketches take out the dropped rows' values and add the appended ones
+        dropped = None if keep is None else ~keep
+        cube.sketches = {}
+        for col, sketches in self.sketches.items():
+            removed = None if dropped is None else (remap[self.cell[dropped]], self.index.values[col][dropped])
+            cube.sketches[col] = sketches.updated(remap, cube.n_cells, removed,
+                                                  (cell[added], index.values[col][added]))
+        return cube
+
+    def _sums(self, cell, values):
+        if values is None:
+            return np.zeros(self.n_cells), np.zeros(self.n_cells)
+        valid = ~np.isnan(values)
+        sums = np.bincount(cell, weights=np.where(valid, values, 0), minlength=self.n_cells)
+        return sums, np.bincount(cell, weights=valid, minlength=self.n_cells)
+
+    def _match(self, key):
+        """Cells passing the categorical predicates, FULL/PARTIAL/OUT per cell for the range predicates,
+        and the range predicates as (range number, low, high) at column precision.
+
+        Cells don't know the product text, so `key` must have no search terms.
+        """
+        brands, category, online_only, exclusive, min_rating, price_range, min_reviews, _ = key
+        index = self.index
+
+        # Categorical predicates select whole cells
+        selected = np.ones(self.n_cells, dtype=bool)
+        if brands:
+            codes = [index.lookup["brand"][b] + 1 for b in brands if b in index.lookup["brand"]]
+            selected &= np.isin(self.keys[0], codes)
+        for dim, value in ((1, category), (2, online_only), (3, exclusive)):
+            col = self.DIMENSIONS[dim]
+            if value == "All" or col not in index.codes:
+                continue
+            if col != "category":
+                value = 1 if value == "Yes" else 0
+            selected &= self.keys[dim] == index.lookup[col].get(value, -2) + 1
+
+        # Range predicates mark cells as fully in, fully out, or straddling an edge
+        status = np.zeros(self.n_cells, dtype=np.int64)
+        predicates = []
+        if "rating" in index.values and min_rating > 0:
+            predicates.append((0, min_rating, None))
+        if "price" in index.values and price_range:
+            predicates.append((1, price_range[0], price_range[1]))
+        if "number_of_reviews" in index.values and min_reviews > 0:
+            predicates.append((2, min_reviews, None))
+        predicates = [(i, column_scalar(index.values[self.RANGES[i][0]], low),
+                       None if high is None else column_scalar(index.values[self.RANGES[i][0]], high))
+                      for i, low, high in predicates]
+        for i, low, high in predicates:
+            col, edges = self.RANGES[i]
+            status = np.maximum(status, bucket_status(edges, low, high)[self.keys[4 + i]])
+        return selected, status, predicates
+
+    def _matching_rows(self, cells, predicates):
+        """Rows of the partially matching `cells` that pass every range predicate."""
+        rows = self._rows_of(cells)
+        for i, low, high in predicates:
+            values = self.index.values[self.RANGES[i][0]][rows]
+            keep = values >= low if high is None else (values >= low) & (values <= high)
+            rows = rows[keep]
+        return rows
+
+    def aggregate(self, key, by):
+        """Count and rating/price sums per `by` code ('brand' or 'category') for a filter spec."""
+        index = self.index
+        size = len(index.lookup[by])
+        by_keys = self.keys[self.DIMENSIONS.index(by)] - 1
+        selected, status, predicates = self._match(key)
+        selected &= by_keys >= 0
+
+        full = selected & (status == FULL)
+        keys = by_keys[full]
+        count = sum_by(keys, self.count[full], size)
+        rating_sum = sum_by(keys, self.rating_sum[full], size)
+        rating_n = sum_by(keys, self.rating_n[full], size)
+        price_sum = sum_by(keys, self.price_sum[full], size)
+        price_n = sum_by(keys, self.price_n[full], size)
+
+        partial = np.flatnonzero(selected & (status == PARTIAL))
+        if len(partial):
+            rows = self._matching_rows(partial, predicates)
+            row_keys = index.codes[by][rows]
+            count += np.bincount(row_keys, minlength=size)
+            for col, sums, ns in (("rating", rating_sum, rating_n), ("price", price_sum, price_n)):
+                if col in index.values:
+                    values = index.values[col][rows].astype(np.float64)
+                    valid = ~np.isnan(values)
+                    sums += sum_by(row_keys, np.where(valid, values, 0), size)
+                    ns += sum_by(row_keys, valid, size)
+
+        return {"count": count, "rating_sum": rating_sum, "rating_n": rating_n,
+                "price_sum": price_sum, "price_n": price_n}
+
+    def sketch(self, key):
+        """Quantile sketches (see makeupsketch) of the sketched columns over the products matching a filter spec."""
+        selected, status, predicates = self._match(key)
+        full = np.flatnonzero(selected & (status == FULL))
+        partial = np.flatnonzero(selected & (status == PARTIAL))
+        rows = self._matching_rows(partial, predicates) if len(partial) else None
+
+        merged = {}
+        for col, sketches in self.sketches.items():
+            merged[col] = sketches.merged(full)
+            if rows is not None:
+                merged[col] += bucket_counts(self.index.values[col][rows])
+        return merged
+
+    def _rows_of(self, cells):
+        """All row ids belonging to `cells`, gathered without a Python loop."""
+        starts = self.offsets[cells]
+        lengths = self.count[cells]
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        # Position k of cell j maps to rows[starts[j] + k]
+        shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return self.rows[np.arange(lengths.sum()) + shift]
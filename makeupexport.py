@@ -0,0 +1,87 @@
+"""
+Bulk export of filtered products to CSV, Parquet or Arrow IPC (see BeautyProductAPI.export).
+
+Matching rows are written a batch at a time: each batch gathers its rows from
+the dataset's columns by position, so no filtered copy of the frame is made
+and memory stays bounded by the batch size however many products match.
+Parquet and Arrow need pyarrow; CSV only needs pandas.
+"""
+
+import importlib.util
+import itertools
+
+import pandas as pd
+
+# Export formats and their file extensions (Arrow is the IPC streaming format)
+EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrows"}
+# Rows gathered per written batch
+BATCH_ROWS = 65536
+
+
+def export_formats():
+    """The formats this installation can write: CSV, plus Parquet and Arrow when pyarrow is installed."""
+    if importlib.util.find_spec("pyarrow") is None:
+        return ["csv"]
+    return list(EXTENSIONS)
+
+
+def row_batches(df, rows, columns=None, batch_rows=BATCH_ROWS):
+    """Yield DataFrames of `df`'s `columns` (default all) at row positions `rows`, `batch_rows` at a time.
+
+    An empty selection yields one empty batch, so writers still see the columns.
+    """
+    columns = list(df.columns) if columns is None else [c for c in columns if c in df.columns]
+    arrays = [df[col].array for col in columns]
+    for start in range(0, max(len(rows), 1), batch_rows):
+        at = rows[start:start + batch_rows]
+        yield pd.DataFrame({col: values.take(at) for col, values in zip(columns, arrays)})
+
+
+def _arrow_schema(batch):
+    """Arrow schema of a batch; all-missing text columns (typed null) are declared as strings."""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(batch, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def write_export(batches, out, fmt="csv"):
+    """Write DataFrame `batches` (at least one, all with the same columns) to `out`.
+
+    out - a path or a binary file object
+    fmt - "csv", "parquet" or "arrow" (the IPC streaming format)
+    Returns the number of rows written.
+    """
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(EXTENSIONS)}")
+    if not hasattr(out, "write"):
+        with open(out, "wb") as f:
+            return write_export(batches, f, fmt)
+
+    batches = iter(batches)
+    first = next(batches)
+    written = 0
+    if fmt == "csv":
+        first.to_csv(out, index=False)
+        written += len(first)
+        for batch in batches:
+            batch.to_csv(out, index=False, header=False)
+            written += len(batch)
+        return written
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(f"Exporting to {fmt} needs pyarrow (pip install pyarrow)") from None
+
+    schema = _arrow_schema(first)
+    open_writer = pq.ParquetWriter if fmt == "parquet" else pa.ipc.new_stream
+    with open_writer(out, schema) as writer:
+        for batch in itertools.chain([first], batches):
+            writer.write_batch(pa.RecordBatch.from_pandas(batch, schema=schema, preserve_index=False))
+            written += len(batch)
+    return written
@@ -0,0 +1,329 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from makeupsearch import TextIndex, contains
+
+
+def column_scalar(values, x):
+    """`x` at the precision of `values`, so a float32 column compares like the CSV text it came from."""
+    return values.dtype.type(x) if values.dtype.kind == "f" else x
+
+
+def drop_rows(order, keep, new_id):
+    """`order` (a list of row ids) without the rows not in `keep` (None keeps all), renumbered by `new_id`."""
+    return order if keep is None else new_id[order[keep[order]]]
+
+
+def merge_sorted(order, sorted_keys, new_rows, new_keys):
+    """Insert `new_rows` into `order`, a list of row ids sorted by key with ties by row id.
+
+    sorted_keys are the keys of `order` in that order. The new rows must have
+    higher ids than every row in `order`, so they go after the rows whose key
+    they tie with. Linear in len(order), instead of re-sorting everything.
+    """
+    pick = np.argsort(new_keys, kind="stable")
+    positions = np.searchsorted(sorted_keys, new_keys[pick], side="right")
+    return np.insert(order, positions, new_rows[pick])
+
+
+class ProductIndex:
+    """Row-id indexes over the dashboard filter columns.
+
+    Categorical columns get one sorted row-id list per value (stored CSR style,
+    so a lookup is a slice of a shared array) and numeric columns get a sorted
+    permutation, so range predicates resolve with searchsorted. A query starts
+    from the smallest candidate set and only checks the remaining predicates on
+    those rows, so its cost follows the size of the result, not of the data.
+    Search terms are looked up in the text index (see makeupsearch).
+    """
+
+    CATEGORICAL = ("brand", "category", "online_only", "exclusive")
+    NUMERIC = ("rating", "price", "number_of_reviews", "love")
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.codes = {}      # column -> per-row integer code (-1 for missing)
+        self.lookup = {}     # column -> {value: code}
+        self.postings = {}   # column -> (row ids grouped by code, offsets per code)
+        self.values = {}     # column -> numeric values per row
+        self.order = {}      # column -> row ids sorted by value (missing values last)
+        self.order_desc = {} # column -> row ids sorted by descending value (missing values last)
+        self.sorted = {}     # column -> values in sorted order, missing values dropped
+
+        for col in self.CATEGORICAL:
+            if col in df.columns:
+                self._index_categorical(col, df[col])
+
+        for col in self.NUMERIC:
+            if col in df.columns:
+                self._index_numeric(col, df[col])
+
+        self.text = TextIndex(df)
+
+    def _index_categorical(self, col, series):
+        codes, uniques = pd.factorize(series)
+        codes = codes.astype(np.int32)
+        # Stable sort keeps row ids ascending inside every posting list
+        rows = np.argsort(codes, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(codes[rows], np.arange(len(uniques) + 1))
+        self.codes[col] = codes
+        self.lookup[col] = {value: code for code, value in enumerate(uniques)}
+        self.postings[col] = (rows, offsets)
+
+    def _index_numeric(self, col, series):
+        values = series.to_numpy()
+        order = np.argsort(values, kind="stable")
+        n_valid = len(values) - int(np.isnan(values).sum()) if values.dtype.kind == "f" else len(values)
+        self.values[col] = values
+        self.order[col] = order
+        self.order_desc[col] = np.argsort(-values, kind="stable")
+        self.sorted[col] = values[order[:n_valid]]
+
+    def updated(self, df, keep=None):
+        """A new index for `df`, this index's frame with the rows not in `keep` dropped and rows appended.
+
+        keep - boolean mask over the old rows (None keeps them all); the rows of
+               `df` after the kept ones are the appended rows
+        Codes of existing values don't change and new values get the next codes.
+        This index is left untouched, so queries still running on it stay valid.
+        """
+        new_id = None if keep is None else np.cumsum(keep) - 1
+        n_kept = self.n_rows if keep is None else int(keep.sum())
+        added = np.arange(n_kept, len(df))
+
+        index = ProductIndex.__new__(ProductIndex)
+        index.n_rows = len(df)
+        index.codes, index.lookup, index.postings = {}, {}, {}
+        index.values, index.order, index.order_desc, index.sorted = {}, {}, {}, {}
+
+        for col, old_codes in self.codes.items():
+            lookup = dict(self.lookup[col])
+            new_codes, uniques = pd.factorize(df[col].iloc[n_kept:])
+            table = np.array([lookup.setdefault(value, len(lookup)) for value in uniques] + [-1], dtype=np.int32)
+            old_codes = old_codes if keep is None else old_codes[keep]
+            codes = np.concatenate([old_codes, table[new_codes]]).astype(np.int32)
+
+            rows = drop_rows(self.postings[col][0], keep, new_id)
+            rows = merge_sorted(rows, codes[rows], added, codes[added])
+            index.codes[col] = codes
+            index.lookup[col] = lookup
+            index.postings[col] = (rows, np.searchsorted(codes[rows], np.arange(len(lookup) + 1)))
+
+        for col in self.values:
+            values = df[col].to_numpy()
+            n_valid = len(values) - int(np.isnan(values).sum()) if values.dtype.kind == "f" else len(values)
+            order = drop_rows(self.order[col], keep, new_id)
+            order_desc = drop_rows(self.order_desc[col], keep, new_id)
+            index.values[col] = values
+            index.order[col] = merge_sorted(order, values[order], added, values[added])
+            index.order_desc[col] = merge_sorted(order_desc, -values[order_desc], added, -values[added])
+            index.sorted[col] = values[index.order[col][:n_valid]]
+
+        index.text = self.text.updated(df, keep)
+        return index
+
+    def save(self, index_dir):
+        """Write the index arrays as .npy files so other processes can map them."""
+        tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for col, codes in self.codes.items():
+            uniques = np.asarray(list(self.lookup[col]))
+            if uniques.dtype.kind == "O":
+                uniques = uniques.astype(str)
+            rows, offsets = self.postings[col]
+            np.save(os.path.join(tmp_dir, f"codes-{col}.npy"), codes)
+            np.save(os.path.join(tmp_dir, f"uniques-{col}.npy"), uniques)
+            np.save(os.path.join(tmp_dir, f"rows-{col}.npy"), rows)
+            np.save(os.path.join(tmp_dir, f"offsets-{col}.npy"), offsets)
+
+        for col in self.values:
+            np.save(os.path.join(tmp_dir, f"order-{col}.npy"), self.order[col])
+            np.save(os.path.join(tmp_dir, f"order_desc-{col}.npy"), self.order_desc[col])
+            np.save(os.path.join(tmp_dir, f"sorted-{col}.npy"), self.sorted[col])
+
+        self.text.save(os.path.join(tmp_dir, "text"))
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"n_rows": self.n_rows, "categorical": list(self.codes), "numeric": list(self.values)}, f)
+
+        shutil.rmtree(index_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, index_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, index_dir, df, mmap=False):
+        """Load an index saved for `df`, or return None if there isn't a matching one."""
+        try:
+            with open(os.path.join(index_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        categorical = [c for c in cls.CATEGORICAL if c in df.columns]
+        numeric = [c for c in cls.NUMERIC if c in df.columns]
+        if meta["n_rows"] != len(df) or meta["categorical"] != categorical or meta["numeric"] != numeric:
+            return None
+
+        text = TextIndex.load(os.path.join(index_dir, "text"), df, mmap)
+        if text is None:
+            return None
+
+        mmap_mode = "r" if mmap else None
+        index = cls.__new__(cls)
+        index.n_rows = len(df)
+        index.text = text
+        index.codes, index.lookup, index.postings = {}, {}, {}
+        index.values, index.order, index.order_desc, index.sorted = {}, {}, {}, {}
+
+        def load(name):
+            return np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        for col in categorical:
+            index.codes[col] = load(f"codes-{col}")
+            index.lookup[col] = {value: code for code, value in enumerate(load(f"uniques-{col}").tolist())}
+            index.postings[col] = (load(f"rows-{col}"), load(f"offsets-{col}"))
+
+        for col in numeric:
+            index.values[col] = df[col].to_numpy()
+            index.order[col] = load(f"order-{col}")
+            index.order_desc[col] = load(f"order_desc-{col}")
+            index.sorted[col] = load(f"sorted-{col}")
+
+        return index
+
+    def options(self, col):
+        """Sorted values of categorical `col` that are on at least one row, read off the postings."""
+        present = np.diff(self.postings[col][1]) > 0
+        return sorted(value for value, on_rows in zip(self.lookup[col], present) if on_rows)
+
+    def labels(self, col):
+        """Values of categorical `col`, positioned by code."""
+        return np.array(list(self.lookup[col]), dtype=object)
+
+    def rows_for(self, col, value):
+        """Sorted row ids whose categorical `col` equals `value`."""
+        code = self.lookup[col].get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        rows, offsets = self.postings[col]
+        return rows[offsets[code]:offsets[code + 1]]
+
+    def rows_between(self, col, low=None, high=None):
+        """Row ids (in value order) whose numeric `col` lies in [low, high]."""
+        sorted_values = self.sorted[col]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        end = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side="right")
+        return self.order[col][start:max(start, end)]
+
+    def _predicates(self, key):
+        """(candidate finder, candidates come sorted, per-row check) for every active predicate."""
+        brands, category, online_only, exclusive, min_rating, price_range, min_reviews, search = key
+        predicates = []
+
+        if search:
+            # Matches come sorted from the text index; other candidates are checked against them
+            found = self.text.search(search)
+            predicates.append((lambda: found, True, lambda r: contains(found, r)))
+
+        if brands:
+            if "brand" not in self.codes:
+                return [(lambda: np.empty(0, dtype=np.int64), True, lambda r: np.zeros(len(r), dtype=bool))]
+            codes = [self.lookup["brand"][b] for b in brands if b in self.lookup["brand"]]
+            predicates.append((lambda: np.concatenate([self.rows_for("brand", b) for b in brands]),
+                               len(brands) == 1,
+                               lambda r: np.isin(self.codes["brand"][r], codes)))
+
+        for col, value in (("category", category), ("online_only", online_only), ("exclusive", exclusive)):
+            if value == "All" or col not in self.codes:
+                continue
+            if col != "category":
+                value = 1 if value == "Yes" else 0
+            code = self.lookup[col].get(value, -2)
+            predicates.append((lambda col=col, value=value: self.rows_for(col, value),
+                               True,
+                               lambda r, col=col, code=code: self.codes[col][r] == code))
+
+        ranges = []
+        if "rating" in self.values and min_rating > 0:
+            ranges.append(("rating", min_rating, None))
+        if "price" in self.values and price_range:
+            ranges.append(("price", price_range[0], price_range[1]))
+        if "number_of_reviews" in self.values and min_reviews > 0:
+            ranges.append(("number_of_reviews", min_reviews, None))
+
+        for col, low, high in ranges:
+            low = column_scalar(self.values[col], low)
+            high = None if high is None else column_scalar(self.values[col], high)
+            if high is None:
+                check = lambda r, col=col, low=low: self.values[col][r] >= low  # noqa: E731
+            else:
+                check = lambda r, col=col, low=low, high=high: (  # noqa: E731
+                    (self.values[col][r] >= low) & (self.values[col][r] <= high))
+            predicates.append((lambda col=col, low=low, high=high: self.rows_between(col, low, high), False, check))
+
+        return predicates
+
+    def sort_rows(self, rows, col, ascending=True, start=0, stop=None):
+        """rows[start:stop] after sorting `rows` by `col` (missing values last, ties by row id).
+
+        Only the first `stop` rows are fully sorted: small result sets use a
+        partial top-k selection, large ones walk the precomputed permutation.
+        """
+        stop = len(rows) if stop is None else min(stop, len(rows))
+        if start >= stop:
+            return rows[:0]
+
+        values = self.values[col]
+        if len(rows) * 8 < self.n_rows or stop * 2 < len(rows):
+            keys = values[rows] if ascending else -values[rows]
+            if stop < len(rows):
+                # Only the first `stop` keys matter; keep every row tied with the cut-off key
+                cut = np.partition(keys, stop - 1)[stop - 1]
+                if not np.isnan(cut):
+                    top = keys <= cut
+                    rows, keys = rows[top], keys[top]
+            ordered = rows[np.lexsort((rows, keys))]
+            return ordered[start:stop]
+
+        permutation = self.order[col] if ascending else self.order_desc[col]
+        member = np.zeros(self.n_rows, dtype=bool)
+        member[rows] = True
+        return permutation[member[permutation]][start:stop]
+
+    def query(self, key, stats=None):
+        """Return the sorted row positions matching a normalized filter spec.
+
+        stats - optional dict; 'scanned' is set to the number of candidate rows checked
+        """
+        predicates = self._predicates(key)
+        if not predicates:
+            if stats is not None:
+                stats["scanned"] = 0
+            return np.arange(self.n_rows)
+
+        # Start from the most selective predicate and verify the others on its rows only
+        candidates = [(find(), is_sorted) for find, is_sorted, _ in predicates]
+        best = min(range(len(candidates)), key=lambda i: len(candidates[i][0]))
+        rows, is_sorted = candidates[best]
+        if stats is not None:
+            stats["scanned"] = len(rows)
+        for i, (_, _, check) in enumerate(predicates):
+            if i != best and len(rows):
+                rows = rows[check(rows)]
+
+        return rows if is_sorted else np.sort(rows)
+
+    def refine(self, rows, key):
+        """Narrow sorted `rows` (a superset of the answer) down to the rows matching `key`."""
+        for _, _, check in self._predicates(key):
+            if len(rows):
+                rows = rows[check(rows)]
+        return rows
@@ -0,0 +1,34 @@
+"""
+Prometheus endpoint for the makeupperf metrics, as a Panel plugin:
+
+    MAKEUP_PERF=1 panel serve makeup_panel.py --plugins makeupmetrics
+
+Kept apart from makeupperf so that the API modules, which are instrumented
+through makeupperf, import nothing from the web server.
+"""
+
+import hmac
+import os
+
+from tornado.web import RequestHandler
+
+from makeupperf import registry
+
+
+class MetricsHandler(RequestHandler):
+    """GET /metrics: the registry in the Prometheus text format.
+
+    If MAKEUP_METRICS_TOKEN is set, requests must send it as a bearer token.
+    """
+
+    def get(self):
+        token = os.environ.get("MAKEUP_METRICS_TOKEN")
+        if token and not hmac.compare_digest(self.request.headers.get("Authorization", ""), f"Bearer {token}"):
+            self.set_status(401)
+            return
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(registry.prometheus())
+
+
+# Routes picked up by `panel serve --plugins makeupmetrics`
+ROUTES = [(r"/metrics", MetricsHandler)]
@@ -0,0 +1,318 @@
+"""
+Opt-in hot-path instrumentation for the dashboard.
+
+Set MAKEUP_PERF=1 to record per-call latency histograms (API methods and
+dashboard callbacks), rows scanned versus returned by filter queries, bytes
+sent to browsers and cache hit/miss counts. With it unset every hook is a
+single flag check.
+
+The metrics are shown in the dashboard's admin-only Performance tab and served
+in the Prometheus text format at /metrics by loading makeupmetrics as a Panel plugin:
+
+    MAKEUP_PERF=1 panel serve makeup_panel.py --plugins makeupmetrics
+"""
+
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("MAKEUP_PERF", "") not in ("", "0")
+
+# Seconds, from 1ms to 10s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes, from 1KB to 64MB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "makeup_api_seconds": ("histogram", "BeautyProductAPI call latency by method.", LATENCY_BUCKETS),
+    "makeup_callback_seconds": ("histogram", "Dashboard callback compute time by callback.", LATENCY_BUCKETS),
+    "makeup_view_update_seconds": ("histogram", "Time from a scheduled view update being submitted to it rendering.",
+                                   LATENCY_BUCKETS),
+    "makeup_rows_scanned_total": ("counter", "Rows examined by filter queries, by query path.", None),
+    "makeup_rows_returned_total": ("counter", "Rows matched by filter queries, by query path.", None),
+    "makeup_filter_queries_total": ("counter", "Filter queries, by query path.", None),
+    "makeup_sent_bytes_total": ("counter", "Bytes sent to browsers over the websocket, by message type.", None),
+    "makeup_message_bytes": ("histogram", "Size of websocket messages sent to browsers.", SIZE_BUCKETS),
+    "makeup_cache_hits_total": ("counter", "Cache lookups that found a result, by cache and dataset.", None),
+    "makeup_cache_misses_total": ("counter", "Cache lookups that found nothing, by cache and dataset.", None),
+    "makeup_dataset_bytes": ("gauge", "Approximate memory used by the loaded datasets.", None),
+    "makeup_view_queue_depth": ("gauge", "Scheduled view updates waiting for their debounce or for the pool.", None),
+    "makeup_view_updates_total": ("counter", "Scheduled view updates, by outcome (rendered or dropped).", None),
+}
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+class Histogram:
+    """Cumulative-bucket latency/size histogram (Prometheus semantics), plus the largest value seen."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated linearly inside its bucket."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= target:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (target - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Registry:
+    """Thread-safe store of labelled histograms and counters, plus collectors read at scrape time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}   # (name, labels) -> Histogram
+        self.counters = {}     # (name, labels) -> value
+        self.collectors = {}   # name -> function yielding (metric, labels dict, value)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(METRICS[name][2])
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_collector(self, name, func):
+        """Call `func()` on every read for values owned elsewhere (e.g. cache counters); replaces `name`."""
+        self.collectors[name] = func
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def latencies(self):
+        """One row per histogram: name, labels, count, mean, p50, p95, p99 and max."""
+        with self._lock:
+            items = sorted(self.histograms.items())
+            return [{"metric": name, "labels": _label_text(labels), "count": h.count,
+                     "mean": h.sum / h.count if h.count else None, "p50": h.quantile(0.5),
+                     "p95": h.quantile(0.95), "p99": h.quantile(0.99), "max": h.max}
+                    for (name, labels), h in items]
+
+    def values(self):
+        """(name, labels, value) for every counter, including the collectors' values."""
+        with self._lock:
+            values = [(name, labels, value) for (name, labels), value in self.counters.items()]
+        for func in list(self.collectors.values()):
+            values.extend((name, tuple(sorted(labels.items())), value) for name, labels, value in func())
+        return sorted(values)
+
+    def prometheus(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRICS.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            histograms = [(name, labels, list(h.counts), h.sum, h.count, h.buckets)
+                          for (name, labels), h in sorted(self.histograms.items())]
+        for name, labels, counts, total, count, buckets in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', _number(bound)),), braces=True)} "
+                             f"{cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels, braces=True)} {_number(total)}")
+            lines.append(f"{name}_count{_label_text(labels, braces=True)} {count}")
+
+        for name, labels, value in self.values():
+            describe(name, METRICS.get(name, ("gauge",))[0])
+            lines.append(f"{name}{_label_text(labels, braces=True)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    return value if isinstance(value, str) else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels, braces=False):
+    text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{{{text}}}" if braces and text else text
+
+
+registry = Registry()
+
+
+def timed(metric, label="method"):
+    """Decorator recording each call's latency in histogram `metric`, labelled with the function name."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe(metric, time.perf_counter() - start, **{label: func.__name__})
+        return wrapper
+    return decorate
+
+
+def count_rows(path, scanned, returned):
+    """Record one filter query that examined `scanned` rows to find `returned` matches."""
+    if ENABLED:
+        registry.inc("makeup_filter_queries_total", path=path)
+        registry.inc("makeup_rows_scanned_total", scanned, path=path)
+        registry.inc("makeup_rows_returned_total", returned, path=path)
+
+
+def count_sent_bytes():
+    """Count the bytes of every Bokeh server message sent to a browser (idempotent)."""
+    from bokeh.protocol.message import Message
+
+    send = Message.send
+    if getattr(send, "counts_bytes", False):
+        return
+
+    @functools.wraps(send)
+    async def counted_send(self, conn):
+        sent = await send(self, conn)
+        if ENABLED:
+            registry.inc("makeup_sent_bytes_total", sent, type=self.msgtype)
+            registry.observe("makeup_message_bytes", sent, type=self.msgtype)
+        return sent
+
+    counted_send.counts_bytes = True
+    Message.send = counted_send
+
+
+def is_admin(user):
+    """True if `user` may see the Performance tab: listed in MAKEUP_ADMINS (comma-separated, '*' for anyone)."""
+    admins = {name.strip() for name in os.environ.get("MAKEUP_ADMINS", "").split(",") if name.strip()}
+    return "*" in admins or (user is not None and user in admins)
+
+
+class Profile:
+    """Stack samples of one interaction; `stacks` counts each (outermost first) stack of 'file:function' frames."""
+
+    def __init__(self, label, seconds, stacks, interval):
+        self.label = label
+        self.seconds = seconds
+        self.stacks = stacks
+        self.interval = interval
+
+    @property
+    def n_samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """The samples as collapsed stacks ('a;b;c count' lines), readable by flamegraph.pl and speedscope."""
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n=20):
+        """(frame, self samples, total samples) for the `n` frames with the most samples including callees."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack):
+                total[frame] += count
+        return [(frame, own[frame], count) for frame, count in total.most_common(n)]
+
+
+class SlowProfiler:
+    """Samples the stack of instrumented interactions while armed and keeps the first that is slower than a threshold.
+
+    Sampling runs on a helper thread reading the interaction thread's frame
+    every `interval` seconds, so the profiled code itself is not traced.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.threshold = None   # seconds while armed, None otherwise
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def arm(self, threshold=0.5):
+        with self._lock:
+            self.threshold = threshold
+            self.profile = None
+
+    def disarm(self):
+        with self._lock:
+            self.threshold = None
+
+    @property
+    def armed(self):
+        return self.threshold is not None
+
+    @contextmanager
+    def capture(self, label):
+        """Profile the enclosed block if the profiler is armed."""
+        if self.threshold is None:
+            yield
+            return
+
+        stacks = Counter()
+        done = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(threading.get_ident(), stacks, done), daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            done.set()
+            sampler.join()
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if self.threshold is not None and elapsed >= self.threshold:
+                    self.threshold = None
+                    self.profile = Profile(label, elapsed, stacks, self.interval)
+
+    def _sample(self, thread_id, stacks, done):
+        while not done.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                stacks[tuple(reversed(stack))] += 1
+
+
+profiler = SlowProfiler()
@@ -0,0 +1,186 @@
+"""
+Several datasets served side by side, loaded on first use and evicted when idle.
+
+A DatasetRegistry maps dataset names to CSV paths. The first session to select
+a dataset loads it (column names are mapped to the canonical ones at ingest,
+see makeupstore.COLUMN_NAMES); later sessions share the same API object, its
+indexes and caches. Datasets no session is using are dropped, least recently
+used first, while the loaded ones together take more than `max_bytes`.
+"""
+
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from makeupapi import BeautyProductAPI
+
+# Default memory cap for loaded datasets
+MAX_BYTES = 2 * 1024 ** 3
+
+
+def dataset_sources(spec, data_dir="data"):
+    """{name: path} from a comma-separated list of paths or name=path entries.
+
+    Names default to the file name without its extension. An empty `spec`
+    means every CSV in `data_dir`.
+    """
+    entries = [entry.strip() for entry in spec.split(",") if entry.strip()]
+    if not entries and os.path.isdir(data_dir):
+        entries = [os.path.join(data_dir, f) for f in sorted(os.listdir(data_dir)) if f.endswith(".csv")]
+    sources = {}
+    for entry in entries:
+        name, _, path = entry.rpartition("=")
+        sources[name or os.path.splitext(os.path.basename(path))[0]] = path
+    return sources
+
+
+def footprint(obj, seen=None):
+    """Bytes held by the frames and arrays reachable from `obj` (snapshots, indexes, cubes)."""
+    seen = set() if seen is None else seen
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=False, deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(footprint(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(footprint(value, seen) for value in obj)
+    if hasattr(obj, "__dict__"):
+        return sum(footprint(value, seen) for value in vars(obj).values())
+    return 0
+
+
+def dataset_bytes(api):
+    """Approximate memory used by a loaded dataset's rows, indexes and cube."""
+    return footprint(api.snapshot)
+
+
+def load_dataset(path):
+    """The default loader: the whole dataset in memory, with its columns memory-mapped from the cache."""
+    api = BeautyProductAPI()
+    api.load_data(path, mmap=True)
+    return api
+
+
+class DatasetRegistry:
+    """Named datasets, loaded lazily, shared by every session and evicted LRU when idle."""
+
+    def __init__(self, sources, max_bytes=MAX_BYTES, load=load_dataset):
+        """
+        sources - {name: CSV path}
+        max_bytes - memory cap for the loaded datasets (datasets in use are never evicted)
+        load - function loading one path into an API object
+        """
+        self.sources = dict(sources)
+        self.max_bytes = max_bytes
+        self.load = load
+        self._loaded = OrderedDict()  # name -> API, least recently used first
+        self._sizes = {}              # name -> (data version, bytes)
+        self._load_ids = {}           # name -> number of the load that produced its API
+        self._loads = itertools.count(1)
+        self._loading = {}            # name -> lock held while it loads
+        self._holders = {}            # name -> sessions using it
+        self._sessions = {}           # session -> name
+        self._lock = threading.Lock()
+
+    def names(self):
+        return list(self.sources)
+
+    def loaded(self):
+        """(name, API) of every loaded dataset, least recently used first."""
+        with self._lock:
+            return list(self._loaded.items())
+
+    def get(self, name):
+        """The API serving dataset `name`, loading it first if needed."""
+        if name not in self.sources:
+            raise KeyError(f"Unknown dataset: {name}")
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name]
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        # Only sessions wanting the same dataset wait for it to load
+        with loading:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+            api = self.load(self.sources[name])
+            with self._lock:
+                self._loaded[name] = api
+                self._load_ids[name] = next(self._loads)
+        return api
+
+    def load_id(self, name):
+        """A number identifying the load behind dataset `name`'s API, new each time it is loaded again.
+
+        Results cached outside the API (e.g. figures) should be keyed on the
+        dataset name, this and the data version, since a dataset evicted and
+        loaded again starts over at the same data versions.
+        """
+        with self._lock:
+            return self._load_ids.get(name)
+
+    def acquire(self, name, session):
+        """get(name) for `session`, which keeps the dataset from being evicted until released."""
+        self.release(session, evict=False)
+        if session is not None:
+            with self._lock:
+                self._sessions[session] = name
+                self._holders.setdefault(name, set()).add(session)
+        try:
+            api = self.get(name)
+        except Exception:
+            self.release(session)
+            raise
+        self.evict()
+        return api
+
+    def release(self, session, evict=True):
+        """Stop holding the dataset `session` acquired (e.g. when the session ends)."""
+        with self._lock:
+            name = self._sessions.pop(session, None)
+            if name is not None:
+                self._holders[name].discard(session)
+        if evict and name is not None:
+            self.evict()
+
+    def nbytes(self):
+        """Approximate memory used by the loaded datasets."""
+        return sum(self._size(name, api) for name, api in self.loaded())
+
+    def _size(self, name, api):
+        # The data is measured once per version; the result caches keep count of their own size
+        version, size = self._sizes.get(name, (None, 0))
+        if version != api.version:
+            size = dataset_bytes(api)
+            self._sizes[name] = (api.version, size)
+        return size + api.cache.nbytes + api.bin_cache.nbytes
+
+    def evict(self):
+        """Drop idle datasets, least recently used first, until the loaded ones fit in max_bytes."""
+        sizes = {name: self._size(name, api) for name, api in self.loaded()}
+        evicted = []
+        with self._lock:
+            total = sum(sizes.get(name, 0) for name in self._loaded)
+            for name in list(self._loaded):
+                if total <= self.max_bytes:
+                    break
+                if self._holders.get(name):
+                    continue
+                evicted.append(self._loaded.pop(name))
+                self._sizes.pop(name, None)
+                self._load_ids.pop(name, None)
+                total -= sizes.get(name, 0)
+        for api in evicted:
+            api.stop_watching()
+        return len(evicted)
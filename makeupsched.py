@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import panel as pn
+from panel.io.state import set_curdoc
+
+import makeupperf
+from makeupperf import profiler, registry
+
+# One pool for every session in the process; pandas/numpy release the GIL for most of the work
+_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="makeup-view")
+
+
+class SchedulerStats:
+    """Process-wide counters for scheduled dashboard updates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0     # debounced updates not yet submitted
+        self.running = 0     # updates queued in or running on the pool
+        self.dropped = 0     # updates superseded before they rendered
+        self.rendered = 0
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {"queue_depth": self.waiting + self.running, "waiting": self.waiting, "running": self.running,
+                    "dropped": self.dropped, "rendered": self.rendered}
+
+
+stats = SchedulerStats()
+
+
+def scheduler_metrics():
+    """The scheduler counters as (metric, labels, value) for the performance registry."""
+    counts = stats.snapshot()
+    for state in ("waiting", "running"):
+        yield "makeup_view_queue_depth", {"state": state}, counts[state]
+    for outcome in ("dropped", "rendered"):
+        yield "makeup_view_updates_total", {"outcome": outcome}, counts[outcome]
+
+
+registry.add_collector("scheduler", scheduler_metrics)
+
+
+class ScheduledView:
+    """Render `func(*widget values)` into `self.panel` without blocking the event loop.
+
+    Widget changes are debounced until the widgets have been still for `delay`
+    seconds, the computation runs on a shared thread pool, and a computation
+    that has been superseded by a newer widget state is cancelled (or, if it
+    already started, its result is discarded) so only the latest state renders.
+    Without a server session (e.g. in a notebook) updates run inline.
+
+    An inactive view (e.g. a hidden tab) only marks itself stale on changes and
+    computes when activated, reusing one of its last `cache_size` results if
+    the widgets are back in a state it has already rendered.
+    """
+
+    def __init__(self, func, *widgets, delay=0.15, active=True, cache_size=4):
+        self.func = func
+        self.widgets = widgets
+        self.delay = delay
+        self.active = active
+        self.cache_size = cache_size
+        self.panel = pn.Column(sizing_mode="stretch_width")
+
+        self._doc = pn.state.curdoc
+        self._generation = 0
+        self._timeout = None
+        self._future = None
+        self._results = OrderedDict()
+        self._rendered = None
+        self._stale = True
+
+        # The first render happens straight away so the page isn't empty
+        if active:
+            self._render(self._key(), self._compute(self._values()))
+        for widget in widgets:
+            widget.param.watch(self._changed, "value")
+
+    def _values(self):
+        return [w.value for w in self.widgets]
+
+    def _key(self):
+        return tuple(tuple(v) if isinstance(v, list) else v for v in self._values())
+
+    def set_active(self, active):
+        """Show or hide the view; a stale view catches up when it becomes active."""
+        self.active = active
+        if not active or not self._stale:
+            return
+
+        key = self._key()
+        if makeupperf.ENABLED and key != self._rendered:
+            registry.inc("makeup_cache_hits_total" if key in self._results else "makeup_cache_misses_total",
+                         cache="views")
+        if key == self._rendered:
+            self._stale = False
+        elif key in self._results:
+            self._render(key, self._results[key])
+        else:
+            self._changed(delay=0)
+
+    def refresh(self):
+        """Recompute for the current widget values after the data itself changed."""
+        self._results.clear()
+        self._rendered = None
+        self._changed(delay=0)
+
+    def _render(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+        self._rendered = key
+        self._stale = False
+        self.panel.objects = [result]
+
+    def _changed(self, *events, delay=None):
+        self._generation += 1
+        self._stale = True
+        if not self.active:
+            return
+        if self._doc is None or self._doc.session_context is None:
+            self._render(self._key(), self._compute(self._values()))
+            return
+
+        # Restart the debounce timer; the pending update it replaces never runs
+        if self._timeout is not None:
+            try:
+                self._doc.remove_timeout_callback(self._timeout)
+                stats.add(waiting=-1, dropped=1)
+            except ValueError:
+                pass
+        stats.add(waiting=1)
+        delay = self.delay if delay is None else delay
+        self._timeout = self._doc.add_timeout_callback(partial(self._submit, self._generation), int(delay * 1000))
+
+    def _submit(self, generation):
+        self._timeout = None
+        stats.add(waiting=-1)
+        if generation != self._generation:
+            stats.add(dropped=1)
+            return
+
+        # A queued computation for an older state is no longer needed
+        if self._future is not None and self._future.cancel():
+            stats.add(running=-1, dropped=1)
+
+        key = self._key()
+        stats.add(running=1)
+        self._future = _executor.submit(self._run, self._values())
+        self._future.add_done_callback(partial(self._done, generation, key, time.perf_counter()))
+
+    def _run(self, values):
+        # Callbacks look up the session (e.g. for per-session caches) through pn.state.curdoc
+        with set_curdoc(self._doc):
+            return self._compute(values)
+
+    def _compute(self, values):
+        """`func(*values)`, timed and sampled by the profiler when instrumentation is on."""
+        if not makeupperf.ENABLED:
+            return self.func(*values)
+        name = self.func.__name__
+        start = time.perf_counter()
+        try:
+            with profiler.capture(name):
+                return self.func(*values)
+        finally:
+            registry.observe("makeup_callback_seconds", time.perf_counter() - start, callback=name)
+
+    def _done(self, generation, key, submitted, future):
+        if future.cancelled():
+            return
+        stats.add(running=-1)
+        # Bokeh documents may only be modified from the event loop
+        self._doc.add_next_tick_callback(partial(self._apply, generation, key, submitted, future))
+
+    def _apply(self, generation, key, submitted, future):
+        if generation != self._generation:
+            stats.add(dropped=1)
+            return
+        error = future.exception()
+        if error is not None:
+            self.panel.objects = [pn.pane.Markdown(f"*Could not update this view: {error}*")]
+            return
+        stats.add(rendered=1)
+        self._render(key, future.result())
+        if makeupperf.ENABLED:
+            registry.observe("makeup_view_update_seconds", time.perf_counter() - submitted,
+                             callback=self.func.__name__)
@@ -0,0 +1,255 @@
+"""
+Full-text prefix search over product names, brands and ingredients.
+
+Text is split into lowercase word tokens. A search is a few terms, and a
+product matches when every term is the start of one of its tokens (in any of
+the searched columns), so results narrow as the user types.
+
+TextIndex keeps an inverted index: for every distinct token, the sorted ids
+of the rows holding it. Tokens are sorted, so the tokens starting with a term
+are one contiguous range and their rows one slice. Terms shorter than
+PREFIX_MIN would span most of the vocabulary, so the leading 1..PREFIX_MIN-1
+characters of every token (edge n-grams) get posting lists of their own.
+"""
+
+import functools
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Columns searched, where present
+TEXT_COLUMNS = ("name", "brand", "main_ingredient", "ingredients")
+# Terms at least this long are looked up in the token index, shorter ones in the n-gram index
+PREFIX_MIN = 3
+
+_WORD = re.compile(r"\w+")
+# Past the last character, so [term, term + _LAST) holds every string starting with term
+_LAST = chr(0x10FFFF)
+
+
+def _tokens(text):
+    return frozenset(_WORD.findall(str(text).lower()))
+
+
+@functools.lru_cache(maxsize=65536)
+def tokens(text):
+    """Distinct lowercase word tokens of `text` (cached, for repeated scans of the same values)."""
+    return _tokens(text)
+
+
+def search_terms(text):
+    """Normalized search terms of a search box value: distinct tokens, sorted (empty for no search)."""
+    return tuple(sorted(tokens(text))) if text else ()
+
+
+def edge_grams(token):
+    """The leading 1..PREFIX_MIN-1 characters of `token`."""
+    return [token[:k] for k in range(1, min(len(token), PREFIX_MIN - 1) + 1)]
+
+
+def sorted_unique(keys):
+    """np.unique of an int array, by sorting it in place."""
+    keys.sort()
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+
+
+def matches(df, terms):
+    """Mask of the rows of `df` matching every search term, by tokenizing its text (no index)."""
+    mask = np.ones(len(df), dtype=bool)
+    columns = [c for c in TEXT_COLUMNS if c in df.columns]
+    for term in terms:
+        found = np.zeros(len(df), dtype=bool)
+        for col in columns:
+            # Each distinct value is tokenized once
+            codes, uniques = pd.factorize(df[col])
+            hit = np.array([any(t.startswith(term) for t in tokens(u)) for u in uniques] + [False])
+            found |= hit[codes]
+        mask &= found
+    return mask
+
+
+def contains(sorted_rows, rows):
+    """Mask of `rows` that are in `sorted_rows`."""
+    if not len(sorted_rows):
+        return np.zeros(len(rows), dtype=bool)
+    at = np.minimum(np.searchsorted(sorted_rows, rows), len(sorted_rows) - 1)
+    return sorted_rows[at] == rows
+
+
+class Postings:
+    """Sorted vocabulary of strings with the sorted row ids of each, stored CSR style."""
+
+    def __init__(self, vocab, rows, offsets, n_rows):
+        self.vocab = vocab
+        self.rows = rows
+        self.offsets = offsets
+        self.n_rows = n_rows
+
+    @classmethod
+    def build(cls, columns, n_rows):
+        """Postings from (codes, rows, terms per code) of every column: row rows[i] holds the terms of codes[i].
+
+        Only distinct values are tokenized; their terms are spread over the rows
+        without a Python loop, and one sort of (term, row) keys groups them.
+        """
+        vocab = sorted(set().union(*(terms for _, _, value_terms in columns for terms in value_terms)))
+        term_ids = {term: i for i, term in enumerate(vocab)}
+        keys = [np.empty(0, dtype=np.int64)]
+        for codes, rows, value_terms in columns:
+            # Terms of value j are flat[starts[j]:starts[j] + counts[j]]; missing values (code -1) have none
+            counts = np.array([len(terms) for terms in value_terms] + [0], dtype=np.int64)
+            starts = np.cumsum(counts) - counts
+            flat = np.fromiter((term_ids[term] for terms in value_terms for term in terms), dtype=np.int64,
+                               count=int(counts.sum()))
+            per_row = counts[codes]
+            shift = np.repeat(starts[codes] - (np.cumsum(per_row) - per_row), per_row)
+            keys.append(flat[np.arange(int(per_row.sum())) + shift] * max(n_rows, 1) + np.repeat(rows, per_row))
+        return cls.from_keys(vocab, sorted_unique(np.concatenate(keys)), n_rows)
+
+    @classmethod
+    def from_keys(cls, vocab, keys, n_rows):
+        """Postings from sorted, distinct term id * n_rows + row keys."""
+        offsets = np.searchsorted(keys // max(n_rows, 1), np.arange(len(vocab) + 1))
+        return cls(np.array(vocab, dtype=str), keys % max(n_rows, 1), offsets, n_rows)
+
+    def edge_grams(self):
+        """Postings of the edge n-grams of this vocabulary: each gram's rows are those of the terms it starts."""
+        pairs = [(gram, term_id) for term_id, term in enumerate(self.vocab.tolist()) for gram in edge_grams(term)]
+        vocab = sorted({gram for gram, _ in pairs})
+        gram_ids = {gram: i for i, gram in enumerate(vocab)}
+        pair_grams = np.array([gram_ids[gram] for gram, _ in pairs], dtype=np.int64)
+        pair_terms = np.array([term_id for _, term_id in pairs], dtype=np.int64)
+
+        # Every pair contributes its term's rows
+        starts, lengths = self.offsets[pair_terms], np.diff(self.offsets)[pair_terms]
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        rows = self.rows[np.arange(int(lengths.sum())) + shift]
+        keys = np.repeat(pair_grams, lengths) * max(self.n_rows, 1) + rows
+        return Postings.from_keys(vocab, sorted_unique(keys), self.n_rows)
+
+    def exact(self, term):
+        """Sorted rows of `term`."""
+        at = np.searchsorted(self.vocab, term)
+        if at == len(self.vocab) or self.vocab[at] != term:
+            return self.rows[:0]
+        return self.rows[self.offsets[at]:self.offsets[at + 1]]
+
+    def prefixed(self, term):
+        """Sorted rows of every term starting with `term`."""
+        low, high = np.searchsorted(self.vocab, [term, term + _LAST])
+        rows = self.rows[self.offsets[low]:self.offsets[high]]
+        # One term's rows are already sorted and distinct
+        if high - low <= 1:
+            return rows
+        if len(rows) * 16 < self.n_rows:
+            return np.unique(rows)
+        # Marking a mask is linear, where sorting many rows is not
+        member = np.zeros(self.n_rows, dtype=bool)
+        member[rows] = True
+        return np.flatnonzero(member)
+
+    def updated(self, keep, new_id, added):
+        """Postings with the rows not in `keep` dropped, renumbered by `new_id`, and Postings `added` merged in.
+
+        The added rows must have higher ids than every kept row, so each term's
+        rows stay sorted by inserting them after its kept rows.
+        """
+        term_ids = np.repeat(np.arange(len(self.vocab)), np.diff(self.offsets))
+        rows = self.rows
+        if keep is not None:
+            kept = keep[rows]
+            term_ids, rows = term_ids[kept], new_id[rows[kept]]
+
+        vocab = np.union1d(self.vocab, added.vocab)
+        term_ids = np.searchsorted(vocab, self.vocab)[term_ids]
+        added_ids = np.searchsorted(vocab, added.vocab)[np.repeat(np.arange(len(added.vocab)), np.diff(added.offsets))]
+        # Kept entries are still sorted by (term, row); each added one goes after its term's kept rows
+        at = np.searchsorted(term_ids, added_ids, side="right")
+        term_ids = np.insert(term_ids, at, added_ids)
+        rows = np.insert(rows, at, added.rows)
+
+        # Terms whose rows were all dropped leave the vocabulary
+        counts = np.bincount(term_ids, minlength=len(vocab))
+        present = counts > 0
+        return Postings(vocab[present], rows, np.concatenate([[0], np.cumsum(counts[present])]), added.n_rows)
+
+
+class TextIndex:
+    """Inverted index of the searchable text columns: token and edge n-gram postings."""
+
+    def __init__(self, df, rows=None):
+        """Index the rows of `df` (or only `rows`, numbered as in `df`)."""
+        self.columns = [c for c in TEXT_COLUMNS if c in df.columns]
+        self.n_rows = n_rows = len(df)
+        rows = np.arange(n_rows) if rows is None else rows
+
+        words = []
+        for col in self.columns:
+            codes, uniques = pd.factorize(df[col].iloc[rows] if len(rows) != n_rows else df[col])
+            words.append((codes, rows, [_tokens(value) for value in uniques]))
+
+        self.words = Postings.build(words, n_rows)
+        self.grams = self.words.edge_grams()
+
+    def search(self, terms):
+        """Sorted row ids matching every term of `terms`, a non-empty tuple from search_terms."""
+        if not self.columns:
+            return np.empty(0, dtype=np.int64)
+        found = sorted((self.grams.exact(t) if len(t) < PREFIX_MIN else self.words.prefixed(t) for t in terms),
+                       key=len)
+        rows = found[0]
+        # Intersect from the smallest list, probing the larger ones by binary search
+        for other in found[1:]:
+            if len(rows):
+                rows = rows[contains(other, rows)]
+        return rows
+
+    def updated(self, df, keep=None):
+        """A new index for `df`, this index's frame with the rows not in `keep` dropped and rows appended.
+
+        Only the appended rows are tokenized. This index is left untouched.
+        """
+        new_id = None if keep is None else np.cumsum(keep) - 1
+        n_kept = self.n_rows if keep is None else int(keep.sum())
+        added = TextIndex(df, np.arange(n_kept, len(df)))
+
+        index = TextIndex.__new__(TextIndex)
+        index.columns = self.columns
+        index.n_rows = len(df)
+        index.words = self.words.updated(keep, new_id, added.words)
+        index.grams = self.grams.updated(keep, new_id, added.grams)
+        return index
+
+    def save(self, text_dir):
+        """Write the postings as .npy files next to the other indexes."""
+        os.makedirs(text_dir)
+        for name, postings in (("words", self.words), ("grams", self.grams)):
+            np.save(os.path.join(text_dir, f"{name}-vocab.npy"), postings.vocab)
+            np.save(os.path.join(text_dir, f"{name}-rows.npy"), postings.rows)
+            np.save(os.path.join(text_dir, f"{name}-offsets.npy"), postings.offsets)
+        with open(os.path.join(text_dir, "meta.json"), "w") as f:
+            json.dump({"n_rows": self.n_rows, "columns": self.columns}, f)
+
+    @classmethod
+    def load(cls, text_dir, df, mmap=False):
+        """Load an index saved for `df`'s text columns, or return None if there isn't one."""
+        try:
+            with open(os.path.join(text_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta["n_rows"] != len(df) or meta["columns"] != [c for c in TEXT_COLUMNS if c in df.columns]:
+            return None
+
+        mmap_mode = "r" if mmap else None
+        index = cls.__new__(cls)
+        index.columns = meta["columns"]
+        index.n_rows = len(df)
+        for name in ("words", "grams"):
+            arrays = [np.load(os.path.join(text_dir, f"{name}-{part}.npy"), mmap_mode=mmap_mode)
+                      for part in ("vocab", "rows", "offsets")]
+            setattr(index, name, Postings(*arrays, index.n_rows))
+        return index
@@ -0,0 +1,127 @@
+"""
+Mergeable quantile sketches (DDSketch-style) for the summary percentiles.
+
+A sketch is a vector of counts over logarithmically spaced buckets: bucket k
+holds the values in (GAMMA^(k-1), GAMMA^k] (shifted so small prices still get
+their own buckets), so every value is within a relative ALPHA of its bucket's
+representative. Sketches merge by adding counts, and a quantile read off a
+merged sketch is within a relative ALPHA of the exact (lower) quantile of the
+underlying values, whatever was merged. Zero and negative values share bucket 0
+and read back as 0.
+"""
+
+import numpy as np
+
+# Relative error bound of every reported quantile
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = np.log(GAMMA)
+# Positive values outside [MIN_VALUE, MAX_VALUE] are clamped to the first/last bucket
+MIN_VALUE, MAX_VALUE = 0.01, 1e9
+_SHIFT = int(np.ceil(np.log(MIN_VALUE) / _LOG_GAMMA)) - 1
+N_BUCKETS = int(np.ceil(np.log(MAX_VALUE) / _LOG_GAMMA)) - _SHIFT + 1
+
+QUANTILES = (0.1, 0.5, 0.9)
+# Sketched columns and the summary entries they fill
+SKETCHED = {"price": "Price Percentiles", "rating": "Rating Percentiles", "number_of_reviews": "Review Percentiles"}
+
+
+def buckets(values):
+    """Bucket of every value: 0 for zero or negative, -1 for missing."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), -1, dtype=np.int64)
+    positive = values > 0
+    out[values <= 0] = 0
+    keys = np.ceil(np.log(values[positive]) / _LOG_GAMMA) - _SHIFT
+    out[positive] = np.clip(keys, 1, N_BUCKETS - 1)
+    return out
+
+
+def bucket_counts(values):
+    """Sketch of `values` (missing values are left out)."""
+    b = buckets(values)
+    return np.bincount(b[b >= 0], minlength=N_BUCKETS)
+
+
+def bucket_values(b):
+    """Representative value of each bucket: the point with the same relative distance to both its edges."""
+    b = np.asarray(b)
+    return np.where(b > 0, 2 * GAMMA ** (b + _SHIFT) / (GAMMA + 1), 0.0)
+
+
+def quantiles(counts, qs=QUANTILES):
+    """Approximate `qs` quantiles of a sketch (within relative ALPHA), or None if it is empty."""
+    cumulative = np.cumsum(counts)
+    if not len(cumulative) or cumulative[-1] == 0:
+        return None
+    # The value of rank floor(q * (n - 1)) lies in the first bucket holding more values than that rank
+    ranks = np.asarray(qs) * (cumulative[-1] - 1)
+    return tuple(float(v) for v in bucket_values(np.searchsorted(cumulative, ranks, side="right")))
+
+
+def percentile_summary(sketches):
+    """Summary entries (p10, median, p90) per sketched column, from {column: sketch}; None where unavailable."""
+    return {label: quantiles(sketches[col]) if col in sketches else None for col, label in SKETCHED.items()}
+
+
+class Sketches:
+    """Sketches of many groups (e.g. cube cells), stored sparsely.
+
+    keys holds group * N_BUCKETS + bucket for every non-empty (group, bucket),
+    sorted, with its count in `counts`, so one group's entries are a slice.
+    """
+
+    def __init__(self, keys, counts, n_groups, offsets=None):
+        self.keys = keys
+        self.counts = counts
+        self.n_groups = n_groups
+        self.offsets = np.searchsorted(keys // N_BUCKETS, np.arange(n_groups + 1)) if offsets is None else offsets
+
+    @classmethod
+    def build(cls, groups, values, n_groups):
+        """Sketches of `values` by their group number in `groups`."""
+        b = buckets(values)
+        valid = b >= 0
+        keys, counts = np.unique(groups[valid] * N_BUCKETS + b[valid], return_counts=True)
+        return cls(keys, counts, n_groups)
+
+    def updated(self, remap, n_groups, removed=None, added=None):
+        """New sketches after renumbering groups and removing/adding values.
+
+        remap - new group number of every current group (increasing)
+        removed, added - (new group numbers, values) of the values to take out / put in
+        """
+        keys = remap[self.keys // N_BUCKETS] * N_BUCKETS + self.keys % N_BUCKETS
+        delta_keys, delta_counts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for change, sign in ((removed, -1), (added, 1)):
+            if change is not None:
+                b = buckets(change[1])
+                valid = b >= 0
+                delta_keys.append(change[0][valid] * N_BUCKETS + b[valid])
+                delta_counts.append(np.full(int(valid.sum()), sign, dtype=np.int64))
+        delta_keys, inverse = np.unique(np.concatenate(delta_keys), return_inverse=True)
+        delta_counts = np.bincount(inverse, weights=np.concatenate(delta_counts),
+                                   minlength=len(delta_keys)).astype(np.int64)
+
+        # Changes to existing entries are added in place, new entries inserted in order
+        at = np.searchsorted(keys, delta_keys)
+        found = at < len(keys)
+        found[found] = keys[at[found]] == delta_keys[found]
+        counts = self.counts.copy()
+        counts[at[found]] += delta_counts[found]
+        keys = np.insert(keys, at[~found], delta_keys[~found])
+        counts = np.insert(counts, at[~found], delta_counts[~found])
+        nonzero = counts != 0
+        return Sketches(keys[nonzero], counts[nonzero], n_groups)
+
+    def merged(self, groups):
+        """One sketch of all the values in `groups`."""
+        starts, stops = self.offsets[groups], self.offsets[np.asarray(groups) + 1]
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.zeros(N_BUCKETS, dtype=np.int64)
+        # Position k of group j maps to entry starts[j] + k
+        shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        entries = np.arange(lengths.sum()) + shift
+        return np.bincount(self.keys[entries] % N_BUCKETS, weights=self.counts[entries],
+                           minlength=N_BUCKETS).astype(np.int64)
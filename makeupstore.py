@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Explicit dtypes for known columns, keyed by canonical column name (see COLUMN_NAMES).
+# Columns not listed keep whatever pandas infers.
+SCHEMA = {
+    # Low-cardinality text columns
+    "brand": "category",
+    "category": "category",
+    "skin_type": "category",
+    "packaging_type": "category",
+    "country_of_origin": "category",
+    "usage_frequency": "category",
+    "gender_target": "category",
+    "main_ingredient": "category",
+    "product_size": "category",
+    "size": "category",
+    # Numbers
+    "price": "float32",
+    "price_usd": "float32",
+    "value_price": "float32",
+    "rating": "float32",
+    "number_of_reviews": "int32",
+    "love": "int32",
+    # Flags
+    "online_only": "bool",
+    "exclusive": "bool",
+    "limited_edition": "bool",
+    "limited_time_offer": "bool",
+    "cruelty_free": "bool",
+}
+
+# Source column names (lower-cased) that differ from the names the dashboard reads; any other
+# column is only stripped and lower-cased, so e.g. Product_Name -> name, Price_USD -> price, Brand -> brand
+COLUMN_NAMES = {
+    "product_name": "name",
+    "price_usd": "price",
+}
+
+# Integer and flag columns are read as pandas' nullable types, since an empty cell can't be an
+# int32 or a bool. A column without missing values is then narrowed to its schema dtype; one with
+# missing values becomes float, with the missing values as NaN.
+NULLABLE = {"int32": "Int32", "bool": "boolean"}
+WITH_MISSING = {"Int32": ("int32", "float64"), "boolean": ("bool", "float32")}
+
+CACHE_VERSION = 2
+
+
+def cache_dir_for(path):
+    """Columnar cache directory that lives next to the CSV."""
+    return f"{path}.cols"
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    """Hash a file in chunks without reading it all into memory."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def canonical_columns(columns):
+    """The names the dashboard reads for a source CSV's columns."""
+    present = {c.strip().lower() for c in columns}
+    names = []
+    for c in columns:
+        name = c.strip().lower()
+        # A mapped name never replaces a column the source already has
+        names.append(name if COLUMN_NAMES.get(name, name) in present else COLUMN_NAMES[name])
+    return names
+
+
+def schema_dtypes(header, schema=SCHEMA, nullable=False):
+    """pandas dtype per raw CSV column name, for the columns `schema` knows.
+
+    With `nullable`, int and bool columns get the dtypes to read them with (see NULLABLE).
+    """
+    dtypes = {c: schema[name] for c, name in zip(header, canonical_columns(header)) if name in schema}
+    return {c: NULLABLE.get(dtype, dtype) for c, dtype in dtypes.items()} if nullable else dtypes
+
+
+def settle_nullable(df):
+    """Narrow the nullable int/bool columns of a DataFrame read with nullable dtypes (see NULLABLE), in place."""
+    for col in df.columns:
+        dtypes = WITH_MISSING.get(str(df[col].dtype))
+        if dtypes is not None:
+            df[col] = df[col].astype(dtypes[1] if df[col].isna().any() else dtypes[0])
+    return df
+
+
+def read_typed_csv(path, schema=SCHEMA, columns=None, chunksize=None):
+    """Read a CSV with explicit dtypes, loading only `columns` if given.
+
+    Int and bool columns with missing values come back as float (see NULLABLE).
+    With `chunksize`, returns an iterator of DataFrames of at most that many rows;
+    each chunk is narrowed on its own, so chunks may differ there.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    if columns is not None:
+        wanted = set(columns)
+        header = [c for c, name in zip(header, canonical_columns(header)) if name in wanted]
+
+    dtype = schema_dtypes(header, schema, nullable=True)
+    if chunksize is not None:
+        return _stripped_chunks(pd.read_csv(path, usecols=list(header), dtype=dtype, chunksize=chunksize))
+
+    df = pd.read_csv(path, usecols=list(header), dtype=dtype)
+    df.columns = canonical_columns(df.columns)
+    return settle_nullable(df)
+
+
+def _stripped_chunks(reader):
+    with reader:
+        for chunk in reader:
+            chunk.columns = canonical_columns(chunk.columns)
+            yield settle_nullable(chunk)
+
+
+def write_column_cache(df, cache_dir, source):
+    """Write every column of `df` as .npy files plus a meta.json describing them."""
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        entry = {"name": col, "file": f"{i}.npy"}
+        if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype.kind not in "biuf":
+            # Text is stored as integer codes plus a fixed-width table of values
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                entry["kind"] = "category"
+                codes, values = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                entry["kind"] = "text"
+                codes, values = pd.factorize(series)
+            np.save(os.path.join(tmp_dir, f"{i}.values.npy"), np.asarray(values, dtype=str))
+            # Categorical codes keep pandas' own width so they can be mapped back without a copy
+            np.save(os.path.join(tmp_dir, entry["file"]), codes if entry["kind"] == "category" else codes.astype(np.int32))
+        else:
+            entry["kind"] = "array"
+            np.save(os.path.join(tmp_dir, entry["file"]), series.to_numpy())
+        columns.append(entry)
+
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"version": CACHE_VERSION, "source": source, "columns": columns}, f)
+
+    # Swap the finished cache in; if another process beat us to it, keep theirs
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def read_column_cache(cache_dir, columns=None, mmap=False):
+    """Rebuild a DataFrame from a column cache.
+
+    With mmap=True numeric columns and categorical codes are read-only views of
+    the memory-mapped files, so every process loading the same cache shares one
+    physical copy through the OS page cache. Free text is still materialized.
+    """
+    meta = read_meta(cache_dir)
+    mmap_mode = "r" if mmap else None
+    data = {}
+    for entry in meta["columns"]:
+        if columns is not None and entry["name"] not in columns:
+            continue
+        array = np.load(os.path.join(cache_dir, entry["file"]), mmap_mode=mmap_mode)
+        if entry["kind"] == "array":
+            data[entry["name"]] = array
+            continue
+
+        values = np.load(os.path.join(cache_dir, entry["file"].replace(".npy", ".values.npy"))).astype(object)
+        if entry["kind"] == "category":
+            data[entry["name"]] = pd.Categorical.from_codes(array, categories=values, validate=False)
+        else:
+            # Missing text was stored as code -1
+            text = values.take(array, mode="clip")
+            text[np.asarray(array) < 0] = np.nan
+            data[entry["name"]] = text
+    return pd.DataFrame(data, copy=False)
+
+
+def read_meta(cache_dir):
+    """Return the cache's meta.json contents, or None if there is no usable cache."""
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def load_columns(path, schema=SCHEMA, columns=None, mmap=False):
+    """Load a CSV through its column cache, rebuilding the cache if the CSV changed."""
+    cache_dir = cache_dir_for(path)
+    stat = os.stat(path)
+    meta = read_meta(cache_dir)
+
+    if meta is not None:
+        source = meta["source"]
+        cached = [c["name"] for c in meta["columns"]]
+        has_columns = source["columns"] is None or (columns is not None and set(columns) <= set(cached))
+        if has_columns:
+            if source["size"] == stat.st_size and source["mtime"] == stat.st_mtime:
+                return read_column_cache(cache_dir, columns, mmap)
+            # A touched but unchanged file keeps its cache
+            if source["size"] == stat.st_size and source["sha1"] == file_sha1(path):
+                source["mtime"] = stat.st_mtime
+                _write_meta(cache_dir, meta)
+                return read_column_cache(cache_dir, columns, mmap)
+
+    df = read_typed_csv(path, schema, columns)
+    source = {"size": stat.st_size, "mtime": stat.st_mtime, "sha1": file_sha1(path),
+              "columns": None if columns is None else list(df.columns)}
+    write_column_cache(df, cache_dir, source)
+    if mmap and read_meta(cache_dir) is not None:
+        # Re-open what we just wrote so this process maps the shared copy too
+        return read_column_cache(cache_dir, columns, mmap)
+    return df
+
+
+def _write_meta(cache_dir, meta):
+    tmp = os.path.join(cache_dir, f"meta.json.tmp-{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(cache_dir, "meta.json"))
@@ -1,5 +1,33 @@
+import io
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 
+HEADER = "# Product Overview\n\n"
+
+# Columns filled into each product's section, in template order
+FIELDS = ("name", "brand", "category", "price_usd", "online_only", "exclusive", "description", "ingredients")
+
+# Precompiled per-product template (describe_product's text plus the separator), one positional
+# field per column in FIELDS
+PRODUCT_TEMPLATE = """
+    ### {}
+    **Brand:** {}  
+    **Category:** {}  
+    **Price:** ${}  
+    **Online Only:** {}  
+    **Exclusive:** {}  
+
+    **Description:**  
+    {}
+
+    **Ingredients:**  
+    {}
+    
+---
+"""
+
+
 def describe_product(row):
     return f"""
     ### {row['name']}
@@ -16,9 +44,58 @@ def describe_product(row):
     {row['ingredients']}
     """
 
+
+def _column_text(df, col):
+    """A column as a list of strings; price_usd falls back to price, other missing columns show N/A."""
+    if col not in df.columns and col == "price_usd":
+        col = "price"
+    if col not in df.columns:
+        return ["N/A"] * len(df)
+    return df[col].astype(str).tolist()
+
+
+def format_batch(df):
+    """Markdown for every product in `df`, formatted column by column instead of row by row."""
+    columns = [_column_text(df, col) for col in FIELDS]
+    return "".join(map(PRODUCT_TEMPLATE.format, *columns))
+
+
+def iter_markdown(df, batch_size=10000):
+    """Yield the report in pieces: the header, then one string per `batch_size` products."""
+    yield HEADER
+    for start in range(0, len(df), batch_size):
+        yield format_batch(df.iloc[start:start + batch_size])
+
+
+def write_markdown(df, out, batch_size=10000, processes=None):
+    """Write the report to `out` (a path or anything with .write, e.g. sock.makefile('w')) as it is formatted.
+
+    With `processes` > 1 batches are formatted in a process pool and written
+    in their original order as they come back. Returns the number of characters written.
+    """
+    batches = (df.iloc[start:start + batch_size] for start in range(0, len(df), batch_size))
+    return write_markdown_batches(batches, out, processes if len(df) > batch_size else None)
+
+
+def write_markdown_batches(batches, out, processes=None):
+    """write_markdown for products arriving as a stream of DataFrames (e.g. BeautyProductAPI.filter_batches)."""
+    if not hasattr(out, "write"):
+        with open(out, "w", encoding="utf-8") as f:
+            return write_markdown_batches(batches, f, processes)
+
+    written = out.write(HEADER)
+    if processes and processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            # map returns results in submission order, so the shards stitch back in order
+            for text in pool.map(format_batch, batches):
+                written += out.write(text)
+    else:
+        for batch in batches:
+            written += out.write(format_batch(batch))
+    return written
+
+
 def generate_markdown(df):
-    md = "# Product Overview\n\n"
-    for _, row in df.iterrows():
-        md += describe_product(row)
-        md += "\n---\n"
-    return md
+    md = io.StringIO()
+    write_markdown(df, md)
+    return md.getvalue()
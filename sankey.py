@@ -4,96 +4,161 @@ Author: Bridget Crampton
 Description: Build single-layer or multi-layer Sankey diagrams from a DataFrame.
 """
 
-import plotly.graph_objects as go
-import plotly.io as pio
+import numpy as np
 import pandas as pd
 
-pio.renderers.default = 'browser'
 
-def _stack_columns(df, *cols, vals=None):
-    """ Return stacked edges from adjacent cols; optionally attach weights in `vals`.
-    df - Dataframe
-    *cols - Ordered categorical columns
-    vals - Values column (optional)
-    """
+def _other_label(col):
+    """ Label of the node that collects a tier's pruned labels and links """
+    return f"Other ({col})"
 
-    # Removes vals from cols if vals exists so that vals doesn't become a tier in the sankey diagram
-    if vals is not None and vals in cols:
-        # Asked chatgpt: "How do I filter *cols so it doesn’t include a certain value?"
-        cols = tuple(c for c in cols if c != vals)
 
-    # Create an empty list to hold the unique column pairs
-    pairs = []
+def _missing_label(col):
+    """ Label of the node for a tier's rows without a value """
+    return f"Missing ({col})"
 
-    # Set up pairs of adjacent columns from cols tuple/list
-    for i in range(len(cols) - 1):
-        src_col = cols[i]
-        targ_col = cols[i + 1]
 
-        # Make mini DataFrame with just these two columns
-        pair = df[[src_col, targ_col]].copy()
-        pair.columns = ["src", "targ"]
+def _tier_codes(df, cols, weights=None, max_nodes=None):
+    """ Factorize every tier column and give its labels codes in one node space shared by all tiers.
+    df - Dataframe
+    cols - Ordered categorical columns
+    weights - per-row weights used to rank labels (optional, rows count 1 otherwise)
+    max_nodes - keep at most this many labels per tier, folding the rest into its "Other" node (optional)
+    Returns per tier (row codes local to the tier; local code -> node code), and the node labels.
+    A label that appears in several tiers is one node, labels are numbered in order of first appearance.
+    Rows without a value go to their tier's "Missing (<column>)" node, so every row flows through every tier.
+    """
 
-        # If vals exists, add a vals column to mini df
-        if vals is not None and vals in df.columns:
-            pair["vals"] = df[vals].values
+    labels = pd.Index([], dtype=object)
+    tiers = []
+    for col in cols:
+        # Factorizing one column at a time only builds small tables of distinct labels
+        local_codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        uniques = pd.Index(uniques, dtype=object)
+        uniques = uniques.where(uniques.notna(), _missing_label(col))
 
-        pairs.append(pair)
+        if max_nodes is not None and len(uniques) > max_nodes:
+            totals = np.bincount(local_codes, weights=weights, minlength=len(uniques))
+            keep = np.zeros(len(uniques), dtype=bool)
+            keep[np.argsort(-totals, kind="stable")[:max_nodes]] = True
+            uniques = uniques.where(keep, _other_label(col))
 
-    # Stack the pairs dataframes together
-    stacked = pd.concat(pairs, axis=0, ignore_index=True)
-    return stacked
+        labels = labels.append(uniques[~uniques.isin(labels)].unique())
+        tiers.append((local_codes, labels.get_indexer(uniques)))
 
-def _code_mapping(df, *cols, vals=None):
-    """ Map labels in src and targ columns to integers
-    df - Dataframe
-    *cols - Ordered categorical columns
-    vals - Values column (optional)
-    """
-
-    stacked = _stack_columns(df, *cols, vals=vals)
+    return tiers, labels.tolist()
 
-    # Create a list of unique node labels for the sankey diagram
-    labels = pd.concat([stacked["src"], stacked["targ"]]).unique().tolist()
 
-    # Get integer codes
-    codes = range(len(labels))
+def _prune(keys, values, base, other, top_k=None, min_value=None):
+    """ Send the links of one tier pair that fall outside the top_k of their source, or under min_value, to `other`
+    keys - link keys (source * base + target)
+    values - link weights
+    other - node code of the target tier's "Other" node
+    """
 
-    # Create label to code mapping
-    lc_map = dict(zip(labels, codes))
+    sources = keys // base
+    drop = np.zeros(len(keys), dtype=bool)
+    if top_k is not None:
+        # Rank every link among the links of its source, heaviest first
+        order = np.lexsort((-values, sources))
+        sorted_sources = sources[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_sources, sorted_sources, side="left")
+        drop[order] = rank >= top_k
+    if min_value is not None:
+        drop |= values < min_value
 
-    # Substitute names for codes in dataframe
-    stacked["source"] = stacked["src"].map(lc_map)
-    stacked["target"] = stacked["targ"].map(lc_map)
-    # Drop original columns with labels
-    stacked.drop(columns=["src", "targ"], inplace=True)
+    keys = keys.copy()
+    keys[drop] = sources[drop] * base + other
+    return keys
 
-    # Asked Chatgpt: How do I rename a column in Pandas and then aggregate by groups?
-    if "vals" in stacked.columns:
-        # Rename and aggregate duplicate edges by summing weights
-        stacked.rename(columns={"vals": "value"}, inplace=True)
-        stacked = stacked.groupby(["source", "target"], as_index=False)["value"].sum()
 
-    # Return the new df along with the list of labels that were converted
-    return stacked, labels
+def _code_mapping(df, *cols, vals=None, top_k=None, min_value=None, max_nodes=None, max_bins=1 << 24):
+    """ Aggregate the links between adjacent tiers
+    df - Dataframe
+    *cols - Ordered categorical columns
+    vals - Values column (optional); without it every row adds 1 to its links
+    top_k - keep each node's top_k heaviest links to the next tier (optional)
+    min_value - keep only links weighing at least this much (optional)
+    max_nodes - keep each tier's max_nodes heaviest labels (optional)
+    max_bins - largest (source x target) table counted directly with bincount
+    Pruned labels and links are folded into an "Other (<column>)" node of their tier, so the
+    diagram has at most len(cols) * (max_nodes + 1) nodes whatever the size of the data.
+    Returns a dataframe of distinct links (source, target, value) sorted by source and target, and the node labels.
+    """
 
+    # Removes vals from cols if vals exists so that vals doesn't become a tier in the sankey diagram
+    if vals is not None and vals in cols:
+        cols = tuple(c for c in cols if c != vals)
 
-def make_sankey(df, *cols, vals=None, **kwargs):
+    weights = None
+    if vals is not None and vals in df.columns:
+        weights = df[vals].to_numpy(dtype=np.float64)
+        weights = np.where(np.isnan(weights), 0, weights)
+
+    tiers, labels = _tier_codes(df, cols, weights, max_nodes)
+    # Room for an "Other" node per tier added by link pruning
+    base = len(labels) + len(cols)
+
+    keys, values = [], []
+    for i, ((src, src_nodes), (targ, targ_nodes)) in enumerate(zip(tiers[:-1], tiers[1:])):
+        # One integer key per link within this tier pair
+        width = len(targ_nodes)
+        pair_keys = src.astype(np.int64) * width + targ
+        pair_weights = weights
+
+        if len(src_nodes) * width <= max_bins:
+            totals = np.bincount(pair_keys, weights=pair_weights, minlength=len(src_nodes) * width)
+            links = np.flatnonzero(totals)
+            totals = totals[links]
+        else:
+            links, inverse = np.unique(pair_keys, return_inverse=True)
+            totals = np.bincount(inverse, weights=pair_weights, minlength=len(links))
+
+        links = src_nodes[links // width].astype(np.int64) * base + targ_nodes[links % width]
+        if top_k is not None or min_value is not None:
+            # Labels folded into "Other" share links, so merge those before ranking
+            links, inverse = np.unique(links, return_inverse=True)
+            totals = np.bincount(inverse, weights=totals, minlength=len(links))
+            other = _other_label(cols[i + 1])
+            if other not in labels:
+                labels.append(other)
+            links = _prune(links, totals, base, labels.index(other), top_k, min_value)
+
+        keys.append(links)
+        values.append(totals)
+
+    keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+    values = np.concatenate(values) if values else np.empty(0)
+
+    # The same link can join different tier pairs when labels repeat across tiers
+    links, inverse = np.unique(keys, return_inverse=True)
+    values = np.bincount(inverse, weights=values, minlength=len(links))
+    if weights is None:
+        values = values.astype(np.int64)
+
+    # Drop "Other" nodes that ended up without links
+    used = np.union1d(links // base, links % base)
+    if len(used) < len(labels):
+        renumber = np.full(base, -1, dtype=np.int64)
+        renumber[used] = np.arange(len(used))
+        labels = [labels[i] for i in used]
+        links = renumber[links // base] * base + renumber[links % base]
+
+    edges = pd.DataFrame({"source": links // base, "target": links % base, "value": values})
+    return edges, labels
+
+
+def make_sankey(df, *cols, vals=None, top_k=None, min_value=None, max_nodes=None, **kwargs):
     """ Generate a sankey diagram
     df - Dataframe
     *cols - Ordered categorical columns
     vals - Values column (optional)
+    top_k, min_value, max_nodes - optional pruning, see _code_mapping; what is pruned goes to "Other" nodes
     kwargs - optional supported params: pad, thickness, line_color, line_width.
     """
 
-    # Convert column labels to integer codes
-    df, labels = _code_mapping(df, *cols, vals=vals)
-
-    # Handle optional vals column
-    if vals:
-        values = df["value"]
-    else:
-        values = [1] * len(df)  # all values are identical (e.g., 1)
+    # Convert column labels to integer codes and aggregate duplicate links
+    df, labels = _code_mapping(df, *cols, vals=vals, top_k=top_k, min_value=min_value, max_nodes=max_nodes)
 
     # Extract customizations from kwargs
     pad = kwargs.get('pad', 50)
@@ -102,12 +167,15 @@ def make_sankey(df, *cols, vals=None, **kwargs):
     line_width = kwargs.get('line_width', 0)
 
     # Construct sankey figure
-    link = {'source': df['source'], 'target': df['target'], 'value': values,
+    link = {'source': df['source'].to_numpy(), 'target': df['target'].to_numpy(), 'value': df['value'].to_numpy(),
             'line': {'color': line_color, 'width': line_width}}
 
     node = {'label': labels, 'pad': pad, 'thickness': thickness,
             'line': {'color': line_color, 'width': line_width}}
 
+    # Plotly is only imported once a diagram is drawn; it isn't needed to load this module
+    import plotly.graph_objects as go
+
     sk = go.Sankey(link=link, node=node)
     fig = go.Figure(sk)
 
@@ -137,6 +205,6 @@ def show_sankey(df, *cols, vals=None, png=None, **kwargs):
     """
 
     fig = make_sankey(df, *cols, vals=vals, **kwargs)
-    fig.show()
+    fig.show(renderer='browser')
     if png:
         fig.write_image(png)
\ No newline at end of file
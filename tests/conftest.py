@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from synthetic import ProductGenerator  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def generator():
+    """Synthetic products shaped like the shipped CSV (whose brand/name pairs repeat)."""
+    return ProductGenerator()
+
+
+def random_spec(rng, df):
+    """filter_data keyword arguments drawn from the values in `df`."""
+    spec = {}
+    if rng.random() < 0.4:
+        spec["brand"] = list(rng.choice(df["brand"].dropna().unique(), size=rng.integers(1, 4)))
+    if rng.random() < 0.4:
+        spec["category"] = rng.choice(df["category"].dropna().unique())
+    for flag in ("online_only", "exclusive"):
+        if rng.random() < 0.3:
+            spec[flag] = rng.choice(["Yes", "No"])
+    if rng.random() < 0.5:
+        spec["min_rating"] = float(rng.choice(np.arange(0, 5.5, 0.5)))
+    if rng.random() < 0.5:
+        low = float(rng.integers(0, 150))
+        spec["price_range"] = (low, low + float(rng.integers(5, 200)))
+    if rng.random() < 0.3:
+        spec["min_reviews"] = int(rng.choice([0, 50, 500, 5000]))
+    if rng.random() < 0.2:
+        word = str(rng.choice(df["name"].dropna().unique())).split()[0].lower()
+        spec["search"] = word[:rng.integers(1, len(word) + 1)]
+    return spec
+
+
+@pytest.fixture
+def specs():
+    """`n` random filter specs for `df`, reproducibly."""
+    def make(df, n, seed=0):
+        rng = np.random.default_rng(seed)
+        return [random_spec(rng, df) for _ in range(n)]
+    return make
@@ -0,0 +1,152 @@
+import os
+
+import pandas as pd
+import pytest
+
+from makeupapi import BeautyProductAPI
+from makeupchunked import ChunkedBeautyProductAPI
+from sankey import _code_mapping
+
+TIERS = ("brand", "category", "main_ingredient")
+
+
+@pytest.fixture(scope="module")
+def apis(tmp_path_factory, generator):
+    """The same products in memory and partitioned on disk in small chunks."""
+    path = str(tmp_path_factory.mktemp("chunked") / "products.csv")
+    generator.sample(6000, seed=11).to_csv(path, index=False)
+    memory = BeautyProductAPI()
+    memory.load_data(path, typed=True)
+    chunked = ChunkedBeautyProductAPI(n_partitions=4, chunksize=1500)
+    chunked.load_data(path)
+    return memory, chunked
+
+
+def by_key(df):
+    """`df` as plain values in a canonical row order (the chunked backend returns rows partition by partition)."""
+    df = df.astype(object).where(df.notna(), None)
+    return df.sort_values(list(df.columns), key=lambda col: col.astype(str)).reset_index(drop=True)
+
+
+def sankey_links(df, **kwargs):
+    """{(source label, target label): weight} of a Sankey diagram built from `df`."""
+    edges, labels = _code_mapping(df, *TIERS, **kwargs)
+    return {(labels[s], labels[t]): float(v) for s, t, v in edges.itertuples(index=False)}
+
+
+def test_filter_rows_are_positions_of_filter_data_in_stored_order(apis, specs):
+    _, chunked = apis
+    stored = pd.concat(list(chunked._pieces()), ignore_index=True)
+    assert len(stored) == chunked.n_rows
+    for spec in specs(stored, 40, seed=1):
+        rows = chunked.filter_rows(**spec)
+        pd.testing.assert_frame_equal(stored.take(rows).reset_index(drop=True), chunked.filter_data(**spec),
+                                      check_dtype=False, check_categorical=False)
+
+
+def test_filter_batches_stream_filter_data(apis, specs):
+    memory, chunked = apis
+    for spec in specs(memory.df, 40, seed=2):
+        for api in apis:
+            batches = list(api.filter_batches(columns=["name", "price", "brand"], batch_rows=700, **spec))
+            assert batches and all(len(batch) <= 700 for batch in batches)
+            expected = api.filter_data(**spec)[["name", "price", "brand"]]
+            pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), expected.reset_index(drop=True),
+                                          check_dtype=False, check_categorical=False)
+        assert len(list(chunked.filter_batches(brand=["No Such Brand"]))[0]) == 0
+
+
+def test_flow_counts_match_and_give_the_rows_sankey(apis, specs):
+    memory, chunked = apis
+    for spec in specs(memory.df, 40, seed=3):
+        memory_counts = memory.get_flow_counts(TIERS, **spec)
+        pd.testing.assert_frame_equal(by_key(chunked.get_flow_counts(TIERS, **spec)), by_key(memory_counts))
+        if memory_counts.empty:
+            continue
+        rows = memory.filter_data(**spec)
+        for pruning in ({}, {"max_nodes": 5, "top_k": 3, "min_value": 2}):
+            assert sankey_links(memory_counts, vals="count", **pruning) == sankey_links(rows, **pruning)
+
+
+def test_filter_data_keeps_only_results_within_the_cache_budget(apis):
+    memory, chunked = apis
+    budget = chunked.cache.max_bytes
+    try:
+        chunked.cache.max_bytes = 0
+        chunked._last_frame = None
+        chunked.filter_data()
+        assert chunked._last_frame is None
+    finally:
+        chunked.cache.max_bytes = budget
+    df = chunked.filter_data(brand=[memory.df["brand"].iloc[0]])
+    assert chunked._last_frame[1] is df
+
+
+def versions(api):
+    return sorted(name for name in os.listdir(api.store_dir) if name.startswith("v-"))
+
+
+def test_refresh_builds_a_new_version_beside_the_one_being_read(tmp_path, generator):
+    path = str(tmp_path / "products.csv")
+    df = generator.sample(3000, seed=12)
+    df.iloc[:2000].to_csv(path, index=False)
+    api = ChunkedBeautyProductAPI(n_partitions=3, chunksize=500)
+    api.load_data(path)
+    first = versions(api)
+
+    # A query streaming the old version finishes on it while a refresh swaps in the new one
+    reading = api._pieces()
+    pieces = [next(reading)]
+    df.to_csv(path, index=False)
+    os.utime(path, (1, 1))
+    assert api.refresh()
+    assert versions(api) == sorted(first + [os.path.basename(api.store.path)])
+    pieces.extend(reading)
+    assert sum(len(piece) for piece in pieces) == 2000
+    assert api.n_rows == len(api.filter_rows()) + len(api.filter_rows(price_range=(500, 1e9))) == 3000
+
+    # Other processes sharing the store open the new version instead of building it again, and
+    # the old version goes once nothing reads it
+    other = ChunkedBeautyProductAPI(n_partitions=3, chunksize=500)
+    other.load_data(path)
+    assert other.store.path == api.store.path
+    assert versions(api) == [os.path.basename(api.store.path)]
+    assert sorted(os.listdir(api.store_dir)) == ["build.lock"] + versions(api)
+
+
+def test_delta_files_are_applied_like_the_memory_backend(tmp_path, generator, specs):
+    path = str(tmp_path / "products.csv")
+    df = generator.sample(3000, seed=13)
+    df.to_csv(path, index=False)
+    memory = BeautyProductAPI()
+    memory.load_data(path, typed=True)
+    chunked = ChunkedBeautyProductAPI(n_partitions=3, chunksize=700)
+    chunked.load_data(path)
+
+    # Deletes, upserts, new products, and a second file that upserts and deletes keys the first one upserted
+    os.makedirs(f"{path}.deltas")
+    first = pd.concat([df.iloc[:30], df.iloc[30:60].assign(price=1.0), generator.sample(20, seed=14)])
+    first.assign(op=["delete"] * 30 + [""] * 50).to_csv(f"{path}.deltas/0001.csv", index=False)
+    second = pd.concat([df.iloc[30:40].assign(price=2.0), first.iloc[-5:]])
+    second.assign(op=[""] * 10 + ["delete"] * 5).to_csv(f"{path}.deltas/0002.csv", index=False)
+    assert memory.refresh() and chunked.refresh()
+    assert not chunked.refresh()
+
+    assert chunked.n_rows == len(memory.df)
+    for spec in specs(memory.df, 30, seed=5):
+        pd.testing.assert_frame_equal(by_key(chunked.filter_data(**spec)), by_key(memory.filter_data(**spec)))
+        assert chunked.get_filtered_summary(**spec) == pytest.approx(memory.get_filtered_summary(**spec),
+                                                                     nan_ok=True, rel=1e-6)
+
+
+def test_rows_with_missing_tiers_flow_through_missing_nodes(generator):
+    df = generator.sample(500, seed=15)
+    df["main_ingredient"] = df["main_ingredient"].astype(object).mask(df.index % 7 == 0)
+    df.loc[df.index % 11 == 0, "category"] = None
+    edges, _ = _code_mapping(df, *TIERS)
+
+    # Every row still adds one to a link of every tier pair
+    assert edges["value"].sum() == len(df) * (len(TIERS) - 1)
+    links = sankey_links(df)
+    assert sum(v for (s, _), v in links.items() if s == "Missing (category)") == (df.index % 11 == 0).sum()
+    assert sum(v for (_, t), v in links.items() if t == "Missing (main_ingredient)") == (df.index % 7 == 0).sum()
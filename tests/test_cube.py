@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from makeupapi import BeautyProductAPI, filter_key, scan
+from makeupcube import PARTIAL
+from makeupsketch import ALPHA, QUANTILES, SKETCHED, quantiles
+
+# Thresholds on bucket edges, between them, and past the last edge
+EDGE_SPECS = [{"min_rating": r} for r in (0.5, 0.25, 3.7, 4.0, 4.95, 5.0)] + \
+             [{"price_range": p} for p in ((10, 50), (12.5, 47.3), (0, 9.99), (33, 33), (480, 500), (0, 10.01))] + \
+             [{"min_reviews": n} for n in (50, 75, 999, 1000, 5000)] + \
+             [{"min_rating": 3.3, "price_range": (15.5, 64.5), "min_reviews": 120},
+              {"min_rating": 4.5, "price_range": (20, 30), "category": "Lipstick"}]
+
+
+@pytest.fixture(scope="module", params=[{}, {"typed": True}, {"mmap": True}], ids=["plain", "typed", "mmap"])
+def api(request, tmp_path_factory, generator):
+    """An API over products with some missing prices and ratings."""
+    data = generator.sample(6000, seed=21)
+    rng = np.random.default_rng(21)
+    for col in ("price", "rating"):
+        data[col] = data[col].astype("float64").mask(rng.random(len(data)) < 0.05)
+    path = tmp_path_factory.mktemp("cube") / "products.csv"
+    data.to_csv(path, index=False)
+    api = BeautyProductAPI()
+    api.load_data(str(path), **request.param)
+    return api
+
+
+def cube_specs(df, specs):
+    """Random specs (the cube doesn't answer text searches) plus the bucket edge cases."""
+    return [{k: v for k, v in spec.items() if k != "search"} for spec in specs(df, 150, seed=6)] + EDGE_SPECS
+
+
+def grouped(df, by, lookup):
+    """The cube's aggregates for `df`, from a pandas groupby, as arrays indexed by `by` code."""
+    size = len(lookup)
+    values = df[["rating", "price"]].astype("float64")
+    groups = values.groupby(df[by].astype(object), observed=True)
+    out = {name: np.zeros(size) for name in ("count", "rating_sum", "rating_n", "price_sum", "price_n")}
+    for name, series in (("count", groups.size()), ("rating_sum", groups["rating"].sum()),
+                         ("rating_n", groups["rating"].count()), ("price_sum", groups["price"].sum()),
+                         ("price_n", groups["price"].count())):
+        codes = [lookup[value] for value in series.index]
+        out[name][codes] = series.to_numpy(dtype=np.float64)
+    return out
+
+
+@pytest.mark.parametrize("by", ["brand", "category"])
+def test_aggregates_match_a_groupby_of_the_filtered_rows(api, specs, by):
+    partial = 0
+    for spec in cube_specs(api.df, specs):
+        key = filter_key(**spec)
+        expected = grouped(api.df.iloc[scan(api.df, key)], by, api.index.lookup[by])
+        got = api.cube.aggregate(key, by)
+        for name, values in expected.items():
+            assert got[name] == pytest.approx(values, rel=1e-9, abs=1e-6), (spec, name)
+        selected, status, _ = api.cube._match(key)
+        partial += bool((selected & (status == PARTIAL)).any())
+    # The edge cases do go through the per-row correction of cut buckets
+    assert partial >= len(EDGE_SPECS) // 2
+
+
+def test_sketch_quantiles_are_within_alpha(api, specs):
+    for spec in cube_specs(api.df, specs):
+        key = filter_key(**spec)
+        matched = api.df.iloc[scan(api.df, key)]
+        sketches = api.cube.sketch(key)
+        for col in SKETCHED:
+            values = matched[col].dropna().to_numpy(dtype=np.float64)
+            got = quantiles(sketches[col])
+            if not len(values):
+                assert got is None, (spec, col)
+                continue
+            exact = np.quantile(values, QUANTILES, method="lower")
+            assert np.all(np.abs(np.array(got) - exact) <= ALPHA * np.abs(exact) * (1 + 1e-9)), (spec, col, got, exact)
+
+
+
+
+def test_mmap_loads_share_the_cached_cube(tmp_path, generator):
+    path = str(tmp_path / "products.csv")
+    generator.sample(3000, seed=22).to_csv(path, index=False)
+    first, again, fresh = BeautyProductAPI(), BeautyProductAPI(), BeautyProductAPI()
+    first.load_data(path, mmap=True)
+    again.load_data(path, mmap=True)
+    fresh.load_data(path, typed=True)
+
+    for api in (first, again):
+        arrays = [api.cube.cell, api.cube.rows, *api.cube.keys, api.rating_steps]
+        arrays += [array for sketches in api.cube.sketches.values() for array in (sketches.keys, sketches.counts)]
+        assert all(isinstance(array, np.memmap) for array in arrays)
+    for spec in EDGE_SPECS:
+        key = filter_key(**spec)
+        for by in ("brand", "category"):
+            for name, values in fresh.cube.aggregate(key, by).items():
+                assert again.cube.aggregate(key, by)[name] == pytest.approx(values), (spec, by, name)
+        for col, sketch in fresh.cube.sketch(key).items():
+            assert np.array_equal(again.cube.sketch(key)[col], sketch), (spec, col)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from makeupapi import BeautyProductAPI, append_rows, filter_key, is_narrowing, scan
+from makeupindex import ProductIndex
+
+
+@pytest.fixture(scope="module", params=[{}, {"typed": True}], ids=["plain", "typed"])
+def df(request, tmp_path_factory, generator):
+    """Products with some missing prices and ratings, loaded as the API loads them."""
+    data = generator.sample(5000, seed=7)
+    rng = np.random.default_rng(7)
+    for col in ("price", "rating"):
+        data[col] = data[col].astype("float64").mask(rng.random(len(data)) < 0.05)
+    path = tmp_path_factory.mktemp("index") / "products.csv"
+    data.to_csv(path, index=False)
+    api = BeautyProductAPI()
+    return api.load_data(str(path), **request.param)
+
+
+def narrower(rng, spec, df):
+    """`spec` with one or more of its filters tightened."""
+    spec = dict(spec)
+    if rng.random() < 0.5:
+        spec["min_rating"] = spec.get("min_rating", 0) + 0.5
+    if rng.random() < 0.5:
+        low, high = spec.get("price_range", (0, 500))
+        low = min(low + 5, high)
+        spec["price_range"] = (low, max(low, high - 10))
+    if rng.random() < 0.3:
+        spec["min_reviews"] = spec.get("min_reviews", 0) + 500
+    if rng.random() < 0.3:
+        brands = spec.get("brand") or list(df["brand"].dropna().unique())
+        spec["brand"] = brands[:max(1, len(brands) // 2)]
+    if rng.random() < 0.3 and spec.get("search"):
+        spec["search"] = spec["search"] + "e"
+    return spec
+
+
+def test_query_matches_scan(df, specs):
+    index = ProductIndex(df)
+    for spec in specs(df, 400, seed=1):
+        key = filter_key(**spec)
+        assert np.array_equal(index.query(key), scan(df, key)), spec
+
+
+def test_refine_matches_scan(df, specs):
+    index = ProductIndex(df)
+    rng = np.random.default_rng(2)
+    for spec in specs(df, 200, seed=2):
+        old = filter_key(**spec)
+        rows = index.query(old)
+        # A few narrowing steps in a row, as when a slider is dragged
+        for _ in range(3):
+            spec = narrower(rng, spec, df)
+            new = filter_key(**spec)
+            assert is_narrowing(old, new)
+            rows = index.refine(rows, new)
+            assert np.array_equal(rows, scan(df, new)), spec
+            old = new
+
+
+@pytest.mark.parametrize("col", ProductIndex.NUMERIC)
+def test_sort_rows_matches_a_stable_sort(df, col):
+    index = ProductIndex(df)
+    rng = np.random.default_rng(3)
+    values = df[col].to_numpy(dtype=np.float64)
+    for size in (10, 300, len(df) // 2, len(df)):
+        rows = np.sort(rng.choice(len(df), size=size, replace=False))
+        for ascending in (True, False):
+            keys = values[rows] if ascending else -values[rows]
+            # Missing values last, ties by row id
+            expected = rows[np.lexsort((rows, keys, np.isnan(keys)))]
+            for start, stop in ((0, 25), (25, 50), (0, None), (size - 5, size + 5)):
+                got = index.sort_rows(rows, col, ascending, start, stop)
+                assert np.array_equal(got, expected[start:stop]), (size, ascending, start, stop)
+
+
+def test_updated_index_matches_scan_and_a_fresh_index(df, generator, specs):
+    index = ProductIndex(df)
+    rng = np.random.default_rng(4)
+    added = generator.sample(700, seed=8)
+    # Appends only, then deletes plus appends
+    for keep in (None, rng.random(len(df)) < 0.8):
+        new_df = append_rows(df if keep is None else df[keep], added)
+        updated = index.updated(new_df, keep)
+        fresh = ProductIndex(new_df)
+        for spec in specs(new_df, 150, seed=5):
+            key = filter_key(**spec)
+            expected = scan(new_df, key)
+            assert np.array_equal(updated.query(key), expected), spec
+            assert np.array_equal(fresh.query(key), expected), spec
+        for col in ProductIndex.NUMERIC:
+            rows = np.arange(len(new_df))
+            assert np.array_equal(updated.sort_rows(rows, col, False, 0, 50), fresh.sort_rows(rows, col, False, 0, 50))
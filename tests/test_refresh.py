@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from makeupapi import BeautyProductAPI
+
+LOADS = {"plain": {}, "typed": {"typed": True}, "mmap": {"mmap": True}}
+KEY = ["brand", "name"]
+
+
+def normalized(df):
+    """`df` in plain arrays, categoricals as values (refreshes append new categories, fresh loads sort them)."""
+    return pd.DataFrame({c: np.array(df[c].astype(object) if isinstance(df[c].dtype, pd.CategoricalDtype) else df[c])
+                         for c in df.columns})
+
+
+def assert_same_data(refreshed, path, load, specs):
+    """`refreshed` answers like an API freshly loaded from `path`."""
+    fresh = BeautyProductAPI()
+    fresh.load_data(path, **load)
+    pd.testing.assert_frame_equal(normalized(refreshed.df), normalized(fresh.df))
+    for spec in specs(fresh.df, 60):
+        pd.testing.assert_frame_equal(normalized(refreshed.filter_data(**spec)), normalized(fresh.filter_data(**spec)))
+        assert refreshed.get_filtered_summary(**spec) == pytest.approx(fresh.get_filtered_summary(**spec), nan_ok=True)
+
+
+def write_delta(path, name, rows, ops):
+    os.makedirs(f"{path}.deltas", exist_ok=True)
+    rows.assign(op=ops).to_csv(os.path.join(f"{path}.deltas", name), index=False)
+
+
+def duplicated_keys(df):
+    """(brand, name) pairs held by more than one product."""
+    counts = df.groupby(KEY, observed=True).size()
+    return counts[counts > 1].index
+
+
+@pytest.fixture
+def dataset(tmp_path, generator):
+    df = generator.sample(2000, seed=1)
+    path = str(tmp_path / "products.csv")
+    df.to_csv(path, index=False)
+    return path, df
+
+
+@pytest.mark.parametrize("load", LOADS.values(), ids=list(LOADS))
+def test_appended_rows_match_a_fresh_load(dataset, generator, specs, load):
+    path, _ = dataset
+    api = BeautyProductAPI()
+    api.load_data(path, **load)
+
+    for seed in (2, 3):
+        generator.sample(300, seed=seed).to_csv(path, mode="a", header=False, index=False)
+        assert api.refresh()
+        assert_same_data(api, path, load, specs)
+    assert not api.refresh()
+
+
+@pytest.mark.parametrize("load", LOADS.values(), ids=list(LOADS))
+def test_deltas_match_a_fresh_load(dataset, generator, specs, load):
+    path, df = dataset
+    api = BeautyProductAPI()
+    api.load_data(path, **load)
+
+    # Deletes and upserts of duplicated keys, upserts of unique keys and brand-new products
+    duplicated = duplicated_keys(df)
+    keyed = df.set_index(KEY).index
+    deleted = df[keyed.isin(duplicated[:20])].drop_duplicates(KEY)
+    upserted = pd.concat([df[keyed.isin(duplicated[20:30])].drop_duplicates(KEY),
+                          df[~keyed.duplicated(keep=False)].head(10),
+                          generator.sample(15, seed=4)]).assign(price=lambda d: d["price"] + 1)
+    write_delta(path, "0001.csv", pd.concat([deleted, upserted]), ["delete"] * len(deleted) + [""] * len(upserted))
+    assert api.refresh()
+
+    # Every product with a delta's key goes; upserted rows are appended in file order
+    changed = keyed.isin(pd.concat([deleted, upserted]).set_index(KEY).index)
+    expected = pd.concat([df[~changed], upserted], ignore_index=True)
+    expected_path = path.replace("products", "expected")
+    expected.to_csv(expected_path, index=False)
+    assert_same_data(api, expected_path, load, specs)
+    assert not api.refresh()
+
+
+def test_delete_removes_every_product_with_the_key(dataset):
+    path, df = dataset
+    api = BeautyProductAPI()
+    api.load_data(path)
+    brand, name = duplicated_keys(df)[0]
+    assert ((api.df["brand"] == brand) & (api.df["name"] == name)).sum() > 1
+
+    write_delta(path, "0001.csv", df[(df["brand"] == brand) & (df["name"] == name)].head(1), ["delete"])
+    api.refresh()
+    assert not ((api.df["brand"] == brand) & (api.df["name"] == name)).any()
+    assert len(api.df) == len(df) - ((df["brand"] == brand) & (df["name"] == name)).sum()
+
+
+def test_upsert_replaces_every_product_with_the_key(dataset):
+    path, df = dataset
+    api = BeautyProductAPI()
+    api.load_data(path)
+    brand, name = duplicated_keys(df)[0]
+    matching = (df["brand"] == brand) & (df["name"] == name)
+
+    write_delta(path, "0001.csv", df[matching].head(1).assign(price=999.0), ["upsert"])
+    api.refresh()
+    rows = api.df[(api.df["brand"] == brand) & (api.df["name"] == name)]
+    assert len(rows) == 1 and rows["price"].iloc[0] == 999.0
+    assert len(api.df) == len(df) - matching.sum() + 1
+
+
+def test_rewritten_csv_is_loaded_again(dataset, generator, specs):
+    path, _ = dataset
+    api = BeautyProductAPI()
+    api.load_data(path)
+    generator.sample(500, seed=5).to_csv(path, index=False)
+    assert api.refresh()
+    assert_same_data(api, path, {}, specs)
+    assert np.array_equal(api.filter_rows(), np.arange(500))
+
+
+@pytest.mark.parametrize("load", LOADS.values(), ids=list(LOADS))
+def test_appended_rows_with_missing_counts_and_flags(dataset, generator, specs, load):
+    path, _ = dataset
+    api = BeautyProductAPI()
+    api.load_data(path, **load)
+
+    added = generator.sample(200, seed=6)
+    for col in ("number_of_reviews", "love", "online_only", "exclusive", "cruelty_free"):
+        added[col] = added[col].astype(object).mask(np.arange(len(added)) % 7 == 0)
+    added.to_csv(path, mode="a", header=False, index=False)
+    assert api.refresh()
+    assert_same_data(api, path, load, specs)
+
+
+def test_unreadable_appended_rows_are_skipped(dataset, generator, caplog):
+    path, df = dataset
+    api = BeautyProductAPI()
+    api.load_data(path, typed=True)
+
+    added = generator.sample(5, seed=7).astype(object)
+    added.loc[added.index[2], "price"] = "call us"
+    added.to_csv(path, mode="a", header=False, index=False)
+    assert api.refresh()
+    assert len(api.df) == len(df) + 4
+    assert "call us" in caplog.text
+
+    # Later rows are still picked up
+    generator.sample(3, seed=8).to_csv(path, mode="a", header=False, index=False)
+    assert api.refresh()
+    assert len(api.df) == len(df) + 7
@@ -0,0 +1,33 @@
+from makeupregistry import DatasetRegistry
+
+
+class Loaded:
+    """Stands in for a loaded API: a version and two result caches of one byte."""
+
+    class Cache:
+        nbytes = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 1
+        self.cache = self.bin_cache = self.Cache()
+        self.snapshot = None
+
+    def stop_watching(self):
+        pass
+
+
+def test_load_id_changes_when_an_evicted_dataset_is_loaded_again():
+    datasets = DatasetRegistry({"a": "a.csv", "b": "b.csv"}, max_bytes=0, load=Loaded)
+    a = datasets.acquire("a", session=1)
+    b = datasets.acquire("b", session=2)
+    assert a.version == b.version and datasets.load_id("a") != datasets.load_id("b")
+    first = datasets.load_id("a")
+    assert datasets.get("a") is a and datasets.load_id("a") == first
+
+    # An idle dataset is evicted at once under a zero budget; reloading it gives a new load id
+    datasets.release(1)
+    assert datasets.load_id("a") is None
+    again = datasets.acquire("a", session=1)
+    assert again is not a and again.version == a.version
+    assert datasets.load_id("a") not in (None, first)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from makeupapi import BeautyProductAPI
+from makeupchunked import ChunkedBeautyProductAPI
+
+INTS = ("number_of_reviews", "love")
+FLAGS = ("online_only", "exclusive", "cruelty_free")
+SPECS = [{}, {"online_only": "Yes"}, {"exclusive": "No"}, {"min_reviews": 500},
+         {"online_only": "No", "exclusive": "Yes", "min_reviews": 50, "min_rating": 3.5}]
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory, generator):
+    """Products with empty counts and flags, all in the first rows (so later chunks have none)."""
+    df = generator.sample(3000, seed=31)
+    rng = np.random.default_rng(31)
+    for col in INTS + FLAGS:
+        df[col] = df[col].astype(object).mask((rng.random(len(df)) < 0.05) & (np.arange(len(df)) < 1000))
+    path = str(tmp_path_factory.mktemp("store") / "products.csv")
+    df.to_csv(path, index=False)
+    return path, df
+
+
+@pytest.mark.parametrize("load", [{"typed": True}, {"mmap": True}], ids=["typed", "mmap"])
+def test_missing_ints_and_flags_load_as_float(dataset, load):
+    path, source = dataset
+    api = BeautyProductAPI()
+    api.load_data(path, **load)
+    plain = BeautyProductAPI()
+    plain.load_data(path)
+
+    for col in INTS + FLAGS:
+        assert api.df[col].dtype.kind == "f", col
+        assert np.array_equal(api.df[col].isna(), source[col].isna()), col
+    for spec in SPECS:
+        assert np.array_equal(api.filter_rows(**spec), plain.filter_rows(**spec)), spec
+        assert api.get_filtered_summary(**spec) == pytest.approx(plain.get_filtered_summary(**spec), nan_ok=True)
+
+
+def test_columns_without_missing_values_keep_the_compact_dtypes(tmp_path, generator):
+    path = str(tmp_path / "products.csv")
+    generator.sample(500, seed=32).to_csv(path, index=False)
+    api = BeautyProductAPI()
+    df = api.load_data(path, mmap=True)
+    assert {col: str(df[col].dtype) for col in INTS + FLAGS} == {**{c: "int32" for c in INTS},
+                                                                 **{c: "bool" for c in FLAGS}}
+
+
+def test_chunked_store_widens_to_the_chunks_with_missing_values(dataset):
+    path, _ = dataset
+    memory = BeautyProductAPI()
+    memory.load_data(path, typed=True)
+    chunked = ChunkedBeautyProductAPI(n_partitions=3, chunksize=700)
+    chunked.load_data(path)
+
+    assert {col: chunked.df[col].dtype for col in INTS + FLAGS} == {col: memory.df[col].dtype for col in INTS + FLAGS}
+    for spec in SPECS:
+        df = chunked.filter_data(**spec)
+        assert all(df[col].dtype == memory.df[col].dtype for col in INTS + FLAGS)
+        assert len(df) == len(memory.filter_rows(**spec)), spec
+        assert chunked.get_filtered_summary(**spec) == pytest.approx(memory.get_filtered_summary(**spec),
+                                                                     nan_ok=True, rel=1e-6)
+    assert pd.concat(list(chunked._pieces()), ignore_index=True)["love"].isna().sum() == memory.df["love"].isna().sum()